@@ -0,0 +1,70 @@
+"""
+Throughput of log processing pipelines of grep, cut, sort and uniq run
+in text mode, decoding the log and splitting its text, and in bytes
+mode, splitting its bytes and only decoding the output. The log is
+generated at the size given, 64M by default, so that the largest logs
+are opt-in:
+
+    PYTHONPATH=src python benchmarks/bytes_mode_benchmark.py [5G]
+"""
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from plan import compile_command_line
+
+PIPES = [
+    "grep '.*ERROR' {log}",
+    "cat {log} | grep '.*ERROR' | cut -b 1-10 | sort | uniq",
+    "cut -b 21-25 {log} | sort | uniq",
+]
+_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+_LEVELS = ["INFO ", "DEBUG", "WARN ", "ERROR"]
+
+
+def _bytes(size):
+    return int(size[:-1]) * _UNITS[size[-1]]
+
+
+def _write_log(path, size):
+    lines = [
+        f"2024-01-{i % 28 + 1:02d} 12:{i % 60:02d}:{i * 7 % 60:02d} "
+        f"{_LEVELS[i % 7 % 4]} request {i} served in {i * 13 % 997} ms\n"
+        for i in range(1000)
+    ]
+    block = "".join(lines).encode()
+    with open(path, "wb") as f:
+        written = 0
+        while written + len(block) <= size:
+            f.write(block)
+            written += len(block)
+
+
+def _time(cmdline, mode):
+    os.environ["SHELL_DATA_MODE"] = mode
+    plan = compile_command_line(cmdline)
+    start = time.perf_counter()
+    plan.eval(deque())
+    return time.perf_counter() - start
+
+
+def main():
+    size = sys.argv[1] if len(sys.argv) > 1 else "64M"
+    megabytes = _bytes(size) / 1024 / 1024
+    with tempfile.TemporaryDirectory() as directory:
+        log = os.path.join(directory, "app.log")
+        _write_log(log, _bytes(size))
+        print(f"{'pipe':<60}{'text':>16}{'bytes':>16}")
+        for pipe in PIPES:
+            cmdline = pipe.format(log=log)
+            times = [_time(cmdline, mode) for mode in ("text", "bytes")]
+            print(
+                f"{pipe.format(log='app.log'):<60}" + "".join(
+                    f"{t:>7.2f}s{megabytes / t:>5.0f}MB/s" for t in times
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
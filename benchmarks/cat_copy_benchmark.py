@@ -0,0 +1,75 @@
+"""
+Throughput of cat a b c > all, concatenating three files into a
+redirection target: through text, as cat used to, decoding the files
+and writing its output back, by the kernel copies cat now makes, and by
+bash running the cat of coreutils. Files are generated up to the total
+size given, 256M by default, so that larger ones are opt-in:
+
+    PYTHONPATH=src python benchmarks/cat_copy_benchmark.py [4G]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from applications import Cat, copy_files, save_output_to_file
+
+_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+REPEAT = 3
+
+
+def _bytes(size):
+    return int(size[:-1]) * _UNITS[size[-1]]
+
+
+def _write_file(path, size):
+    line = b"INFO request 123456 served in 42 ms\n"
+    block = line * (1024 * 1024 // len(line))
+    with open(path, "wb") as f:
+        for _ in range(size // len(block)):
+            f.write(block)
+
+
+def _best(run):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _through_text(files, target):
+    out = deque()
+    Cat().exec(files, out, False)
+    save_output_to_file(target, out)
+
+
+def main():
+    size = _bytes(sys.argv[1] if len(sys.argv) > 1 else "256M")
+    with tempfile.TemporaryDirectory() as directory:
+        files = [os.path.join(directory, name) for name in "abc"]
+        for file in files:
+            _write_file(file, size // 3)
+        target = os.path.join(directory, "all")
+        megabytes = sum(map(os.path.getsize, files)) / 1024 / 1024
+        runs = [
+            ("text", lambda: _through_text(files, target)),
+            ("kernel copy", lambda: copy_files(files, target)),
+            ("bash", lambda: subprocess.run(
+                ["/bin/bash", "-c", f"cat {' '.join(files)} > {target}"]
+            )),
+        ]
+        print(f"{'runner':<14}{'time':>10}{'throughput':>14}")
+        for name, run in runs:
+            elapsed = _best(run)
+            print(
+                f"{name:<14}{elapsed:>9.3f}s"
+                f"{megabytes / elapsed:>9.0f} MB/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Parse throughput, in commands per second, of the Earley and LALR engines
+and of the hand-written fast path for quote free lines, over command
+lines of growing length.
+
+    PYTHONPATH=src python benchmarks/engine_benchmark.py
+"""
+import time
+from parser import Parser
+from command_evaluator import extract_commands
+
+CALL = "grep 'A..' logs/app.log"
+SIMPLE_CALL = "grep A.. logs/app.log"
+
+
+def _cmdline(no_of_commands, call=CALL):
+    pipes = [" | ".join([call, "sort", "uniq"])] * (no_of_commands // 3)
+    return "; ".join(pipes)
+
+
+def _throughput(parser, cmdline, no_of_commands, min_time=0.5):
+    repeat = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time:
+        extract_commands(parser.command_level_parse(cmdline))
+        repeat += 1
+    return repeat * no_of_commands / (time.perf_counter() - start)
+
+
+def main():
+    # the parse cache is disabled so every iteration is parsed
+    earley = Parser(engine="earley", cache_size=0)
+    lalr = Parser(engine="lalr", cache_size=0, fast_path=False)
+    fast = Parser(engine="lalr", cache_size=0)
+    print(
+        f"{'commands':>10}{'earley (cmd/s)':>18}{'lalr (cmd/s)':>18}"
+        f"{'lalr, no quotes':>18}{'fast path':>18}"
+    )
+    for no_of_commands in (3, 30, 300):
+        cmdline = _cmdline(no_of_commands)
+        simple = _cmdline(no_of_commands, SIMPLE_CALL)
+        results = [
+            _throughput(earley, cmdline, no_of_commands),
+            _throughput(lalr, cmdline, no_of_commands),
+            _throughput(lalr, simple, no_of_commands),
+            _throughput(fast, simple, no_of_commands),
+        ]
+        print(f"{no_of_commands:>10}", *(f"{r:>17.0f}" for r in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Throughput of a pipeline of five external programs run by the shell in
+each pipe execution mode, against the same pipeline run by bash. The
+concurrent modes connect the programs to each other by OS pipes, while
+the sequential mode passes the whole output of each one through the
+shell.
+
+    PYTHONPATH=src python benchmarks/external_benchmark.py
+"""
+import subprocess
+import time
+from collections import deque
+from commands import Pipe
+from plan import compile_command_line
+
+MODES = ("sequential", "streaming", "threaded")
+LINES = 2000000
+PIPE = f"seq {LINES} | tr 1 x | tr 2 y | awk '{{print $1}}' | wc -c"
+REPEAT = 3
+
+
+def _best(run):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    output = subprocess.run(
+        ["/bin/bash", "-c", PIPE], capture_output=True
+    ).stdout
+    size = int(output) / 1024 / 1024
+    pipe = compile_command_line(PIPE).commands[0]
+    print(PIPE)
+    print(f"{'runner':<12}{'time':>10}{'throughput':>14}")
+    bash = _best(lambda: subprocess.run(
+        ["/bin/bash", "-c", PIPE], stdout=subprocess.DEVNULL
+    ))
+    print(f"{'bash':<12}{bash:>9.3f}s{size / bash:>9.1f} MB/s")
+    for mode in MODES:
+        elapsed = _best(lambda: Pipe(*pipe.calls, mode=mode).eval(deque()))
+        print(f"{mode:<12}{elapsed:>9.3f}s{size / elapsed:>9.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Time taken to scan a file and to take its last 10 lines, over files of
+1K to 10G, by reading them the way applications used to, in 64K chunks
+of a plain text file, and through a FileSource, which reads small files
+at once, scans large ones in large buffers and maps them to find their
+end. Files are only generated up to the size given, 64M by default, so
+that the largest ones are opt-in:
+
+    PYTHONPATH=src python benchmarks/file_source_benchmark.py [10G]
+"""
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from file_source import FileSource
+from streams import read_chunks
+
+SIZES = ["1K", "64K", "1M", "64M", "1G", "10G"]
+_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def _bytes(size):
+    return int(size[:-1]) * _UNITS[size[-1]]
+
+
+def _write_log(path, size):
+    line = "INFO request 123456 served in 42 ms\n"
+    block = line * (64 * 1024 // len(line))
+    with open(path, "w") as f:
+        written = 0
+        while written + len(block) <= size:
+            f.write(block)
+            written += len(block)
+        f.write(line * ((size - written) // len(line)))
+
+
+def _time(run):
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+def _scan_chunks(path):
+    for _ in read_chunks(path):
+        pass
+
+
+def _scan_source(path):
+    with FileSource(path) as source:
+        for _ in source.chunks():
+            pass
+
+
+def _tail_lines(path):
+    with open(path) as f:
+        return deque(f, maxlen=10)
+
+
+def _tail_source(path):
+    with FileSource(path) as source:
+        return source.last_lines(10)
+
+
+def main():
+    largest = _bytes(sys.argv[1] if len(sys.argv) > 1 else "64M")
+    print(
+        f"{'size':>6}{'scan chunks':>14}{'scan source':>14}"
+        f"{'tail lines':>14}{'tail source':>14}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for size in SIZES:
+            if _bytes(size) > largest:
+                break
+            path = os.path.join(directory, "app.log")
+            _write_log(path, _bytes(size))
+            times = [
+                _time(lambda: run(path))
+                for run in (_scan_chunks, _scan_source, _tail_lines,
+                            _tail_source)
+            ]
+            print(f"{size:>6}" + "".join(f"{t:>13.4f}s" for t in times))
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Throughput of grep over a log, for a literal pattern, patterns with a
+required literal found in few lines and in many, and one without:
+matching each line, as grep used to, through a LineMatcher, as grep now
+does, and by GNU grep, with its pattern anchored as grep here anchors
+it. The log is generated at the size given, 64M by default, so that the
+largest logs are opt-in:
+
+    PYTHONPATH=src python benchmarks/grep_benchmark.py [5G]
+"""
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from file_source import FileSource
+from line_matcher import LineMatcher
+
+PATTERNS = ["2024-01-07", ".*served in 99", ".*ERROR", ".*\\s[0-9]{3}\\s"]
+_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+_LEVELS = ["INFO ", "DEBUG", "WARN ", "ERROR"]
+
+
+def _bytes(size):
+    return int(size[:-1]) * _UNITS[size[-1]]
+
+
+def _write_log(path, size):
+    lines = [
+        f"2024-01-{i % 28 + 1:02d} 12:{i % 60:02d}:{i * 7 % 60:02d} "
+        f"{_LEVELS[i % 7 % 4]} request {i} served in {i * 13 % 997} ms\n"
+        for i in range(1000)
+    ]
+    block = "".join(lines).encode()
+    with open(path, "wb") as f:
+        written = 0
+        while written + len(block) <= size:
+            f.write(block)
+            written += len(block)
+
+
+def _each_line(pattern, path):
+    match = re.compile(pattern).match
+    with FileSource(path) as source:
+        for batch in source.line_batches():
+            [line for line in batch if match(line, 0, len(line) - 1)]
+
+
+def _line_matcher(pattern, path):
+    matcher = LineMatcher(pattern)
+    with FileSource(path) as source:
+        for batch in source.line_batches():
+            matcher.lines(batch)
+
+
+def _gnu_grep(pattern, path):
+    # piped, as GNU grep stops at the first match written to /dev/null
+    subprocess.run(
+        ["grep", "-E", f"^({pattern})", path], stdout=subprocess.PIPE
+    )
+
+
+def _time(run, pattern, path):
+    start = time.perf_counter()
+    run(pattern, path)
+    return time.perf_counter() - start
+
+
+def main():
+    size = sys.argv[1] if len(sys.argv) > 1 else "64M"
+    megabytes = _bytes(size) / 1024 / 1024
+    with tempfile.TemporaryDirectory() as directory:
+        log = os.path.join(directory, "app.log")
+        _write_log(log, _bytes(size))
+        print(
+            f"{'pattern':<24}{'each line':>16}{'line matcher':>16}"
+            f"{'GNU grep':>16}"
+        )
+        for pattern in PATTERNS:
+            times = [
+                _time(run, pattern, log)
+                for run in (_each_line, _line_matcher, _gnu_grep)
+            ]
+            print(f"{pattern:<24}" + "".join(
+                f"{t:>7.2f}s{megabytes / t:>5.0f}MB/s" for t in times
+            ))
+
+
+if __name__ == "__main__":
+    main()
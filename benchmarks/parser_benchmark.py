@@ -0,0 +1,64 @@
+"""
+Per-line latency of shell.eval when every Call, pipeline stage and
+command substitution builds its own Parser (the old behaviour) compared
+with the shared, lazily built parser. Plans are compiled again for each
+line, so that every line is parsed as a new line would be.
+
+    PYTHONPATH=src python benchmarks/parser_benchmark.py
+"""
+import tempfile
+import time
+from collections import deque
+from unittest import mock
+import commands
+import parser
+import plan
+import shell
+
+LINES = {
+    "single call": "echo foo",
+    "10-stage pipe": "echo abc" + " | cut -b 1-" * 9,
+    "50-stage pipe": "echo abc" + " | cut -b 1-" * 49,
+    "substitutions": "echo " + " ".join("`echo a`" for _ in range(10)),
+}
+
+
+def _per_line(cmdline, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        plan.compile_command_line.cache_clear()
+        shell.eval(cmdline, deque())
+    return (time.perf_counter() - start) / repeat
+
+
+def _fresh_parser_per_use():
+    modules = (plan, commands)
+    patches = [mock.patch.object(m, "get_parser", parser.Parser)
+               for m in modules]
+    for p in patches:
+        p.start()
+    return patches
+
+
+def main(repeat=5):
+    print(f"{'line':<16}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for name, cmdline in LINES.items():
+        patches = _fresh_parser_per_use()
+        before = _per_line(cmdline, repeat)
+        for p in patches:
+            p.stop()
+        parser.get_parser()  # the first line of a session pays the build
+        after = _per_line(cmdline, repeat)
+        print(f"{name:<16}{before * 1e3:>14.2f}{after * 1e3:>14.2f}"
+              f"{before / after:>9.1f}x")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for label in ("cold start", "warm start"):
+            start = time.perf_counter()
+            parser.Parser(cache_dir=cache_dir)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<16}{elapsed * 1e3:>14.2f} ms to build a Parser")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Wall time of a text pipeline over a generated log with every pipe
+execution mode, and the per-stage statistics of the threaded mode,
+which show the bottleneck stage. The worker processes of the processes
+mode are started before it is timed.
+
+    PYTHONPATH=src python benchmarks/pipe_benchmark.py
+"""
+import os
+import tempfile
+import time
+from collections import deque
+from commands import Pipe
+from plan import compile_command_line
+from workers import get_pool
+
+MODES = ("sequential", "streaming", "threaded", "processes")
+LINES = 500000
+
+
+def _write_log(path):
+    with open(path, "w") as f:
+        for i in range(LINES):
+            level = "ERROR" if i % 7 == 0 else "INFO"
+            f.write(f"{level} request {i} served in {i % 997} ms\n")
+
+
+def _run(pipe, mode):
+    out = deque()
+    start = time.perf_counter()
+    stats = Pipe(*pipe.calls, mode=mode).eval(out)
+    return time.perf_counter() - start, stats
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        log = os.path.join(directory, "app.log")
+        _write_log(log)
+        pipe = compile_command_line(
+            f"cat {log} | grep ERROR | cut -b 1-20 | sort | uniq"
+        ).commands[0]
+        get_pool().warm()
+        print(f"{'mode':<12}{'time':>10}")
+        for mode in MODES:
+            elapsed, mode_stats = _run(pipe, mode)
+            if mode == "threaded":
+                stats = mode_stats
+            print(f"{mode:<12}{elapsed:>9.3f}s")
+        print()
+        print(stats)
+        print(f"bottleneck: {stats.bottleneck().name}")
+
+
+if __name__ == "__main__":
+    main()
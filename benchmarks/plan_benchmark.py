@@ -0,0 +1,53 @@
+"""
+Per-line latency of executing a repeated command line by re-deriving
+the commands from its (cached) syntax tree on every run, as before,
+compared with executing its compiled, cached execution plan.
+
+    PYTHONPATH=src python benchmarks/plan_benchmark.py
+"""
+import time
+from collections import deque
+from command_evaluator import extract_commands
+from commands import Seq
+from parser import get_parser
+from plan import compile_command_line
+
+LINES = {
+    "single call": "echo foo",
+    "sequence": "echo a; echo b; echo c; echo d",
+    "5-stage pipe": "echo abc" + " | cut -b 1-" * 4,
+    "substitution": "echo `echo foo` bar",
+}
+
+
+def _interpreted(cmdline):
+    Seq(extract_commands(get_parser().command_level_parse(cmdline))).eval(
+        deque()
+    )
+
+
+def _compiled(cmdline):
+    compile_command_line(cmdline).eval(deque())
+
+
+def _per_line(run, cmdline, repeat=5000):
+    run(cmdline)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run(cmdline)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    print(f"{'line':<16}{'interpreted':>14}{'compiled':>14}{'speedup':>10}")
+    for name, cmdline in LINES.items():
+        interpreted = _per_line(_interpreted, cmdline)
+        compiled = _per_line(_compiled, cmdline)
+        print(
+            f"{name:<16}{interpreted * 1e6:>12.1f}us{compiled * 1e6:>12.1f}us"
+            f"{interpreted / compiled:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
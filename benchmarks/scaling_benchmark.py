@@ -0,0 +1,57 @@
+"""
+Time per command of parsing and evaluating generated command lines of
+10 to 100,000 commands, as a sequence and as a single pipeline. Exits
+with an error if the time per command grows more than MAX_GROWTH times
+from the smallest to the largest line, i.e. if either stops being
+linear in the number of commands.
+
+    PYTHONPATH=src python benchmarks/scaling_benchmark.py
+"""
+import sys
+import time
+from collections import deque
+from parser import Parser
+from command_evaluator import extract_commands
+from commands import Seq
+
+SIZES = (10, 100, 1000, 10000, 100000)
+MAX_GROWTH = 3
+LINES = {
+    "sequence": lambda n: "; ".join(["echo a"] * n),
+    "quoted sequence": lambda n: "; ".join(["echo 'a'"] * n),
+    "pipeline": lambda n: "echo a" + " | uniq" * (n - 1),
+}
+
+
+def _per_command(parser, cmdline, no_of_commands, min_time=0.2):
+    repeat = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time:
+        command_tree = parser.command_level_parse(cmdline)
+        Seq(extract_commands(command_tree)).eval(deque())
+        repeat += 1
+    return (time.perf_counter() - start) / repeat / no_of_commands
+
+
+def main():
+    # the parse cache is disabled so every iteration is parsed
+    parser = Parser(cache_size=0)
+    print(f"{'commands':>10}", *(f"{name:>17}" for name in LINES))
+    results = {name: [] for name in LINES}
+    for no_of_commands in SIZES:
+        for name, line in LINES.items():
+            results[name].append(
+                _per_command(parser, line(no_of_commands), no_of_commands)
+            )
+        print(
+            f"{no_of_commands:>10}",
+            *(f"{results[name][-1] * 1e6:>15.1f}us" for name in LINES),
+        )
+    for name, per_command in results.items():
+        growth = per_command[-1] / min(per_command)
+        if growth > MAX_GROWTH:
+            sys.exit(f"{name}: time per command grew {growth:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from abc import ABCMeta, abstractmethod
-from typing import List
+from typing import Iterator, List, Optional
+from streams import Channel, data_mode, popped, text
 
 
 class Application(metaclass=ABCMeta):
@@ -11,3 +12,103 @@ class Application(metaclass=ABCMeta):
     def exec(self, args: List[str], out: List[str], in_pipe: bool) -> None:
         """executes the application"""
         raise NotImplementedError
+
+
+class StreamingApplication(Application):
+
+    """
+    An application that can also consume and produce its data lazily,
+    used by streaming pipes.
+    """
+
+    @classmethod
+    def __subclasshook__(cls, subclass):
+        return hasattr(subclass, "stream") and callable(subclass.stream)
+
+    def exec(self, args, out, in_pipe):
+        """
+        executes the application over the whole output of the previous
+        stage, which is only popped from out if it is read. A Channel is
+        read and written in chunks, so that spilled output stays out of
+        memory.
+        """
+        stdin = popped(out) if in_pipe else None
+        if type(out) is Channel:
+            out.write(self._text_stream(args, stdin))
+        else:
+            out.append("".join(self._text_stream(args, stdin)))
+
+    def _text_stream(self, args, stdin):
+        """the stream exec runs, which is text"""
+        return self.stream(args, stdin)
+
+    @abstractmethod
+    def stream(
+        self, args: List[str], stdin: Optional[Iterator[str]]
+    ) -> Iterator[str]:
+        """
+        executes the application over stdin, an iterator over the text
+        chunks output by the previous stage (None when not in a pipe),
+        returning an iterator over the chunks of its output.
+        """
+        raise NotImplementedError
+
+
+class RecordApplication(StreamingApplication):
+
+    """
+    A streaming application working line by line, that exchanges its
+    lines with the stages next to it as batches of records rather than
+    as text, so that they are not split again.
+    """
+
+    @classmethod
+    def __subclasshook__(cls, subclass):
+        return hasattr(subclass, "records") and callable(subclass.records)
+
+    def stream(self, args, stdin):
+        return text(self.records(args, stdin))
+
+    @abstractmethod
+    def records(
+        self, args: List[str], stdin: Optional[Iterator]
+    ) -> Iterator:
+        """
+        executes the application as stream does, except that both stdin
+        and the output may hold batches of records, streams.Lines,
+        besides text chunks.
+        """
+        raise NotImplementedError
+
+
+class BytesApplication(StreamingApplication):
+
+    """
+    A streaming application that can also work on the bytes of its files
+    and input instead of their text, as it does in bytes mode, its text
+    being decoded only where it leaves it.
+    """
+
+    @classmethod
+    def __subclasshook__(cls, subclass):
+        return (
+            hasattr(subclass, "byte_stream")
+            and callable(subclass.byte_stream)
+        )
+
+    @abstractmethod
+    def byte_stream(
+        self, args: List[str], stdin: Optional[Iterator]
+    ) -> Iterator:
+        """
+        executes the application as stream does, except that it reads
+        bytes, stdin being encoded where it is read, and that the output
+        may hold bytes and batches of records of bytes, streams.ByteLines,
+        besides text chunks and streams.Lines.
+        """
+        raise NotImplementedError
+
+    def _text_stream(self, args, stdin):
+        if data_mode() == "bytes":
+            return text(self.byte_stream(args, stdin))
+        return self.stream(args, stdin)
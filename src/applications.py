@@ -2,9 +2,311 @@ import os
 import re
 import sys
 import glob
+import heapq
+import time
+import threading
+from collections import OrderedDict
+from itertools import chain, islice
 from os import listdir
-from application_interface import Application
+from application_interface import (
+    Application,
+    BytesApplication,
+    RecordApplication,
+    StreamingApplication,
+)
 from exceptions import ApplicationExcecutionError
+from external import External, find_program
+from file_source import FileSource
+from line_matcher import line_matcher
+import streams
+from streams import (
+    BATCH_LINES,
+    RECORD_BATCHES,
+    ByteLines,
+    Channel,
+    Lines,
+    binary,
+    byte_line_batches,
+    byte_records,
+    data_mode,
+    encode,
+    join,
+    last_bytes,
+    last_lines,
+    line_batches,
+    popped,
+    readline_batches,
+    records,
+    spill,
+    text,
+)
+
+
+# seconds since a file last changed before it is cached
+SETTLE_TIME = 1.0
+
+
+class _CachedFile:
+
+    """the content of a file read whole, as chunks and as split lines"""
+
+    __slots__ = ("signature", "chunks", "lines", "size")
+
+    def __init__(self, signature, chunks, lines=None):
+        self.signature = signature
+        self.chunks = chunks
+        self.lines = lines
+        self.size = sum(map(sys.getsizeof, chunks))
+        if lines is not None:
+            self.size += _lines_size(lines)
+
+
+def _lines_size(lines):
+    return sys.getsizeof(lines) + sum(map(sys.getsizeof, lines))
+
+
+def _signature(stat):
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class FileCache:
+
+    """
+    The content of the files applications read, shared by all of them,
+    so that a file read by several commands is read and decoded once.
+    A file is cached once an application has read it to the end, as
+    its chunks and, once an application reading lines asks for them, as
+    its split lines. An entry is used for as long as the inode, size and
+    modification time of its file are unchanged, which is only trusted
+    for files that have not changed for SETTLE_TIME. Files larger than a
+    quarter of the budget, or than streams.SPOOL_THRESHOLD, are read
+    without being cached. The least recently used entries are evicted
+    once the cache takes more than budget bytes. The cache is shared by
+    the stages of a pipe, which may run on threads, and its entries and
+    their total size are only changed under a lock.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # absolute path -> _CachedFile
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hit_ratio,
+                "files": len(self.entries),
+                "size": self.size,
+                "budget": self.budget,
+            }
+
+    def _lookup(self, path):
+        # cached files are read without an open, but not unnoticed
+        sys.audit("applications.read", path)
+        with self._lock:
+            entry = self.entries.get(path)
+            if entry is not None:
+                try:
+                    valid = _signature(os.stat(path)) == entry.signature
+                except OSError:
+                    valid = False
+                if valid:
+                    self.entries.move_to_end(path)
+                    self.hits += 1
+                    return entry
+                self._remove(path)
+            self.misses += 1
+            return None
+
+    def _cacheable(self, stat):
+        if not self.budget:
+            return False
+        limit = min(self.budget // 4, streams.SPOOL_THRESHOLD)
+        # a file changed within the resolution of its modification time
+        # could change again without it changing
+        settled = stat.st_mtime < time.time() - SETTLE_TIME
+        return stat.st_size <= limit and settled
+
+    def _store(self, path, entry):
+        with self._lock:
+            if path in self.entries:
+                self._remove(path)
+            if entry.size > self.budget:
+                return
+            self.entries[path] = entry
+            self.size += entry.size
+            while self.size > self.budget:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, path):
+        # called under the lock
+        self.size -= self.entries.pop(path).size
+
+    def _read(self, path, source, lines):
+        """
+        yields the chunks of a file, or its batches of lines with lines,
+        caching its content once it is read to the end.
+        """
+        cacheable = self._cacheable(source.stat)
+        chunks = source.chunks()
+        held = []
+        if cacheable:
+            chunks = _holding(chunks, held)
+        if not lines:
+            yield from chunks
+            read = None
+        else:
+            read = Lines()
+            plain = True
+            for batch in readline_batches(chunks):
+                if cacheable:
+                    read.extend(batch)
+                    plain = plain and type(batch) is Lines
+                yield batch
+            if not plain:
+                read = list(read)
+        if cacheable:
+            entry = _CachedFile(_signature(source.stat), held, read)
+            self._store(path, entry)
+
+    def chunks(self, file_name):
+        """yields the content of a file in chunks, as read_chunks does"""
+        path = os.path.abspath(file_name)
+        entry = self._lookup(path)
+        if entry is None:
+            with FileSource(path) as source:
+                yield from self._read(path, source, False)
+        else:
+            yield from entry.chunks
+
+    def _lines(self, path, entry):
+        if entry.lines is None:
+            lines = _concatenated(readline_batches(entry.chunks))
+            size = _lines_size(lines)
+            with self._lock:
+                # another stage may have split them, or evicted the entry
+                if entry.lines is None:
+                    entry.lines = lines
+                    entry.size += size
+                    if self.entries.get(path) is entry:
+                        self.size += size
+        return entry.lines
+
+    def lines(self, file_name):
+        """
+        the lines of a file ending with their newline, as
+        file.readlines() gives them, Lines when they are records. The
+        list may be shared, and must not be changed.
+        """
+        path = os.path.abspath(file_name)
+        entry = self._lookup(path)
+        if entry is None:
+            with FileSource(path) as source:
+                lines = _concatenated(self._read(path, source, True))
+            entry = self.entries.get(path)
+            if entry is None or entry.lines is None:
+                return lines
+            return entry.lines
+        return self._lines(path, entry)
+
+    def last_lines(self, file_name, n):
+        """
+        the text of the last n lines of a file. Only the end of a file
+        that is too large to be cached is read.
+        """
+        path = os.path.abspath(file_name)
+        entry = self._lookup(path)
+        if entry is None:
+            with FileSource(path) as source:
+                if not self._cacheable(source.stat):
+                    return source.last_lines(n)
+                lines = _concatenated(self._read(path, source, True))
+        else:
+            lines = self._lines(path, entry)
+        return "".join(lines[max(len(lines) - n, 0):])
+
+    def line_batches(self, file_name):
+        """
+        yields the lines of a file in batches, the same lines as
+        readline_batches over its chunks.
+        """
+        path = os.path.abspath(file_name)
+        entry = self._lookup(path)
+        if entry is None:
+            with FileSource(path) as source:
+                yield from self._read(path, source, True)
+            return
+        lines = self._lines(path, entry)
+        for start in range(0, len(lines), BATCH_LINES):
+            batch = lines[start:start + BATCH_LINES]
+            yield Lines(batch) if type(lines) is Lines else batch
+
+    def byte_chunks(self, file_name):
+        """
+        yields the bytes of a file in chunks, for bytes mode. They are
+        always read from the file, as the cache holds text.
+        """
+        with FileSource(file_name) as source:
+            yield from source.byte_chunks()
+
+    def byte_line_batches(self, file_name):
+        """yields the lines of bytes of a file in ByteLines"""
+        return byte_line_batches(self.byte_chunks(file_name))
+
+    def last_bytes(self, file_name, n):
+        """the last n bytes of a file, read from its end"""
+        with FileSource(file_name) as source:
+            return source.last_bytes(n)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+
+
+def _holding(chunks, held):
+    for chunk in chunks:
+        held.append(chunk)
+        yield chunk
+
+
+def _concatenated(batches):
+    lines = Lines()
+    plain = True
+    for batch in batches:
+        lines.extend(batch)
+        plain = plain and type(batch) is Lines
+    return lines if plain else list(lines)
+
+
+# the file cache shared by every application, SHELL_FILE_CACHE in the
+# environment being its budget in bytes
+file_cache = FileCache(
+    int(os.environ.get("SHELL_FILE_CACHE", 64 * 1024 * 1024))
+)
+
+
+def _byte_batches(file_name, stdin):
+    """
+    the lines of bytes of a file, or of stdin when file_name is None, in
+    ByteLines.
+    """
+    if file_name is not None:
+        return file_cache.byte_line_batches(file_name)
+    if stdin is None:
+        raise ApplicationExcecutionError("Invalid Arguments")
+    return byte_line_batches(binary(stdin))
 
 
 class Pwd(Application):
@@ -60,140 +362,374 @@ class Ls(Application):
         out.append("\n".join(contents) + "\n")
 
 
-class Cat(Application):
+class Cat(BytesApplication):
 
     """concatenates the content of given files"""
 
-    def exec(self, args, out, in_pipe):
+    def _file_names(self, args, stdin):
         if not args:
-            if not in_pipe:
+            if stdin is None:
                 raise ApplicationExcecutionError("Invalid Arguments")
-            args = out.pop().split(" ")  # get input from stdin
-        lines = []
-        for a in args:
-            with open(a.strip()) as f:
-                lines.append(f.read())
-        out.append("".join(lines))
+            args = "".join(stdin).split(" ")  # get input from stdin
+        return [a.strip() for a in args]
+
+    def stream(self, args, stdin):
+        for file_name in self._file_names(args, stdin):
+            yield from file_cache.chunks(file_name)
+
+    def byte_stream(self, args, stdin):
+        stdin = None if stdin is None else text(stdin)
+        for file_name in self._file_names(args, stdin):
+            yield from file_cache.byte_chunks(file_name)
 
 
-class Echo(Application):
+class Echo(StreamingApplication):
 
     """prints its arguments separated by spaces"""
 
-    def exec(self, args, out, in_pipe):
-        if in_pipe:
+    def stream(self, args, stdin):
+        if stdin is not None:
             raise ApplicationExcecutionError(
                 "Echo Can Not Take Arguments From stdin"
                 )
-        out.append(" ".join(args) + "\n")
+        yield " ".join(args) + "\n"
 
 
-class Head(Application):
+class Head(RecordApplication, BytesApplication):
 
     """
     prints the first n (10 if n is not specified)
-    lines of a given file or stdin
+    lines of a given file or stdin, or its first n
+    bytes with -c n. Several files are printed each
+    after a header naming it.
     """
 
-    def _read_first_n_lines_from_file(self, file, n, out):
-        with open(file) as f:
-            lines = f.readlines()
-            content = []
-            for i in range(0, min(len(lines), n)):
-                content.append(lines[i])
-            out.append("".join(content))
-
-    def exec(self, args, out, in_pipe):
-        no_of_args = len(args)
-        if no_of_args == 0 and in_pipe:  # get input from stdin
-            self._read_first_n_lines_from_file(out.pop(), 10, out)
-        elif no_of_args == 1:  # default case
-            self._read_first_n_lines_from_file(args[0], 10, out)
-        elif (
-            no_of_args == 3
-            and args[0] == "-n"
-            and args[1].isnumeric()
-            and int(args[1]) >= 0
+    def _get_arguments(self, args, stdin):
+        """
+        returns the number of lines or bytes, whether it counts bytes,
+        and the files, [None] for stdin
+        """
+        if len(args) >= 2 and args[0] in ("-n", "-c") and (
+            args[1].isnumeric()
         ):
-            self._read_first_n_lines_from_file(args[2], int(args[1]), out)
+            n, in_bytes, files = int(args[1]), args[0] == "-c", args[2:]
         else:
+            n, in_bytes, files = 10, False, args
+        if any(file.startswith("-") for file in files) or (
+            not files and stdin is None
+        ):
             raise ApplicationExcecutionError("Invalid Arguments")
+        return n, in_bytes, files or [None]
+
+    def _headers(self, files):
+        """the header to print before each file, None for a single one"""
+        if len(files) == 1:
+            return [None]
+        return [
+            ("\n" if i else "") + f"==> {file} <==\n"
+            for i, file in enumerate(files)
+        ]
+
+    def records(self, args, stdin):
+        n, in_bytes, files = self._get_arguments(args, stdin)
+        for file, header in zip(files, self._headers(files)):
+            if header is not None:
+                yield header
+            if in_bytes:
+                if file is None:
+                    chunks = binary(stdin)
+                else:
+                    chunks = file_cache.byte_chunks(file)
+                yield from text(self._first_bytes(chunks, n))
+                continue
+            if file is None:
+                batches = readline_batches(stdin)
+            else:
+                batches = file_cache.line_batches(file)
+            yield from self._first_batches(
+                batches, n, records, header is None
+            )
+
+    def byte_stream(self, args, stdin):
+        n, in_bytes, files = self._get_arguments(args, stdin)
+        for file, header in zip(files, self._headers(files)):
+            if header is not None:
+                yield encode(header)
+            if in_bytes:
+                if file is None:
+                    chunks = binary(stdin)
+                else:
+                    chunks = file_cache.byte_chunks(file)
+                yield from self._first_bytes(chunks, n)
+                continue
+            yield from self._first_batches(
+                _byte_batches(file, stdin), n, byte_records, header is None
+            )
+
+    def _first_batches(self, batches, n, records, plain=True):
+        """
+        the first n lines of batches, passed on as text unless plain, as
+        the last line of a file may lack its newline.
+        """
+        if n <= 0:
+            return
+        for batch in batches:
+            # reads no further than the batch of the nth line
+            if batch:
+                yield records(
+                    batch[:n], plain and type(batch) in RECORD_BATCHES
+                )
+            n -= len(batch)
+            if n <= 0:
+                return
+
+    def _first_bytes(self, chunks, n):
+        if n <= 0:
+            return
+        for chunk in chunks:
+            # reads no further than the chunk of the nth byte
+            if type(chunk) is ByteLines:
+                chunk = b"".join(chunk)
+            yield chunk[:n]
+            n -= len(chunk)
+            if n <= 0:
+                return
 
 
-class Tail(Application):
+class Tail(StreamingApplication):
 
     """
     prints the last n (10 if n is not specified) lines of a given file or stdin
+    or, with -c n, its last n bytes. With -n +k or -c +k, prints the file from
+    its kth line or byte on. With -f, goes on printing what is written to the
+    file, and with -F, to the file named by it, as it is written.
     """
 
-    def _read_last_n_lines_from_file(self, file, n, out):
-        with open(file) as f:
-            lines = f.readlines()
-            no_of_lines = len(lines)
-            display_length = min(no_of_lines, n)
-            content = []
-            for i in range(0, display_length):
-                content.append(lines[no_of_lines - display_length + i])
-            out.append("".join(content))
+    FOLLOW_FLAGS = ("-f", "-F")
 
-    def exec(self, args, out, in_pipe):
+    def _get_arguments(self, args, stdin):
+        """
+        returns the number of lines or bytes, whether they are counted from
+        the start of the file, whether it counts bytes, the follow flag, if
+        any, and the file, None for stdin
+        """
+        follow = None
+        if args and args[0] in self.FOLLOW_FLAGS:
+            follow, args = args[0], args[1:]
+        elif len(args) in (3, 4) and args[2] in self.FOLLOW_FLAGS:
+            follow, args = args[2], args[:2] + args[3:]
         no_of_args = len(args)
-        if no_of_args == 0 and in_pipe:  # get input from stdin
-            self._read_last_n_lines_from_file(out.pop(), 10, out)
-        elif no_of_args == 1:  # default case
-            self._read_last_n_lines_from_file(args[0], 10, out)
-        elif (
-            no_of_args == 3
-            and args[0] == "-n"
-            and args[1].isnumeric()
-            and int(args[1]) >= 0
+        if no_of_args == 0 and stdin is not None:  # get input from stdin
+            return 10, False, False, follow, None
+        if no_of_args == 1:  # default case
+            return 10, False, False, follow, args[0]
+        if no_of_args in (2, 3) and args[0] in ("-n", "-c") and (
+            no_of_args == 3 or stdin is not None
         ):
-            self._read_last_n_lines_from_file(args[2], int(args[1]), out)
+            from_start = args[1].startswith("+")
+            count = args[1][1:] if from_start else args[1]
+            file = args[2] if no_of_args == 3 else None
+            if count.isnumeric():
+                return int(count), from_start, args[0] == "-c", follow, file
+        raise ApplicationExcecutionError("Invalid Arguments")
+
+    def _lines_from(self, batches, k):
+        """the text of batches of lines from their kth line on"""
+        skip = max(k - 1, 0)
+        for batch in batches:
+            if skip < len(batch):
+                yield "".join(batch[skip:])
+                skip = 0
+            else:
+                skip -= len(batch)
+
+    def _bytes_from(self, chunks, k):
+        """chunks of bytes from their kth byte on"""
+        skip = max(k - 1, 0)
+        for chunk in chunks:
+            if skip < len(chunk):
+                yield chunk[skip:]
+                skip = 0
+            else:
+                skip -= len(chunk)
+
+    def _followed(self, file, n, from_start, in_bytes, by_name):
+        """
+        the output of tail on a file and what is written to it after, as
+        text and bytes, read from a single open file
+        """
+        with FileSource(file) as source:
+            if not from_start:
+                yield source.last_bytes(n) if in_bytes else (
+                    source.last_lines(n)
+                )
+            elif in_bytes:
+                yield from self._bytes_from(source.byte_chunks(), n)
+            else:
+                yield from self._lines_from(source.line_batches(), n)
+            yield from source.follow(by_name)
+
+    def _from_stdin(self, stdin, n, from_start, in_bytes):
+        """
+        the output of tail on stdin, which cannot be read from its end:
+        its last n lines or bytes are kept as it is read to its end
+        """
+        if in_bytes:
+            chunks = binary(stdin)
+            if from_start:
+                yield from text(self._bytes_from(chunks, n))
+            else:
+                yield from text([last_bytes(chunks, n)])
+        elif from_start:
+            yield from self._lines_from(readline_batches(stdin), n)
         else:
-            raise ApplicationExcecutionError("Invalid Arguments")
+            yield last_lines(stdin, n)
 
+    def stream(self, args, stdin):
+        n, from_start, in_bytes, follow, file = self._get_arguments(
+            args, stdin
+        )
+        if file is None:
+            # stdin is read to its end, so there is nothing to follow
+            yield from self._from_stdin(stdin, n, from_start, in_bytes)
+        elif follow is not None:
+            yield from text(
+                self._followed(file, n, from_start, in_bytes, follow == "-F")
+            )
+        elif not from_start:
+            if in_bytes:
+                yield from text([file_cache.last_bytes(file, n)])
+            else:
+                yield file_cache.last_lines(file, n)
+        elif in_bytes:
+            yield from text(self._bytes_from(file_cache.byte_chunks(file), n))
+        else:
+            yield from self._lines_from(file_cache.line_batches(file), n)
 
-class Grep(Application):
+    def exec(self, args, out, in_pipe):
+        if not any(arg in self.FOLLOW_FLAGS for arg in args):
+            return StreamingApplication.exec(self, args, out, in_pipe)
+        # a followed file never ends, so its output is appended as it is
+        # written, for an out printing it as it is appended
+        stdin = popped(out) if in_pipe else None
+        for chunk in self.stream(args, stdin):
+            out.append(chunk)
 
-    """searches for lines containing a match to the specified pattern"""
 
-    def _find_matches_from_stdin(self, pattern, lines, out):
-        contents = []
-        for line in lines:
-            if re.match(pattern, line):
-                contents.append(line)
-        out.append("\n".join(contents))
+class Grep(RecordApplication, BytesApplication):
 
-    def _find_matches_from_files(self, pattern, files, out):
+    """
+    searches for lines containing a match to the specified pattern,
+    stopping after limit matching lines with -m limit.
+    """
+
+    def _file_matches(self, pattern, files, limit=None):
+        matcher = line_matcher(pattern)
         multiple_files = len(files) > 1
-        contents = []
         for file in files:
-            with open(file) as f:
-                lines = f.readlines()
-                self._grep(pattern, multiple_files, contents, file, lines)
-        out.append("\n".join(contents))
-
-    def _grep(self, pattern, multiple_files, contents, file, lines):
-        for line in lines:
-            line = line.replace("\n", "")
-            if re.match(pattern, line):
-                if multiple_files:
-                    contents.append(f"{file}:{line}")
-                else:
-                    contents.append(line)
+            batches = file_cache.line_batches(file)
+            matches = chain.from_iterable(map(matcher.lines, batches))
+            for line in islice(matches, limit):
+                line = line.replace("\n", "")
+                yield f"{file}:{line}" if multiple_files else line
+
+    def _match_batches(
+        self, pattern, batches, limit=None, final="", newline="\n",
+        records=streams.records,
+    ):
+        """
+        The lines of batches split by readline_batches that match
+        pattern, up to limit of them, as the text of "\n".join over the
+        matching pieces between newlines. Lines are matched up to their
+        newline, so that they are passed on as they are, and the newline
+        of the last match is dropped once no other follows. final is the
+        piece after a last newline, None for files, where it is not
+        matched. Lines of bytes are matched by a pattern of bytes, with
+        a newline and records of bytes. The lines of a batch are found by
+        a LineMatcher, searching the whole batch where it can.
+        """
+        if limit == 0:
+            return
+        matcher = line_matcher(pattern)
+        match = matcher.match
+        held, held_plain = [], True
+        # the newline of a match passed on before the next match was known
+        owed = False
+        for batch in batches:
+            if not batch:
+                # the input is waiting for more data, so the last match is
+                # passed on, and its newline before the next one
+                if held:
+                    yield newline + held[0][:-1] if owed else held[0][:-1]
+                    held, owed = [], True
+                yield newline[:0]
+                continue
+            plain = type(batch) in RECORD_BATCHES
+            if batch and not batch[-1].endswith(newline):
+                batch, final = batch[:-1], batch[-1]
+            matches = matcher.lines(batch)
+            if limit is not None:
+                del matches[limit:]
+                limit -= len(matches)
+            if matches:
+                if held or len(matches) > 1:
+                    if owed:
+                        yield newline
+                        owed = False
+                    yield records(held + matches[:-1], held_plain and plain)
+                held, held_plain = matches[-1:], plain
+            if limit == 0:
+                final = None
+                break
+        if owed and (held or final is not None and match(final)):
+            yield newline
+        if final is not None and match(final):
+            if held:
+                yield records(held, held_plain)
+            yield final
+        elif held:
+            yield held[0][:-1]
+
+    def _get_limit(self, args):
+        """splits off a leading -m option, the matching lines to print"""
+        if args[:1] != ["-m"]:
+            return None, args
+        if len(args) < 2 or not args[1].isnumeric():
+            raise ApplicationExcecutionError("Invalid Arguments")
+        return int(args[1]), args[2:]
 
-    def exec(self, args, out, in_pipe):
+    def records(self, args, stdin):
+        limit, args = self._get_limit(args)
         if len(args) < 1:
             raise ApplicationExcecutionError("Invalid Arguments")
         elif len(args) == 1:
-            if not in_pipe:
+            if stdin is None:
                 raise ApplicationExcecutionError("Invalid Arguments")
-            self._find_matches_from_stdin(args[0], out.pop().split("\n"), out)
+            yield from self._match_batches(
+                args[0], readline_batches(stdin), limit
+            )
+        elif len(args) == 2:
+            yield from self._match_batches(
+                args[0], file_cache.line_batches(args[1]), limit, None
+            )
         else:
-            self._find_matches_from_files(args[0], args[1:], out)
+            matches = self._file_matches(args[0], args[1:], limit)
+            yield from join("\n", matches)
+
+    def byte_stream(self, args, stdin):
+        limit, files = self._get_limit(args)
+        if len(files) not in (1, 2):
+            # the matches of several files are prefixed with their names
+            yield from self.records(args, stdin)
+            return
+        file = files[1] if len(files) == 2 else None
+        yield from self._match_batches(
+            encode(files[0]), _byte_batches(file, stdin), limit,
+            b"" if file is None else None, b"\n", byte_records,
+        )
 
 
-class Cut(Application):
+class Cut(RecordApplication, BytesApplication):
     """
     Cuts out sections from each line of a given file
     or stdin and prints the result to stdout.
@@ -206,13 +742,15 @@ class Cut(Application):
         - `-b -3,5-` extracts the bytes from the beginning of line to 3rd,
                      and from 5th to the end of line.
     - `FILE` is the name of the file. If not specified, uses stdin.
+
+    Lines are cut by character, or by byte in bytes mode.
     """
 
     def _get_section(self, no_of_bytes_param, line):
         """
-        Returns the extracted section from given line.
+        Returns the extracted section from given line, text or bytes.
         """
-        result = ""
+        result = line[:0]
         for param in no_of_bytes_param:
             param_section = [p for p in re.split("(-)", param) if p != ""]
             if len(param_section) == 1 and int(param_section[0]) <= len(
@@ -225,7 +763,7 @@ class Cut(Application):
                 if param_section[0] == "-":  # Case -b -n
                     result += line[: int(param_section[1])]
                 elif param_section[1] == "-":  # Case -b n-
-                    result += str(line[int(param_section[0]) - 1:])
+                    result += line[int(param_section[0]) - 1:]
                     break
             elif len(param_section) == 3 and param_section[1] == "-":
                 # -b n-m (from nth byte to mth byte)
@@ -235,39 +773,57 @@ class Cut(Application):
         return result
 
     def _single_param(self, line, param):
-        if int(param) == 1:
-            return line[0]
-        return line[int(param)]
+        index = 0 if int(param) == 1 else int(param)
+        # a slice, as an item of bytes is an int
+        if index >= len(line):
+            raise IndexError("cut position out of range")
+        return line[index:index + 1]
+
+    def _sections(self, no_of_bytes_param, lines):
+        for line in lines:
+            yield self._get_section(no_of_bytes_param, line.strip())
 
-    def _calculate(self, no_of_bytes_param, lines):
+    def _calculate(self, no_of_bytes_param, lines, newline="\n"):
         """
         Returns the result to print to stdout.
         """
-        result = ""
-        for line in lines:
-            result += self._get_section(no_of_bytes_param, line.strip()) + "\n"
-        return result[:-1]
+        return newline.join(self._sections(no_of_bytes_param, lines))
 
-    def exec(self, args, out, in_pipe):
+    def _get_params(self, args):
         no_of_bytes_param = args[1].split(",")
         no_of_bytes_param.sort(
             key=lambda x: int(x.split("-")[0])
             if x.split("-")[0] != ""
             else -ord(x[0])
         )
+        return no_of_bytes_param
+
+    def records(self, args, stdin):
+        no_of_bytes_param = self._get_params(args)
         if len(args) == 2:
-            if not in_pipe:
+            if stdin is None:
                 raise ApplicationExcecutionError("Invalid Arguments")
-            args = out.pop()  # get input from stdin
-            lines = args.splitlines(keepends=False)
+            batches = line_batches(stdin)  # get input from stdin
         else:
-            file_name = args[2]
-            with open(file_name) as file:
-                lines = file.readlines()
-        out.append(self._calculate(no_of_bytes_param, lines))
+            batches = file_cache.line_batches(args[2])
+        # passes on the sections of a batch of lines at once
+        sections = (
+            self._calculate(no_of_bytes_param, batch)
+            for batch in batches if batch
+        )
+        yield from join("\n", sections)
+
+    def byte_stream(self, args, stdin):
+        no_of_bytes_param = self._get_params(args)
+        batches = _byte_batches(args[2] if len(args) > 2 else None, stdin)
+        sections = (
+            self._calculate(no_of_bytes_param, batch, b"\n")
+            for batch in batches if batch
+        )
+        yield from join(b"\n", sections)
 
 
-class Find(Application):
+class Find(StreamingApplication):
 
     """
     Finds all files with the given pattern in the given directory
@@ -284,19 +840,18 @@ class Find(Application):
         else:
             raise ApplicationExcecutionError("Invalid Arguments")
 
-    def exec(self, args, out, in_pipe):
-        if in_pipe:
+    def stream(self, args, stdin):
+        if stdin is not None:
             raise ApplicationExcecutionError(
                 "Find Can Not Take Arguments From stdin"
                 )
         path, pattern = self._get_path_and_pattern(args)
-        file_names = "\n".join(
-            glob.iglob(path + "/**/" + pattern, recursive=True)
+        yield from join(
+            "\n", glob.iglob(path + "/**/" + pattern, recursive=True)
             )
-        out.append(file_names)
 
 
-class Uniq(Application):
+class Uniq(RecordApplication, BytesApplication):
 
     """
     Detects and deletes adjacent duplicate lines from an input file/stdin
@@ -307,30 +862,24 @@ class Uniq(Application):
     - `OPTIONS`:
         - `-i` ignores case when doing comparison (case insensitive)
     - `FILE` is the name of the file. If not specified, uses stdin.
+
+    In bytes mode, -i only ignores the case of ASCII letters.
     """
 
-    def _prev_and_current_line_equal(self, case_insensitive, line, uniq_lines):
-        if case_insensitive:
-            return (
-                len(uniq_lines) > 0 and
-                line.lower() == uniq_lines[-1].lower()
-                )
-        else:
-            return len(uniq_lines) > 0 and line == uniq_lines[-1]
+    def _uniq(self, batches, case_insensitive, records=streams.records):
+        previous = None
+        for batch in batches:
+            lines = []
+            for line in batch:
+                key = line.lower() if case_insensitive else line
+                if key != previous:
+                    lines.append(line)
+                previous = key
+            if lines:
+                yield records(lines, type(batch) in RECORD_BATCHES)
 
     def _uniq_lines(self, out, lines, case_insensitive):
-        uniq_lines = []
-        for line in lines:
-            if not self._prev_and_current_line_equal(
-                case_insensitive, line, uniq_lines
-            ):
-                uniq_lines.append(line)
-        out.append("".join(uniq_lines))
-
-    def _read_file(self, file_name):
-        with open(file_name) as file:
-            lines = file.readlines()
-        return lines
+        out.append("".join(self._uniq([lines], case_insensitive)))
 
     def _correct_no_of_args(self, num_of_args, in_pipe):
         if not in_pipe:
@@ -347,23 +896,31 @@ class Uniq(Application):
                 return args[0] == "-i"
         return True
 
-    def exec(self, args, out, in_pipe):
+    def _case_insensitive(self, args, in_pipe):
         num_of_args = len(args)
-        case_insensitive = False
         if not self._correct_no_of_args(
             num_of_args, in_pipe
         ) or not self._correct_flags(num_of_args, args, in_pipe):
             raise ApplicationExcecutionError("Invalid Arguments")
-        if len(args) > 0:
-            case_insensitive = args[0] == "-i"
+        return len(args) > 0 and args[0] == "-i"
+
+    def records(self, args, stdin):
+        in_pipe = stdin is not None
+        case_insensitive = self._case_insensitive(args, in_pipe)
         if in_pipe:
-            lines = out.pop().splitlines(keepends=True)
+            batches = line_batches(stdin)
         else:
-            lines = self._read_file(args[-1])
-        self._uniq_lines(out, lines, case_insensitive)
+            batches = file_cache.line_batches(args[-1])
+        yield from self._uniq(batches, case_insensitive)
+
+    def byte_stream(self, args, stdin):
+        in_pipe = stdin is not None
+        case_insensitive = self._case_insensitive(args, in_pipe)
+        batches = _byte_batches(None if in_pipe else args[-1], stdin)
+        yield from self._uniq(batches, case_insensitive, byte_records)
 
 
-class Sort(Application):
+class Sort(RecordApplication, BytesApplication):
     """
     Sorts the contents of a file/stdin line by line
     and prints the result to stdout.
@@ -373,6 +930,9 @@ class Sort(Application):
     - `OPTIONS`:
         - `-r` sorts lines in reverse order
     - `FILE` is the name of the file. If not specified, uses stdin.
+
+    In bytes mode, lines are sorted by their bytes, which sorts utf-8
+    text as it sorts by character.
     """
 
     def _sort_contents(self, contents, out, reverse=False):
@@ -381,8 +941,8 @@ class Sort(Application):
             out.append("".join(contents))
 
     def _read_file(self, file_name):
-        with open(file_name) as f:
-            return f.readlines()
+        # a copy, as it is sorted in place
+        return list(file_cache.lines(file_name))
 
     def _input_from_stdin(self, out):
         result = out.pop()
@@ -403,6 +963,10 @@ class Sort(Application):
         self._sort_contents(contents_of_input, out, True)
 
     def exec(self, args, out, in_pipe):
+        if in_pipe and type(out) is Channel or data_mode() == "bytes":
+            # sorts a spilled input without reading it back whole, and
+            # sorts bytes in bytes mode
+            return StreamingApplication.exec(self, args, out, in_pipe)
         num_of_args = len(args)
         if num_of_args == 0 and in_pipe:
             contents_of_input = self._input_from_stdin(out)
@@ -416,6 +980,61 @@ class Sort(Application):
         else:
             raise ApplicationExcecutionError("Invalid Arguments")
 
+    def _get_files(self, args, stdin):
+        """whether to sort in reverse, and the file to sort if any"""
+        reverse = len(args) > 0 and args[0] == "-r"
+        files = args[1:] if reverse else args
+        if len(files) > 1 or (not files and stdin is None):
+            raise ApplicationExcecutionError("Invalid Arguments")
+        return reverse, files
+
+    def records(self, args, stdin):
+        reverse, files = self._get_files(args, stdin)
+        if files:
+            batches = file_cache.line_batches(files[0])
+        else:
+            batches = line_batches(stdin)
+        yield from self._sorted_batches(batches, reverse)
+
+    def byte_stream(self, args, stdin):
+        reverse, files = self._get_files(args, stdin)
+        batches = _byte_batches(files[0] if files else None, stdin)
+        yield from self._sorted_batches(
+            batches, reverse, b"\n", byte_records
+        )
+
+    def _sorted_batches(
+        self, batches, reverse, newline="\n", records=streams.records
+    ):
+        contents, runs, size = [], [], 0
+        plain = True
+        last = newline
+        for batch in batches:
+            if not batch:
+                continue
+            contents.extend(batch)
+            plain = plain and type(batch) in RECORD_BATCHES
+            last = batch[-1]
+            size += sum(map(len, batch))
+            if size > streams.SPOOL_THRESHOLD:
+                # sorts in runs merged at the end, spilled to disk
+                contents.sort(reverse=reverse)
+                runs.append(spill(contents))
+                contents, size = [], 0
+        contents.sort(reverse=reverse)
+        # only the last record of a stream may lack its newline
+        plain = plain and (
+            last.endswith(newline) or not runs and contents[-1] is last
+        )
+        lines = iter(contents)
+        if runs:
+            lines = heapq.merge(*runs, lines, reverse=reverse)
+        while True:
+            batch = list(islice(lines, BATCH_LINES))
+            if not batch:
+                return
+            yield records(batch, plain)
+
 
 class Clear(Application):
 
@@ -448,21 +1067,156 @@ class UnsafeDecorator:
         self.application = application
         self.call = call
 
-    def exec(self, args, out, in_pipe):
+    def _error(self, error):
+        if isinstance(error, OSError):
+            return f"OS Error: {self.call.raw_command}\n"
+        elif isinstance(error, ApplicationExcecutionError):
+            return f"{error.message}: {self.call.raw_command}\n"
+        return f"Index Error: {self.call.raw_command}\n"
+
+    def exec(self, args, out, in_pipe, stderr=None):
+        """reports errors to stderr, or as output if there is none"""
         try:
             self.application.exec(args, out, in_pipe)
-        except OSError:
-            out.append(f"OS Error: {self.call.raw_command}\n")
-        except ApplicationExcecutionError as e:
-            out.append(f"{e.message}: {self.call.raw_command}\n")
-        except IndexError:
-            out.append(f"Index Error: {self.call.raw_command}\n")
+        except (OSError, ApplicationExcecutionError, IndexError) as e:
+            (out if stderr is None else stderr).append(self._error(e))
+
+    def stream(self, args, stdin, stderr=None):
+        try:
+            yield from stream_application(self.application, args, stdin)
+        except (OSError, ApplicationExcecutionError, IndexError) as e:
+            if stderr is None:
+                yield self._error(e)
+            else:
+                stderr.append(self._error(e))
+
 
+def _copies_files(application, args):
+    """whether a call only concatenates files, copied as they are"""
+    return type(application) is Cat and len(args) > 0
 
-def save_result_to_file(file_name, result):
-    f = open(file_name, "w+")
-    f.write(result)
-    f.close()
+
+def copy_files(file_names, target):
+    """
+    copies files as they are to target, a file name or a file
+    descriptor, by the kernel where it can. Every file is opened before
+    target is, so that a missing one leaves target as it was.
+    """
+    sources = []
+    try:
+        for file_name in file_names:
+            sources.append(FileSource(file_name.strip()))
+        if type(target) is int:
+            for source in sources:
+                source.copy_to(target)
+        else:
+            with open(target, "wb") as f:
+                for source in sources:
+                    source.copy_to(f.fileno())
+    finally:
+        for source in sources:
+            source.close()
+
+
+def _copied_files(file_names, target):
+    copy_files(file_names, target)
+    yield from ()
+
+
+def _open_output(file_name):
+    # lone surrogates, decoded from the bytes of a character cut by
+    # head -c or tail -c, are written back as those bytes
+    return open(file_name, "w+", errors="surrogateescape")
+
+
+def save_output_to_file(file_name, out):
+    """pops the output of a call from out into a file, in chunks"""
+    with _open_output(file_name) as f:
+        if out:
+            for chunk in popped(out):
+                f.write(chunk)
+
+
+def _save_stream_to_file(file_name, chunks):
+    with _open_output(file_name) as f:
+        for chunk in chunks:
+            if type(chunk) is Lines:
+                f.writelines(chunk)
+            elif type(chunk) is str:
+                f.write(chunk)
+            else:
+                # bytes are written as they are, after the text before
+                f.flush()
+                f.buffer.write(
+                    b"".join(chunk) if type(chunk) is not bytes else chunk
+                )
+    yield from ()
+
+
+def _save_read_stream_to_file(file_name, chunks):
+    """
+    saves a stream reading the file it is saved to, which is read to its
+    end before the file is truncated
+    """
+    chunks = Channel(text(chunks))
+    yield from _save_stream_to_file(file_name, chunks.chunks())
+
+
+def _whole_buffer(application, args, stdin):
+    """
+    runs an application that is not streaming aware over the whole
+    output of the previous stage, as a sequential pipe does. Output of
+    the previous stage it does not read is dropped.
+    """
+    out = Channel()
+    if stdin is not None:
+        out.write(stdin)
+    application.exec(args, out, stdin is not None)
+    if stdin is not None and not out.read:
+        out.popleft()
+    yield from out.chunks()
+
+
+def stream_application(
+    application, args, stdin, file_output=None, stderr=None
+):
+    """
+    Runs an application lazily over stdin, an iterator over the output
+    chunks of the previous stage (None when not in a pipe), and returns
+    an iterator over its output chunks. With file_output the output is
+    written to that file instead. Errors of unsafe applications are
+    appended to stderr, or output if it is None. Both streams may hold
+    batches of records, which are only joined into text for applications
+    that do not work on records. In bytes mode, applications that can
+    work on bytes do, and streams may hold bytes too, which are only
+    decoded for applications that cannot. The files cat writes to a
+    file are copied as they are.
+    """
+    read_first = False
+    if file_output and _copies_files(application, args):
+        if not _is_one_of(file_output, args):
+            return _copied_files(args, file_output)
+        read_first = True
+    if type(application) is UnsafeDecorator:
+        chunks = application.stream(args, stdin, stderr)
+    elif isinstance(application, BytesApplication) and (
+        data_mode() == "bytes"
+    ):
+        chunks = application.byte_stream(args, stdin)
+    elif isinstance(application, RecordApplication):
+        chunks = application.records(args, stdin)
+    else:
+        if stdin is not None:
+            stdin = text(stdin)
+        if isinstance(application, StreamingApplication):
+            chunks = application.stream(args, stdin)
+        else:
+            chunks = _whole_buffer(application, args, stdin)
+    if read_first:
+        return _save_read_stream_to_file(file_output, chunks)
+    if file_output:
+        return _save_stream_to_file(file_output, chunks)
+    return chunks
 
 
 def application_factory(app):
@@ -482,21 +1236,98 @@ def application_factory(app):
         "clear": Clear,
         "exit": Exit,
     }
-    return application[app]()
+    if app in application:
+        return application[app]()
+    # names that are not built-in run the program found on PATH
+    if find_program(app) is None:
+        raise KeyError(app)
+    return External(app)
 
 
-def execute_application(call, out, in_pipe):
-    app = call.application
-    args = call.args
+def resolve_application(app, call):
+    """
+    returns the application to execute for the name app, unsafe
+    applications (prefixed with _) are wrapped in an UnsafeDecorator
+    reporting errors with call. Names that are not built-in run the
+    program of that name found on PATH. Returns None for an unsupported
+    unsafe application and raises KeyError for an unknown application.
+    """
     if app[0] == "_":
         try:
-            app = application_factory(app[1:])
+            application = application_factory(app[1:])
         except KeyError:
-            out.append(f"Unsupported Application: {app[1:]}\n")
-            return
-        application = UnsafeDecorator(app, call)
+            return None
+        return UnsafeDecorator(application, call)
+    return application_factory(app)
+
+
+def redirect_files(application, args, in_pipe, file_output):
+    """
+    runs a call of cat on files redirected to a file by copying the
+    files, returning whether it did. Calls in a pipe are run as usual,
+    as they drop the output of the previous call.
+    """
+    if not file_output or in_pipe or not _copies_files(application, args):
+        return False
+    if _is_one_of(file_output, args):
+        # opening the target would truncate a file before it is copied,
+        # so cat reads the files before writing them, as it used to
+        return False
+    copy_files(args, file_output)
+    return True
+
+
+def _is_one_of(file_name, file_names):
+    """whether file_name names the same file as one of file_names"""
+    try:
+        target = os.stat(file_name)
+        return any(
+            os.path.samestat(target, os.stat(name.strip()))
+            for name in file_names
+        )
+    except OSError:
+        return False
+
+
+def exec_application(application, args, out, in_pipe, stderr=None):
+    """
+    runs an application to completion, the errors of unsafe
+    applications going to stderr, or out if it is None.
+    """
+    if type(application) is UnsafeDecorator:
+        application.exec(args, out, in_pipe, stderr)
     else:
-        application = application_factory(app)
-    application.exec(args, out, in_pipe)
+        application.exec(args, out, in_pipe)
+
+
+def exec_to_file(application, args, out, in_pipe, file_output, stderr=None):
+    """
+    runs an application to completion, saving its output to file_output.
+    Its output only passes through out when out holds its input, as out
+    may print what is appended to it, as the output of the shell does.
+    """
+    target = out if in_pipe else Channel()
+    exec_application(
+        application, args, target, in_pipe,
+        target if stderr is None else stderr,
+    )
+    save_output_to_file(file_output, target)
+    if target is not out:
+        out.extend(target.chunks())
+
+
+def execute_application(call, out, in_pipe, stderr=None):
+    application = resolve_application(call.application, call)
+    if application is None:
+        (out if stderr is None else stderr).append(
+            f"Unsupported Application: {call.application[1:]}\n"
+        )
+        return
+    if redirect_files(application, call.args, in_pipe, call.file_output):
+        return
     if call.file_output:
-        save_result_to_file(call.file_output, out.pop())
+        exec_to_file(
+            application, call.args, out, in_pipe, call.file_output, stderr
+        )
+    else:
+        exec_application(application, call.args, out, in_pipe, stderr)
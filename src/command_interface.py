@@ -10,5 +10,10 @@ class Command(metaclass=ABCMeta):
         return hasattr(subclass, "eval") and callable(subclass.exec)
 
     @abstractmethod
-    def eval(self, out: Deque, in_pipe: Optional[bool] = False) -> None:
+    def eval(
+        self,
+        out: Deque,
+        in_pipe: Optional[bool] = False,
+        stderr: Optional[Deque] = None,
+    ) -> None:
         raise NotImplementedError
@@ -1,51 +1,110 @@
-from parser import Parser
-from call_evaluator import CommandSubstituitionVisitor
-from call_evaluator import CallTreeVisitor
-from applications import execute_application
+import os
+from collections import deque
+from parser import get_parser
+from call_evaluator import CallEvaluator
+from applications import (
+    execute_application,
+    resolve_application,
+    stream_application,
+)
 from command_interface import Command
+from executors import EXECUTORS
+from result_cache import eval_command
+
+
+def default_pipe_mode():
+    """
+    how pipes are executed, selectable with SHELL_PIPE_MODE:
+        sequential - each call runs to completion in turn
+        streaming - calls are chained as lazy streams (the default)
+        threaded - every call streams on its own thread
+        processes - as threaded, with CPU-bound applications run in
+            worker processes
+    """
+    return os.environ.get("SHELL_PIPE_MODE", "streaming")
 
 
 class Call(Command):
-    def __init__(self, raw_command):
-        self.raw_command = raw_command
+    def __init__(self, call):
+        """
+        call is either the syntax tree of the call or its raw text,
+        which is parsed when the call is evaluated.
+        """
+        if type(call) is str:
+            self.call_tree = None
+            self._raw_command = call
+        else:
+            self.call_tree = call
+            self._raw_command = None
 
         self.application = None
         self.args = []
         self.file_output = None
 
-    def _valid(self, out, call_tree):
+    @property
+    def raw_command(self):
+        # only needed for error messages, so rebuilt lazily
+        if self._raw_command is None:
+            self._raw_command = self.call_tree.raw
+        return self._raw_command
+
+    def _valid(self, stderr, call_tree):
         if not call_tree:
             if self.raw_command:
-                out.append(f"Unrecognized Command: {self.raw_command}\n")
+                stderr.append(f"Unrecognized Command: {self.raw_command}\n")
             return False
         return True
 
-    def _eval_command_subsitution(self, out, call_tree):
-        command_substituition_visitor = CommandSubstituitionVisitor(out)
-        command_substituition_visitor.visit(call_tree)
-
-    def _visit_call_tree(self, call_tree):
+    def _evaluate_call_tree(self, call_tree):
         """
-        visits call tree and extracts application, arguments, and
-        file output (if any).
+        evaluates the call tree and extracts application, arguments,
+        and file output (if any).
         """
-        call_tree_visitor = CallTreeVisitor()
-        call_tree_visitor.visit_topdown(call_tree)
+        call_evaluator = CallEvaluator()
+        call_evaluator.evaluate(call_tree)
+
+        self.application = call_evaluator.application
+        self.args = call_evaluator.args
+        self.file_output = call_evaluator.file_output
 
-        self.application = call_tree_visitor.application
-        self.args = call_tree_visitor.args
-        self.file_output = call_tree_visitor.file_output
+    def _parsed(self):
+        if self.call_tree is None:
+            return get_parser().call_level_parse(self.raw_command)
+        return self.call_tree
 
-    def eval(self, out, in_pipe=False):
-        parser = Parser()
-        call_tree = parser.call_level_parse(self.raw_command)
-        if not self._valid(out, call_tree):
+    def eval(self, out, in_pipe=False, stderr=None):
+        call_tree = self._parsed()
+        if not self._valid(out if stderr is None else stderr, call_tree):
             return
         else:
-            self._eval_command_subsitution(out, call_tree)
-            self._visit_call_tree(call_tree)
+            self._evaluate_call_tree(call_tree)
             if self.application:
-                execute_application(self, out, in_pipe)
+                execute_application(self, out, in_pipe, stderr)
+
+    def stream(self, stdin=None, stderr=None):
+        """
+        evaluates the call lazily over stdin, the output chunks of the
+        previous call in a pipe, yielding its output chunks. Errors are
+        appended to stderr, or output if it is None.
+        """
+        errors = deque() if stderr is None else stderr
+        call_tree = self._parsed()
+        if self._valid(errors, call_tree):
+            self._evaluate_call_tree(call_tree)
+            application = None
+            if self.application:
+                application = resolve_application(self.application, self)
+                if application is None:
+                    errors.append(
+                        "Unsupported Application: "
+                        f"{self.application[1:]}\n"
+                    )
+            if application is not None:
+                yield from stream_application(
+                    application, self.args, stdin, self.file_output, stderr
+                )
+        if stderr is None:
+            yield from errors
 
 
 class PipeIterator:
@@ -53,19 +112,9 @@ class PipeIterator:
     Allows ordered iteration over all calls in a pipe
     """
 
-    def _calls(self, pipe):
-        calls = []
-        while type(pipe.lhs()) is Pipe:
-            calls.append(pipe.rhs())
-            pipe = pipe.lhs()
-        calls.append(pipe.rhs())
-        calls.append(pipe.lhs())
-        calls.reverse()
-        return calls
-
     def __init__(self, pipe):
         self.index = 0
-        self.calls = self._calls(pipe)
+        self.calls = pipe.calls
 
     def __next__(self):
         if self.index >= len(self.calls):
@@ -78,35 +127,46 @@ class PipeIterator:
 class Pipe(Command):
 
     """
-    A Pipe is made up of Calls and/or other Pipes where:
-        lhs = pipe | call
-        rhs = call
+    A Pipe is a flat sequence of two or more Calls, so that long
+    pipelines are neither nested nor unwound recursively. Pipes passed
+    in are flattened:
+        Pipe(Pipe(a, b), c) == Pipe(a, b, c)
+    lhs and rhs give the pipe split before its last call. mode selects
+    the executor running the calls, default_pipe_mode() if None.
     """
 
-    def __init__(self, lhs, rhs):
-        self.calls = (lhs, rhs)
+    def __init__(self, *commands, mode=None):
+        if mode is not None and mode not in EXECUTORS:
+            raise ValueError(f"unknown pipe mode {mode}")
+        calls = []
+        for command in commands:
+            if type(command) is Pipe:
+                calls.extend(command.calls)
+            else:
+                calls.append(command)
+        self.calls = tuple(calls)
+        self.mode = mode
 
     def lhs(self):
-        return self.calls[0]
+        if len(self.calls) == 2:
+            return self.calls[0]
+        return Pipe(*self.calls[:-1])
 
     def rhs(self):
-        return self.calls[1]
+        return self.calls[-1]
 
     def __iter__(self):
         return PipeIterator(self)
 
     def eval(self, out):
         """
-        For every command in a pipe, excluding the first, we take input from
-        out as args by passing in in_pipe as true when evaluating each call
+        runs the pipe with the executor of its mode, returning the
+        executor's statistics, if it keeps any.
         """
-        first_call = True
-        for call in self:
-            if first_call:
-                call.eval(out)
-                first_call = False
-            else:
-                call.eval(out, True)
+        mode = self.mode or default_pipe_mode()
+        if mode not in EXECUTORS:
+            raise ValueError(f"unknown pipe mode {mode}")
+        return EXECUTORS[mode](self.calls, out)
 
 
 class Seq(Command):
@@ -115,4 +175,4 @@ class Seq(Command):
 
     def eval(self, out):
         for commands in self.commands:
-            commands.eval(out)
+            eval_command(commands, out)
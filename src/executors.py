@@ -0,0 +1,326 @@
+"""
+Executors run the calls of a pipe, given as a sequence of objects with
+eval(out, in_pipe, stderr) and stream(stdin, stderr) methods. Every call
+has an output channel of its own, read by the next call only, while
+errors are reported straight to the output of the pipe. Streams passed
+between calls may hold batches of records, streams.Lines, which are
+joined into text where they reach the output of the pipe. Consecutive
+calls running programs are connected to each other directly, as a single
+stage, by every executor running calls concurrently.
+"""
+import queue
+import threading
+import time
+from external import connect
+from streams import Channel, buffered, finish, text
+from workers import ProcessStage, get_pool, offload
+
+# most stages chained as streams, as every stage adds frames to the
+# stack of each read from the end of the chain
+MAX_CHAIN = 16
+# buffers of chunks queued between two threaded stages
+QUEUE_SIZE = 16
+# how often blocked threaded stages check whether the pipe was cancelled
+_POLL_INTERVAL = 0.05
+_END = object()
+
+
+def sequential(calls, out):
+    """
+    runs each call to completion in turn, every call but the first
+    taking the output of the previous one from its channel.
+    """
+    stdin = None
+    for call in calls:
+        stdout = Channel()
+        if stdin is None:
+            call.eval(stdout, False, out)
+        else:
+            stdout.extend(stdin or [""])
+            call.eval(stdout, True, out)
+        stdin = stdout
+    out.extend(stdin.chunks())
+
+
+def _stage(call, stdin, stderr):
+    completed = False
+    try:
+        yield from call.stream(stdin, stderr)
+        completed = True
+    finally:
+        if stdin is not None:
+            finish(stdin, completed)
+
+
+def stream(calls, stdin=None, stderr=None):
+    """
+    chains the calls lazily, each one reading the output chunks of the
+    previous one as they are produced, and returns the output stream of
+    the last call, as text. Errors are appended to stderr, or output if
+    it is None.
+    """
+    for call in calls:
+        stdin = _stage(call, stdin, stderr)
+    return text(stdin)
+
+
+class _Chain:
+
+    """calls chained as streams, run as a single stage of a pipe"""
+
+    def __init__(self, calls):
+        self.calls = calls
+        self.raw_command = " | ".join(
+            getattr(call, "raw_command", "") for call in calls
+        )
+
+    def stream(self, stdin=None, stderr=None):
+        return stream(self.calls, stdin, stderr)
+
+
+def streaming(calls, out):
+    """
+    runs the calls as a chain of streams, in constant memory. Pipes of
+    more than MAX_CHAIN calls run in chains of MAX_CHAIN calls, each
+    chain on a thread of its own, connected to the next one by a
+    bounded queue as threaded connects its stages.
+    """
+    calls = connect(calls)
+    if len(calls) > MAX_CHAIN:
+        threaded([
+            _Chain(calls[start:start + MAX_CHAIN])
+            for start in range(0, len(calls), MAX_CHAIN)
+        ], out)
+        return
+    for chunk in stream(calls, None, out):
+        if chunk:
+            out.append(chunk)
+
+
+class StageStats:
+
+    """
+    statistics of a stage of a threaded pipe: the buffers of chunks it
+    output, the depth of its output queue when it output them, and the
+    time it spent waiting for input and blocked on a full output queue.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.buffers = 0
+        self.total_depth = 0
+        self.max_depth = 0
+        self.input_wait = 0.0
+        self.output_wait = 0.0
+        self.elapsed = 0.0
+
+    @property
+    def mean_depth(self):
+        return self.total_depth / self.buffers if self.buffers else 0.0
+
+    @property
+    def busy(self):
+        """time spent neither waiting for input nor blocked on output"""
+        return max(0.0, self.elapsed - self.input_wait - self.output_wait)
+
+
+class PipelineStats:
+
+    """the StageStats of every stage of a threaded pipe, in order"""
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    def bottleneck(self):
+        """the stage that was busy for longest"""
+        return max(self.stages, key=lambda stage: stage.busy)
+
+    def __str__(self):
+        lines = [
+            f"{'stage':<30}{'buffers':>8}{'mean depth':>12}{'max depth':>11}"
+            f"{'input wait':>12}{'output wait':>13}{'busy':>10}"
+        ]
+        for stage in self.stages:
+            lines.append(
+                f"{stage.name[:29]:<30}{stage.buffers:>8}"
+                f"{stage.mean_depth:>12.1f}{stage.max_depth:>11}"
+                f"{stage.input_wait:>11.3f}s{stage.output_wait:>12.3f}s"
+                f"{stage.busy:>9.3f}s"
+            )
+        return "\n".join(lines)
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _StageQueue:
+
+    """
+    The bounded queue of chunk buffers output by a threaded stage. Its consumer
+    closes it when done, as finish does for streams: the producer keeps
+    running with its output dropped if the consumer completed without
+    reading it, and stops otherwise.
+    """
+
+    def __init__(self, cancelled, stats):
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.cancelled = cancelled
+        self.stats = stats
+        self.read = False
+        self.state = "open"
+
+    def _put(self, item):
+        start = time.perf_counter()
+        try:
+            while self.state == "open":
+                if self.cancelled.is_set():
+                    raise _Cancelled()
+                try:
+                    self.queue.put(item, timeout=_POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    pass
+        finally:
+            self.stats.output_wait += time.perf_counter() - start
+
+    def put(self, buffer):
+        """queues a buffer, returns False when the producer should stop"""
+        depth = self.queue.qsize()
+        self.stats.buffers += 1
+        self.stats.total_depth += depth
+        self.stats.max_depth = max(self.stats.max_depth, depth)
+        self._put(buffer)
+        return self.state != "stop"
+
+    def put_end(self):
+        self._put(_END)
+
+    def chunks(self, stats):
+        """the queued chunks, recording the time waited in stats"""
+        self.read = True
+        while True:
+            start = time.perf_counter()
+            while True:
+                if self.cancelled.is_set():
+                    raise _Cancelled()
+                if self.state != "open":
+                    return
+                try:
+                    buffer = self.queue.get(timeout=_POLL_INTERVAL)
+                    break
+                except queue.Empty:
+                    stats.input_wait += time.perf_counter() - start
+                    # an empty chunk lets the stage pass on what it
+                    # holds while it waits
+                    yield ""
+                    start = time.perf_counter()
+            stats.input_wait += time.perf_counter() - start
+            if buffer is _END:
+                return
+            yield from buffer
+
+    def close(self, completed):
+        self.state = "drain" if completed and not self.read else "stop"
+
+
+def _run_stage(call, stdin, output, stderr, stats, cancelled, errors):
+    start = time.perf_counter()
+    completed = False
+    chunks = None
+    try:
+        chunks = call.stream(
+            None if stdin is None else stdin.chunks(stats), stderr
+        )
+        for buffer in buffered(chunks):
+            if not output.put(buffer):
+                break
+        completed = True
+        output.put_end()
+    except _Cancelled:
+        pass
+    except BaseException as e:
+        errors.append(e)
+        cancelled.set()
+    finally:
+        if chunks is not None:
+            chunks.close()
+        if stdin is not None:
+            stdin.close(completed)
+        stats.elapsed = time.perf_counter() - start
+
+
+def threaded(calls, out, cancelled=None):
+    """
+    Runs every call on its own thread, so that stages waiting for I/O
+    do not hold up the others. Stages are connected by bounded queues
+    of QUEUE_SIZE buffers of chunks: a stage blocks while the next one
+    falls behind, so memory stays bounded. An exception in any stage cancels
+    the whole pipe and is raised once every stage has stopped. Returns
+    the PipelineStats of the run.
+    """
+    cancelled = cancelled or threading.Event()
+    calls = connect(calls)
+    errors = []
+    stats = [StageStats(getattr(call, "raw_command", "")) for call in calls]
+    threads = []
+    stdin = None
+    for call, stage_stats in zip(calls, stats):
+        output = _StageQueue(cancelled, stage_stats)
+        threads.append(
+            threading.Thread(
+                target=_run_stage,
+                args=(
+                    call, stdin, output, out,
+                    stage_stats, cancelled, errors,
+                ),
+                daemon=True,
+            )
+        )
+        stdin = output
+    for thread in threads:
+        thread.start()
+    completed = False
+    try:
+        for chunk in text(stdin.chunks(StageStats("out"))):
+            if chunk:
+                out.append(chunk)
+        completed = True
+    except _Cancelled:
+        pass
+    finally:
+        if not completed:
+            cancelled.set()
+        stdin.close(completed)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return PipelineStats(stats)
+
+
+def processes(calls, out):
+    """
+    runs the calls as threaded does, except the compiled calls of
+    CPU-bound applications, which run in the worker processes of the
+    shared pool so that they do not share the GIL. A pipe offloads no
+    more calls than the pool keeps workers, the others run on threads.
+    """
+    cancelled = threading.Event()
+    pool = get_pool()
+    stages = []
+    offloaded = 0
+    for call in calls:
+        if offloaded < pool.size:
+            call = offload(call, pool, cancelled)
+            offloaded += type(call) is ProcessStage
+        stages.append(call)
+    return threaded(stages, out, cancelled)
+
+
+EXECUTORS = {
+    "sequential": sequential,
+    "streaming": streaming,
+    "threaded": threaded,
+    "processes": processes,
+}
@@ -0,0 +1,183 @@
+"""
+External programs, run for the application names that are not built-in
+and are found on PATH, so that tools like jq or awk can take part in a
+pipeline. A program is spawned with its stdin and stdout connected to
+OS pipes. The output of the previous stage is written to its stdin by a
+pump thread while its stdout is read as the output stream of the stage,
+so that neither side buffers the whole payload and a program filling
+one pipe never waits on the other.
+
+Consecutive programs of a pipe are run as one stage, connected to each
+other by OS pipes, so that what one writes the next reads straight from
+the kernel, without passing through the shell.
+"""
+import codecs
+import errno
+import shutil
+import subprocess
+import threading
+from application_interface import StreamingApplication
+from streams import CHUNK_SIZE, text
+
+# text is passed to programs as utf-8, undecodable bytes of their output
+# being kept as lone surrogates so that they are passed on unchanged
+ENCODING = "utf-8"
+_ERRORS = "surrogateescape"
+
+
+def find_program(name):
+    """the path of the program run for name, None if there is none"""
+    return shutil.which(name)
+
+
+def _argv(name, args):
+    # looked up on every run, as PATH and the working directory change
+    path = find_program(name)
+    if path is None:
+        raise FileNotFoundError(errno.ENOENT, "Command Not Found", name)
+    return [path, *args]
+
+
+def _pump(chunks, pipe, errors):
+    """writes a stream to the stdin of a program, then closes it"""
+    try:
+        for chunk in chunks:
+            pipe.write(chunk.encode(ENCODING, _ERRORS))
+            pipe.flush()
+    except (BrokenPipeError, ValueError):
+        # the program exited, or was killed, without reading it all
+        pass
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        try:
+            pipe.close()
+        except BrokenPipeError:
+            pass
+
+
+def programs(commands, stdin):
+    """
+    Runs a pipe of programs over stdin, yielding the output of the last
+    one. commands are the (name, args, file_output) of the programs, in
+    order. Each program but the first reads the stdout of the previous
+    one through an OS pipe, or nothing when that went to its file
+    output, so only stdin and the output of the last program pass
+    through the shell.
+    """
+    argvs = [_argv(name, args) for name, args, _ in commands]
+    processes = []
+    pump = None
+    errors = []
+    completed = False
+    try:
+        source = subprocess.DEVNULL if stdin is None else subprocess.PIPE
+        for argv, (_, _, file_output) in zip(argvs, commands):
+            stdout = subprocess.PIPE
+            if file_output:
+                stdout = open(file_output, "wb")
+            try:
+                # without close_fds, CPython spawns with posix_spawn
+                process = subprocess.Popen(
+                    argv, stdin=source, stdout=stdout, close_fds=False
+                )
+            finally:
+                # the programs hold their own ends of the pipes, so that
+                # one exiting closes the pipe to the other
+                if processes and source is processes[-1].stdout:
+                    source.close()
+                if file_output:
+                    stdout.close()
+            processes.append(process)
+            source = process.stdout or subprocess.DEVNULL
+        if stdin is not None:
+            pump = threading.Thread(
+                target=_pump, args=(text(stdin), processes[0].stdin, errors),
+                daemon=True,
+            )
+            pump.start()
+        last = processes[-1]
+        if last.stdout is not None:
+            decoder = codecs.getincrementaldecoder(ENCODING)(_ERRORS)
+            while True:
+                data = last.stdout.read1(CHUNK_SIZE)
+                chunk = decoder.decode(data, not data)
+                if chunk:
+                    yield chunk
+                if not data:
+                    break
+        completed = True
+    finally:
+        for process in processes:
+            if not completed:
+                process.kill()
+            if process.stdout is not None:
+                process.stdout.close()
+        if pump is None and processes and processes[0].stdin is not None:
+            processes[0].stdin.close()
+        for process in processes:
+            process.wait()
+        if pump is not None:
+            pump.join()
+    if errors:
+        raise errors[0]
+
+
+class External(StreamingApplication):
+
+    """
+    Runs a program found on PATH. Its exit status is ignored, as the
+    shell reports no exit status, and its stderr is the shell's. Closing
+    the output stream before the program is done kills it, the way a
+    closed pipe stops a process.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def stream(self, args, stdin):
+        return programs([(self.name, args, None)], stdin)
+
+
+class ProgramPipe:
+
+    """
+    Consecutive compiled calls of a pipe running programs, run as a
+    single stage of programs connected by OS pipes.
+    """
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    @property
+    def raw_command(self):
+        return " | ".join(call.raw_command for call in self.calls)
+
+    def stream(self, stdin=None, stderr=None):
+        commands = [call.invocation() for call in self.calls]
+        return programs(commands, stdin)
+
+
+def _runs_program(call):
+    return type(getattr(call, "executable", None)) is External
+
+
+def connect(calls):
+    """
+    replaces the runs of two or more consecutive calls of a pipe that
+    run programs by ProgramPipes, returns the other calls as they are.
+    """
+    stages = []
+    run = []
+    for call in (*calls, None):
+        if call is not None and _runs_program(call):
+            run.append(call)
+            continue
+        if len(run) > 1:
+            stages.append(ProgramPipe(tuple(run)))
+        else:
+            stages.extend(run)
+        run = []
+        if call is not None:
+            stages.append(call)
+    return stages
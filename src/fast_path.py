@@ -0,0 +1,86 @@
+import re
+from lark.lexer import Token
+from syntax_tree import Argument, Call, Pipe, Redirection, Seq
+
+# anything that needs the full grammar: quotes, substitutions, newlines
+_NOT_SIMPLE = re.compile(r"['\"`\n]")
+_TOKENS = re.compile(r"([ \t\r\f]+)|([<>])|([^ \t\r\f<>]+)")
+
+
+def _call(text):
+    """
+    Splits a call on whitespace and redirections, following the call
+    rule of shell_grammar.lark: atoms are separated by whitespace and
+    a redirection may be followed by whitespace before its file name.
+    Returns None for an empty call and False when the call is invalid.
+    """
+    tokens = _TOKENS.findall(text)
+    atoms = []
+    after_atom = False
+    i = 0
+    while i < len(tokens):
+        whitespace, redirection, word = tokens[i]
+        i += 1
+        if whitespace:
+            after_atom = False
+            continue
+        if after_atom:
+            return False
+        if redirection:
+            if i < len(tokens) and tokens[i][0]:
+                i += 1
+            if i == len(tokens) or not tokens[i][2]:
+                return False
+            file_name = Argument((Token("UNQUOTED", tokens[i][2]),))
+            atoms.append(Redirection(redirection, file_name))
+            i += 1
+        else:
+            atoms.append(Argument((Token("UNQUOTED", word),)))
+        after_atom = True
+    if not atoms:
+        return None
+    if not any(type(atom) is Argument for atom in atoms):
+        return False
+    return Call(tuple(atoms))
+
+
+def _pipeline(text):
+    """
+    Splits a pipeline into its calls. Returns None for an empty
+    pipeline and False when a call is invalid, or empty in a pipe.
+    """
+    calls = [_call(call_text) for call_text in text.split("|")]
+    if len(calls) == 1:
+        return calls[0]
+    if False in calls or None in calls:
+        return False
+    return Pipe(tuple(calls))
+
+
+def parse_simple_call(text):
+    """
+    Builds the syntax tree of a call with no quotes or backquotes
+    without going through lark. Returns False when the call is not in
+    that subset or is invalid, so the caller can use the full grammar.
+    """
+    if _NOT_SIMPLE.search(text) or ";" in text or "|" in text:
+        return False
+    return _call(text)
+
+
+def parse_simple_command_line(text):
+    """
+    Builds the syntax tree of a command line with no quotes or
+    backquotes without going through lark. Returns False when the line
+    is not in that subset or is invalid.
+    """
+    if _NOT_SIMPLE.search(text):
+        return False
+    commands = []
+    for pipeline_text in text.split(";"):
+        pipeline = _pipeline(pipeline_text)
+        if pipeline is False:
+            return False
+        if pipeline is not None:
+            commands.append(pipeline)
+    return Seq(tuple(commands))
@@ -0,0 +1,439 @@
+"""
+The files built-in applications read, each read the way its size and
+the way it is accessed call for. A small file is read with a single
+read, a file scanned from start to end is read in large buffers, with
+the kernel told to read ahead, and the end of a file is found in a
+memory map of it, without reading what comes before. Of a stream, which
+cannot be read from its end, only as much of the end as is asked for is
+kept as it is read. A file copied as it is to another file, or to stdout,
+is copied by the kernel, without passing through the shell.
+
+A file followed as it grows, as tail -f follows it, is read again when
+inotify reports that it changed, on Linux, and every POLL_INTERVAL
+seconds otherwise.
+"""
+import ctypes
+import errno
+import io
+import mmap
+import os
+import select
+import stat
+import struct
+import sys
+import time
+from streams import (
+    CHUNK_SIZE,
+    FLUSH_INTERVAL,
+    byte_line_batches,
+    file_chunks,
+    last_bytes,
+    last_lines,
+    readline_batches,
+)
+
+# files of at most SMALL_FILE bytes are read with a single read
+SMALL_FILE = CHUNK_SIZE
+# bytes read at once when scanning a larger file
+READ_SIZE = 256 * 1024
+# bytes copied at once by the kernel, and by reads and writes otherwise
+KERNEL_COPY_SIZE = 1024 * 1024 * 1024
+COPY_SIZE = 1024 * 1024
+# errors of kernel copies between files they cannot copy between
+_NOT_COPYABLE = frozenset([
+    errno.EBADF, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP,
+    errno.EXDEV,
+])
+# seconds between the reads of a followed file, at most
+POLL_INTERVAL = 1.0
+_CR, _LF = 13, 10
+# inotify flags and events, from <sys/inotify.h>
+_IN_NONBLOCK, _IN_CLOEXEC = os.O_NONBLOCK, os.O_CLOEXEC
+_IN_MODIFY, _IN_ATTRIB, _IN_MOVED_FROM, _IN_MOVED_TO = 0x2, 0x4, 0x40, 0x80
+_IN_CREATE, _IN_DELETE, _IN_DELETE_SELF, _IN_MOVE_SELF = (
+    0x100, 0x200, 0x400, 0x800,
+)
+_IN_Q_OVERFLOW = 0x4000
+# events of a followed file, and of the entries of its directory that
+# replace it under its name
+_FILE_EVENTS = _IN_MODIFY | _IN_ATTRIB | _IN_DELETE_SELF | _IN_MOVE_SELF
+_NAME_EVENTS = _IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO
+_EVENT = struct.Struct("iIII")
+
+
+def last_lines_start(buffer, n):
+    """
+    the offset in a buffer of the last n lines of its text, lines ending
+    with "\\n", "\\r\\n" or "\\r" as they do when read in text mode. Only
+    the lines from that offset are searched.
+    """
+    end = len(buffer)
+    if n <= 0:
+        return end
+    # the line ending of the last line, if any, belongs to it
+    if end and buffer[end - 1] == _LF:
+        end -= 1
+    if end and buffer[end - 1] == _CR:
+        end -= 1
+    start = 0
+    for _ in range(n):
+        line_feed = buffer.rfind(b"\n", 0, end)
+        # a carriage return ends a line of its own only after the line
+        # feed, which keeps the search within the lines searched
+        position = buffer.rfind(b"\r", line_feed + 1, end)
+        if position < 0:
+            position = line_feed
+        if position < 0:
+            return 0
+        start = position + 1
+        end = position
+        if buffer[position] == _LF and position and (
+            buffer[position - 1] == _CR
+        ):
+            end -= 1
+    return start
+
+
+class FileSource:
+
+    """
+    An open file, read in text mode as open does, as chunks, batches of
+    lines, or a buffer of its bytes, or as chunks and batches of lines of
+    bytes. Use it as a context manager.
+    """
+
+    def __init__(self, file_name):
+        self.file = open(file_name, buffering=READ_SIZE)
+        self.map = None
+        try:
+            self.stat = os.fstat(self.file.fileno())
+        except BaseException:
+            self.file.close()
+            raise
+
+    @property
+    def size(self):
+        return self.stat.st_size
+
+    @property
+    def regular(self):
+        return stat.S_ISREG(self.stat.st_mode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+    def _advise(self, advice):
+        if hasattr(os, "posix_fadvise") and self.regular:
+            try:
+                os.posix_fadvise(self.file.fileno(), 0, 0, advice)
+            except OSError:
+                pass
+
+    def _chunks(self, file):
+        if self.regular and self.size <= SMALL_FILE:
+            # reads to the end, should the file have grown
+            data = file.read()
+            if data:
+                yield data
+            return
+        if hasattr(os, "POSIX_FADV_SEQUENTIAL"):
+            self._advise(os.POSIX_FADV_SEQUENTIAL)
+        yield from file_chunks(file)
+
+    def chunks(self):
+        """yields the rest of the file in chunks, as read_chunks does"""
+        return self._chunks(self.file)
+
+    def byte_chunks(self):
+        """yields the rest of the bytes of the file in chunks"""
+        return self._chunks(self.file.buffer)
+
+    def line_batches(self):
+        """
+        yields the lines of the rest of the file in batches, as
+        readline_batches does.
+        """
+        return readline_batches(self.chunks())
+
+    def byte_line_batches(self):
+        """
+        yields the lines of bytes of the rest of the file in batches, as
+        byte_line_batches does.
+        """
+        return byte_line_batches(self.byte_chunks())
+
+    def buffer(self):
+        """
+        the bytes of the file, mapped in memory when it is a regular file
+        so that only the pages used are read, read otherwise.
+        """
+        if not self.regular or self.size == 0:
+            return self.file.buffer.read()
+        if self.map is None:
+            self.map = mmap.mmap(
+                self.file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        return self.map
+
+    def decode(self, data):
+        """the text of bytes of the file, as reading it gives it"""
+        wrapper = io.TextIOWrapper(
+            io.BytesIO(data),
+            encoding=self.file.encoding,
+            errors=self.file.errors,
+        )
+        return wrapper.read()
+
+    def copy_to(self, fd):
+        """
+        copies the rest of the bytes of the file to the file descriptor
+        fd, with copy_file_range between regular files, with sendfile
+        to other files, and with reads and writes of COPY_SIZE bytes
+        where the kernel cannot copy them.
+        """
+        source = self.file.fileno()
+        for copy in (_copy_file_range, _sendfile):
+            try:
+                copy(source, fd)
+                return
+            except OSError as e:
+                # what was copied is not copied again, as both copies
+                # move the positions of both files
+                if e.errno not in _NOT_COPYABLE:
+                    raise
+        while True:
+            data = os.read(source, COPY_SIZE)
+            if not data:
+                return
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+
+    def last_lines(self, n):
+        """
+        the text of the last n lines of the file, searched for from its
+        end in a regular file, and kept in a ring of n lines as a stream
+        is read.
+        """
+        if not self.regular or (
+            "\r\n".encode(self.file.encoding) != b"\r\n"
+        ):
+            # line endings cannot be searched for as bytes
+            return last_lines(self.chunks(), n)
+        if hasattr(os, "POSIX_FADV_RANDOM"):
+            self._advise(os.POSIX_FADV_RANDOM)
+        buffer = self.buffer()
+        return self.decode(buffer[last_lines_start(buffer, n):])
+
+    def _read_end(self):
+        """the offset of the end of what was read of the file"""
+        if self.map is not None:
+            return len(self.map)
+        return self.file.buffer.tell()
+
+    def follow(self, by_name=False, interval=POLL_INTERVAL):
+        """
+        yields the bytes written to a regular file after what was read of
+        it, as they are written, and never returns. A truncated file is
+        read again from its start, as is, with by_name, a file that
+        replaced the file under its name, as log rotation does. Other
+        files were read to their end already.
+        """
+        if not self.regular:
+            return
+        path = os.path.abspath(self.file.name)
+        position = self._read_end()
+        fd = os.dup(self.file.fileno())
+        watcher = _watcher(path, by_name)
+        timeout = FLUSH_INTERVAL
+        try:
+            while True:
+                data = os.pread(fd, READ_SIZE, position)
+                if data:
+                    position += len(data)
+                    yield data
+                    # the first wait after data is short, so that the
+                    # empty chunk after it follows it within FLUSH_INTERVAL
+                    timeout = FLUSH_INTERVAL
+                    continue
+                if os.fstat(fd).st_size < position:
+                    position = 0
+                    continue
+                replacement = _replacement(path, fd) if by_name else None
+                if replacement is not None:
+                    # the rest of the replaced file was read above
+                    os.close(fd)
+                    fd, position = replacement, 0
+                    watcher.watch()
+                    continue
+                # an empty chunk lets the stages after it pass on what
+                # they hold while it waits
+                yield b""
+                watcher.wait(min(timeout, interval))
+                timeout = interval
+        finally:
+            os.close(fd)
+            watcher.close()
+
+    def last_bytes(self, n):
+        """
+        the last n bytes of the file, sliced from the end of a regular
+        file, and kept as chunks of at most n bytes as a stream is read.
+        """
+        if not self.regular:
+            return last_bytes(self.byte_chunks(), n)
+        if n <= 0:
+            return b""
+        buffer = self.buffer()
+        return bytes(buffer[max(len(buffer) - n, 0):])
+
+
+def _copy_file_range(source, fd):
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "copy_file_range is not available")
+    while os.copy_file_range(source, fd, KERNEL_COPY_SIZE):
+        pass
+
+
+def _sendfile(source, fd):
+    if not hasattr(os, "sendfile"):
+        raise OSError(errno.ENOSYS, "sendfile is not available")
+    while os.sendfile(fd, source, None, KERNEL_COPY_SIZE):
+        pass
+
+
+def _replacement(path, fd):
+    """
+    a file descriptor of the file now named path when it is not the file
+    of fd, None while it is or no file has the name
+    """
+    try:
+        named = os.stat(path)
+    except OSError:
+        return None
+    current = os.fstat(fd)
+    if (named.st_dev, named.st_ino) == (current.st_dev, current.st_ino):
+        return None
+    try:
+        return os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    except OSError:
+        return None
+
+
+class _Poller:
+
+    """waits for a followed file to change by waiting out the interval"""
+
+    def watch(self):
+        pass
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+
+    def close(self):
+        pass
+
+
+class _Inotify:
+
+    """
+    Waits for a followed file to change with inotify, called through
+    ctypes, and with by_name for another file to take its name. A wait
+    still times out, in case a change is not reported, as changes made
+    by other hosts to files they share are not.
+    """
+
+    def __init__(self, path, by_name):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._checked(
+            self.libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        )
+        self.path = os.fsencode(path)
+        self.name = os.path.basename(self.path)
+        self.file_watch = self.directory_watch = None
+        try:
+            self.watch()
+            if by_name:
+                self.directory_watch = self._add(
+                    os.path.dirname(self.path), _NAME_EVENTS
+                )
+        except BaseException:
+            os.close(self.fd)
+            raise
+
+    def _checked(self, result):
+        if result < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        return result
+
+    def _add(self, path, events):
+        return self._checked(
+            self.libc.inotify_add_watch(self.fd, path, events)
+        )
+
+    def watch(self):
+        """watches the file now named path, in place of the one before"""
+        if self.file_watch is not None:
+            # the watch is gone already if the file was deleted
+            self.libc.inotify_rm_watch(self.fd, self.file_watch)
+            self.file_watch = None
+        try:
+            self.file_watch = self._add(self.path, _FILE_EVENTS)
+        except FileNotFoundError:
+            # the file that replaces it is watched for by name
+            pass
+
+    def _changed(self, events):
+        for offset in _events(events):
+            watch, mask, _, length = _EVENT.unpack_from(events, offset)
+            if mask & _IN_Q_OVERFLOW or watch == self.file_watch:
+                return True
+            name = events[offset + _EVENT.size:][:length].rstrip(b"\0")
+            if watch == self.directory_watch and name == self.name:
+                return True
+        return False
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select(
+                [self.fd], [], [], remaining
+            )[0]:
+                return
+            try:
+                events = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            if self._changed(events):
+                return
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _events(events):
+    """the offsets of the inotify events read at once"""
+    offset = 0
+    while offset < len(events):
+        yield offset
+        offset += _EVENT.size + _EVENT.unpack_from(events, offset)[3]
+
+
+def _watcher(path, by_name):
+    try:
+        return _Inotify(path, by_name)
+    except (AttributeError, OSError):
+        # without inotify in the C library, or inotify watches left
+        return _Poller()
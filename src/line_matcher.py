@@ -0,0 +1,181 @@
+"""
+Matching a grep pattern against a batch of lines at once. grep matches
+its pattern at the start of each line, up to its newline; a LineMatcher
+finds the same lines by searching the text of the whole batch, so that
+the lines that cannot match are skipped without a match call each:
+
+    a pattern without special characters is a literal, and the lines
+    starting with it are found with str.find, or bytes.find
+    a pattern every match of which contains a literal, such as
+    '.*ERROR', is only matched against the lines the literal is found in
+
+Other patterns are matched against each line, as they used to be, and
+so are the lines of a batch many of the first lines of which hold the
+literal, as finding each of them costs more than matching each line.
+"""
+import functools
+import re
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # before Python 3.11
+    import sre_parse
+
+_SPECIAL = frozenset(".^$*+?{}[]\\|()")
+# the share of the first lines of a batch that may hold the literal
+# before finding it in the text of the batch costs more than matching
+# each line does
+DENSE = 0.1
+SAMPLE = 64
+
+
+def _literal_run(items, runs, run):
+    """
+    adds the runs of literal characters of the top level of a parsed
+    pattern to runs, groups matched as they are continuing them, and
+    returns the run the items end with.
+    """
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            run.append(av)
+        elif op is sre_parse.SUBPATTERN and not av[1] & re.IGNORECASE:
+            run = _literal_run(av[3], runs, run)
+        else:
+            runs.append(run)
+            run = []
+    return run
+
+
+def _required_literal(parsed):
+    """
+    the longest run of literal characters every match of a parsed
+    pattern contains, as code points, empty if there is none
+    """
+    if parsed.state.flags & re.IGNORECASE:
+        return []
+    runs = []
+    runs.append(_literal_run(parsed, runs, []))
+    return max(runs, key=len)
+
+
+class LineMatcher:
+
+    """
+    A grep pattern, of text or of bytes, compiled once, with the way the
+    lines of a batch that match it are found.
+    """
+
+    def __init__(self, pattern):
+        self.match = re.compile(pattern).match
+        if type(pattern) is str:
+            self.newline, self.empty = "\n", ""
+            chars = pattern
+            literal = "".join(map(chr, self._literal(pattern)))
+        else:
+            self.newline, self.empty = b"\n", b""
+            chars = pattern.decode("latin-1")
+            literal = bytes(self._literal(pattern))
+        self.literal = literal
+        if chars and not _SPECIAL.intersection(chars) and "\n" not in chars:
+            self.matching = self._starting_lines
+        elif len(literal) > 1:
+            self.matching = self._literal_lines
+        else:
+            self.matching = self._each_line
+
+    def _literal(self, pattern):
+        try:
+            return _required_literal(sre_parse.parse(pattern))
+        except (re.error, RecursionError):
+            return []
+
+    def lines(self, lines):
+        """
+        the lines of a batch that match the pattern from their start up to
+        their newline, the last one, if it lacks its newline, up to its end
+        """
+        if lines and not lines[-1].endswith(self.newline):
+            matches = self.matching(lines[:-1])
+            if self.match(lines[-1]):
+                matches.append(lines[-1])
+            return matches
+        return self.matching(lines)
+
+    def _each_line(self, lines):
+        match = self.match
+        return [line for line in lines if match(line, 0, len(line) - 1)]
+
+    def _buffer(self, lines, needle):
+        """
+        the text of a batch, None if the needle is found too often in
+        its first lines, or its lines are not found in it by their
+        newlines, as the lines split by readline_batches are
+        """
+        sample = lines[:SAMPLE]
+        found = self.empty.join(sample).count(needle)
+        if found > len(sample) * DENSE:
+            return None
+        buffer = self.empty.join(lines)
+        if buffer.count(self.newline) != len(lines):
+            return None
+        return buffer
+
+    def _lines_at(self, lines, buffer, starts):
+        """
+        the lines of a batch starting at the offsets given in the text of
+        the batch, in order, passed on as they are rather than sliced
+        """
+        newline = self.newline
+        matches = []
+        index = counted = 0
+        for start in starts:
+            index += buffer.count(newline, counted, start)
+            counted = start
+            matches.append(lines[index])
+        return matches
+
+    def _starting_lines(self, lines):
+        # the first line is not found by its newline, which errs on the
+        # side of searching
+        buffer = self._buffer(lines, self.newline + self.literal)
+        if buffer is None:
+            return self._each_line(lines)
+        return self._lines_at(lines, buffer, self._starts(buffer))
+
+    def _starts(self, buffer):
+        if buffer.startswith(self.literal):
+            yield 0
+        needle = self.newline + self.literal
+        position = buffer.find(needle)
+        while position >= 0:
+            yield position + 1
+            position = buffer.find(needle, position + 1)
+
+    def _literal_lines(self, lines):
+        buffer = self._buffer(lines, self.literal)
+        if buffer is None:
+            return self._each_line(lines)
+        match = self.match
+        return [
+            line for line in self._lines_at(
+                lines, buffer, self._literal_starts(buffer)
+            )
+            if match(line, 0, len(line) - 1)
+        ]
+
+    def _literal_starts(self, buffer):
+        """the starts of the lines the literal is found in"""
+        newline, literal = self.newline, self.literal
+        position = buffer.find(literal)
+        while position >= 0:
+            yield buffer.rfind(newline, 0, position) + 1
+            position = buffer.find(newline, position)
+            if position < 0:
+                return
+            position = buffer.find(literal, position + 1)
+
+
+@functools.lru_cache(maxsize=256)
+def line_matcher(pattern):
+    """the LineMatcher of a pattern, compiled once for every grep"""
+    return LineMatcher(pattern)
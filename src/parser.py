@@ -1,42 +1,171 @@
+import functools
+import hashlib
+import os
+import threading
 from pathlib import Path
-from lark import Lark, UnexpectedCharacters, UnexpectedEOF
+import lark
+from lark import Lark, UnexpectedInput
+from syntax_tree import SyntaxTreeBuilder
+from fast_path import parse_simple_call, parse_simple_command_line
+
+GRAMMAR_DIR = Path(__file__).parent.absolute() / "grammars"
+
+ENGINES = {
+    "earley": {"parser": "earley"},
+    "lalr": {"parser": "lalr", "lexer": "contextual"},
+}
+
+
+def default_engine():
+    """parsing engine, selectable with SHELL_PARSER_ENGINE"""
+    return os.environ.get("SHELL_PARSER_ENGINE", "lalr")
+
+
+def default_cache_dir():
+    """
+    directory used for serialized parsers, can be overridden with
+    SHELL_PARSER_CACHE (an empty value disables the on-disk cache).
+    """
+    if "SHELL_PARSER_CACHE" in os.environ:
+        return os.environ["SHELL_PARSER_CACHE"] or None
+    cache_home = os.environ.get(
+        "XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")
+    )
+    return os.path.join(cache_home, "python-shell")
 
 
 class Parser:
-    def __init__(self):
-        self.command_level_parser = Lark(self._command_level_grammar(),
-                                         start="command")
-        self.call_command_parser = Lark(self._call_level_grammar(),
-                                        start="call")
-
-    def _command_level_grammar(self):
-        file = open(
-            str(Path(__file__).parent.absolute())
-            + "/grammars/command_level_grammar.lark",
-            "r",
+    def __init__(
+        self, engine="lalr", cache_dir=None, cache_size=1024, fast_path=True
+    ):
+        if engine not in ENGINES:
+            raise ValueError(f"unknown parsing engine {engine}")
+        self.engine = engine
+        self.fast_path = fast_path
+        self.cache_dir = cache_dir
+        self.syntax_tree_builder = SyntaxTreeBuilder()
+        self.shell_parser = self._build_parser(
+            "shell_grammar", start=["command_line", "call"], **ENGINES[engine]
         )
-        grammar = file.read()
-        file.close()
-        return grammar
-
-    def _call_level_grammar(self):
-        file = open(
-            str(Path(__file__).parent.absolute())
-            + "/grammars/call_level_grammar.lark",
-            "r",
+        # syntax trees are immutable, so repeated lines share one tree
+        self._cached_parse = functools.lru_cache(maxsize=cache_size)(
+            self._parse
         )
-        grammar = file.read()
-        file.close()
-        return grammar
 
-    def command_level_parse(self, cmd):
+    def _read_grammar(self, name):
+        with open(GRAMMAR_DIR / (name + ".lark"), "r") as file:
+            return file.read()
+
+    def _cache_file(self, name, grammar, options):
+        """
+        path of the serialized parser, keyed by the grammar text,
+        the lark version and the options it is built with.
+        """
+        key = hashlib.sha256(
+            "\0".join(
+                [grammar, lark.__version__, repr(sorted(options.items()))]
+            ).encode()
+        ).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f"{name}-{key}.lark")
+
+    def _load_cached(self, cache_file):
         try:
-            return self.command_level_parser.parse(cmd)
-        except (UnexpectedCharacters, UnexpectedEOF):
-            return False
+            with open(cache_file, "rb") as f:
+                return Lark.load(f)
+        except Exception:
+            # missing, truncated or written by an incompatible lark
+            return None
 
-    def call_level_parse(self, call):
+    def _save_cached(self, cache_file, parser):
+        """
+        writes to a temporary file first so that concurrent shells never
+        read a half written cache entry.
+        """
         try:
-            return self.call_command_parser.parse(call)
-        except (UnexpectedCharacters, UnexpectedEOF):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as f:
+                parser.save(f)
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            pass
+
+    def _lalr(self, options):
+        """
+        lark can only serialize LALR parsers, and only the LALR engine
+        can build the syntax tree while parsing.
+        """
+        return options.get("parser") == "lalr"
+
+    def _build_parser(self, name, **options):
+        grammar = self._read_grammar(name)
+        if not self._lalr(options):
+            return Lark(grammar, **options)
+        if not self.cache_dir:
+            return Lark(
+                grammar, transformer=self.syntax_tree_builder, **options
+            )
+        cache_file = self._cache_file(name, grammar, options)
+        parser = self._load_cached(cache_file)
+        if parser is None:
+            parser = Lark(
+                grammar, transformer=self.syntax_tree_builder, **options
+            )
+            self._save_cached(cache_file, parser)
+        return parser
+
+    def _parse_simple(self, text, start):
+        """
+        builds the tree of quote free lines by hand, False when the
+        full grammar is needed.
+        """
+        if start == "call":
+            return parse_simple_call(text)
+        return parse_simple_command_line(text)
+
+    def _parse(self, text, start):
+        if self.fast_path:
+            tree = self._parse_simple(text, start)
+            if tree is not False:
+                return tree
+        try:
+            tree = self.shell_parser.parse(text, start=start)
+        except UnexpectedInput:
             return False
+        if self.engine == "lalr":
+            return tree
+        return self.syntax_tree_builder.transform(tree)
+
+    def command_level_parse(self, cmd):
+        """parses a command line into a syntax_tree.Seq"""
+        return self._cached_parse(cmd, "command_line")
+
+    def call_level_parse(self, call):
+        """
+        parses a single call into a syntax_tree.Call, None if it is
+        empty.
+        """
+        return self._cached_parse(call, "call")
+
+    def cache_info(self):
+        """hits, misses, maxsize and currsize of the parse cache"""
+        return self._cached_parse.cache_info()
+
+
+_shared_parser = None
+_shared_parser_lock = threading.Lock()
+
+
+def get_parser():
+    """
+    returns the process-wide parser, building it on first use so that
+    the grammars are compiled once rather than once per call.
+    """
+    global _shared_parser
+    if _shared_parser is None:
+        with _shared_parser_lock:
+            if _shared_parser is None:
+                _shared_parser = Parser(
+                    engine=default_engine(), cache_dir=default_cache_dir()
+                )
+    return _shared_parser
@@ -0,0 +1,185 @@
+import functools
+from call_evaluator import CallEvaluator
+from applications import (
+    exec_application,
+    exec_to_file,
+    redirect_files,
+    resolve_application,
+    stream_application,
+)
+from commands import Pipe, Seq
+from parser import get_parser
+import syntax_tree
+from syntax_tree import Node, Redirection, Substitution
+
+
+def _is_static(argument):
+    """
+    True when an argument evaluates to the same string on every run,
+    i.e. it has no command substitution and is not a glob.
+    """
+    return not argument.glob and not any(
+        type(part) is Substitution for part in argument.parts
+    )
+
+
+class CompiledCall(Node):
+
+    """
+    A call compiled once and executed many times. atoms holds the
+    application, arguments and redirections as (role, value) pairs in
+    the order they were written, where value is the string the atom
+    evaluates to or, for globs and command substitutions, the Argument
+    node to evaluate on every run. When the whole call is static the
+    application is resolved and the arguments are split ahead of time,
+    so executing it is a single application dispatch.
+    """
+
+    __slots__ = (
+        "call_tree", "atoms", "dynamic",
+        "application", "args", "file_output", "executable",
+    )
+
+    def __init__(self, call_tree):
+        atoms = []
+        application = None
+        for atom in call_tree.atoms:
+            if type(atom) is Redirection:
+                role = "output" if atom.io_type == ">" else "input"
+                argument = atom.argument
+            else:
+                role = "arg"
+                if atom is call_tree.application:
+                    role = "application"
+                argument = atom
+            if _is_static(argument):
+                argument = "".join(argument.parts)
+                if role == "application":
+                    application = argument
+            atoms.append((role, argument))
+        dynamic = any(type(value) is not str for _, value in atoms)
+
+        args, file_output = None, None
+        if not dynamic:
+            application, args, file_output = self._assemble(atoms, str)
+
+        executable = None
+        if application:
+            try:
+                executable = resolve_application(application, self)
+            except KeyError:
+                # unknown applications are reported when they are run
+                pass
+        self._init(
+            call_tree, tuple(atoms), dynamic,
+            application, args, file_output, executable,
+        )
+
+    @property
+    def raw_command(self):
+        return self.call_tree.raw
+
+    @staticmethod
+    def _assemble(atoms, evaluate):
+        application, args, file_output = None, [], None
+        for role, value in atoms:
+            if role == "application":
+                application = evaluate(value)
+            elif role == "output":
+                file_output = evaluate(value)
+            else:
+                args.append(evaluate(value))
+        return application, tuple(args), file_output
+
+    def _evaluate(self):
+        """evaluates the dynamic atoms of this run, in written order"""
+        call_evaluator = CallEvaluator()
+
+        def evaluate(value):
+            if type(value) is str:
+                return value
+            if value.glob:
+                return call_evaluator.expand_argument(value)
+            return call_evaluator.evaluate_argument(value)
+
+        return self._assemble(self.atoms, evaluate)
+
+    def invocation(self):
+        """the application, arguments and file output of this run"""
+        if self.dynamic:
+            return self._evaluate()
+        return self.application, self.args, self.file_output
+
+    def _executable(self, application, stderr):
+        executable = self.executable
+        if executable is None:
+            executable = resolve_application(application, self)
+            if executable is None:
+                stderr.append(
+                    f"Unsupported Application: {application[1:]}\n"
+                )
+        return executable
+
+    def eval(self, out, in_pipe=False, stderr=None):
+        application, args, file_output = self.invocation()
+        if not application:
+            return
+        executable = self._executable(
+            application, out if stderr is None else stderr
+        )
+        if executable is None:
+            return
+        if redirect_files(executable, args, in_pipe, file_output):
+            return
+        if file_output:
+            exec_to_file(
+                executable, list(args), out, in_pipe, file_output, stderr
+            )
+        else:
+            exec_application(executable, list(args), out, in_pipe, stderr)
+
+    def stream(self, stdin=None, stderr=None):
+        """
+        runs the call lazily over stdin, the output chunks of the
+        previous call in a pipe, yielding its output chunks. Errors are
+        appended to stderr, or output if it is None.
+        """
+        application, args, file_output = self.invocation()
+        if not application:
+            return
+        errors = [] if stderr is None else stderr
+        executable = self._executable(application, errors)
+        if executable is None:
+            if stderr is None:
+                yield from errors
+            return
+        yield from stream_application(
+            executable, list(args), stdin, file_output, stderr
+        )
+
+
+def compile_tree(command_tree):
+    """
+    Compiles the syntax tree of a command line into an execution plan,
+    a Seq of CompiledCalls and flat Pipes of CompiledCalls.
+    """
+    commands = []
+    for command in command_tree.commands:
+        if type(command) is syntax_tree.Pipe:
+            commands.append(Pipe(*map(CompiledCall, command.calls)))
+        else:
+            commands.append(CompiledCall(command))
+    return Seq(tuple(commands))
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_command_line(cmdline):
+    """
+    Returns the execution plan of a command line, False if it cannot be
+    parsed. Plans are immutable and cached, so a repeated line is only
+    parsed and compiled once.
+    """
+    command_tree = get_parser().command_level_parse(cmdline)
+    if not command_tree:
+        return False
+    return compile_tree(command_tree)
@@ -0,0 +1,197 @@
+"""
+An optional cache of the output of pure commands, for command lines
+rerun while the files they read rarely change. A command is pure when
+it is a call or a pipe of static calls of the built-in applications
+that only read files, with no redirection to a file. Its output is
+cached under its application and arguments and the working directory,
+along with the identity, size and modification time of every file and
+directory it read, and is served again for as long as none of those
+changed. Other commands always run.
+
+The cache is enabled by setting SHELL_RESULT_CACHE in the environment to
+its budget in bytes, the least recently used outputs being evicted to
+stay within it.
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+# applications whose output only depends on their arguments, their
+# input and the files they read
+PURE = frozenset([
+    "cat", "echo", "head", "tail", "grep", "cut", "sort", "uniq",
+    "ls", "find",
+])
+# arguments making applications of PURE read on as files change
+FOLLOW_FLAGS = frozenset(["-f", "-F"])
+# seconds since the paths a command read last changed before its output
+# is cached, as they could change again within the resolution of their
+# modification times
+SETTLE_TIME = 1.0
+
+_recording = None
+_hook_lock = threading.Lock()
+_hooked = False
+
+
+def _audit(event, args):
+    """records the files and directories read while a command runs"""
+    paths = _recording
+    if paths is None:
+        return
+    if event == "open":
+        # files opened by os.open, as temporary files are, have no mode
+        mode = args[1]
+        if type(mode) is not str or "r" not in mode or "+" in mode:
+            return
+    elif event not in ("os.listdir", "os.scandir", "applications.read"):
+        return
+    # file descriptors are not recorded
+    if type(args[0]) is str:
+        paths.add(args[0])
+
+
+def _install_hook():
+    """audit hooks cannot be removed, so one is added on first use"""
+    global _hooked
+    with _hook_lock:
+        if not _hooked:
+            sys.addaudithook(_audit)
+            _hooked = True
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _key(command):
+    """the application and arguments of every call of a pure command"""
+    calls = getattr(command, "calls", (command,))
+    key = []
+    for call in calls:
+        if getattr(call, "dynamic", True):
+            return None
+        application, args, file_output = call.invocation()
+        if file_output or not application:
+            return None
+        if application.lstrip("_") not in PURE:
+            return None
+        if application.lstrip("_") == "tail" and FOLLOW_FLAGS.intersection(
+            args
+        ):
+            return None
+        key.append((application, args))
+    return os.getcwd(), tuple(key)
+
+
+class ResultCache:
+
+    """
+    Outputs of pure commands, with the signatures of the paths they
+    read, evicted least recently used first once they take more than
+    budget bytes. hits and misses count the lookups of pure commands.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # key -> (output, signatures, size)
+        self.entries = OrderedDict()
+
+    def lookup(self, key):
+        """the cached output of key, None if it is missing or stale"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            output, signatures, _ = entry
+            if all(_signature(path) == sig for path, sig in signatures):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return output
+            self._remove(key)
+        self.misses += 1
+        return None
+
+    def store(self, key, output, paths):
+        size = sys.getsizeof(output)
+        if size > self.budget:
+            return
+        if key in self.entries:
+            self._remove(key)
+        signatures = tuple((path, _signature(path)) for path in paths)
+        settled = time.time_ns() - int(SETTLE_TIME * 1e9)
+        if any(sig and sig[2] > settled for _, sig in signatures):
+            return
+        self.entries[key] = (output, signatures, size)
+        self.size += size
+        while self.size > self.budget:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        self.size -= self.entries.pop(key)[2]
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+
+_cache = None
+
+
+def configure(budget):
+    """
+    sets the budget of the cache in bytes and empties it, a budget of
+    zero or None disables it.
+    """
+    global _cache
+    _cache = ResultCache(budget) if budget else None
+    if _cache is not None:
+        _install_hook()
+    return _cache
+
+
+def get_cache():
+    """the cache, None when it is disabled"""
+    return _cache
+
+
+configure(int(os.environ.get("SHELL_RESULT_CACHE", 0)))
+
+
+def eval_command(command, out):
+    """
+    evaluates a command of a sequence, serving the output of pure
+    commands from the cache when it is enabled.
+    """
+    global _recording
+    cache = _cache
+    key = None if cache is None else _key(command)
+    if key is None:
+        command.eval(out)
+        return
+    output = cache.lookup(key)
+    if output is None:
+        paths = set()
+        # arguments naming paths, in case they were read elsewhere, as
+        # by a worker process
+        paths.update(arg for _, args in key[1] for arg in args)
+        buffer = deque()
+        _recording = paths
+        try:
+            command.eval(buffer)
+        except BaseException:
+            out.extend(buffer)
+            raise
+        finally:
+            _recording = None
+        output = "".join(buffer)
+        cache.store(key, output, paths)
+    if output:
+        out.append(output)
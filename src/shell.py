@@ -1,21 +1,72 @@
 import sys
 import os
-from parser import Parser
 from collections import deque
-from command_evaluator import extract_raw_commands
-from commands import Seq
+from applications import copy_files
+from plan import CompiledCall, compile_command_line
+from streams import encode
 from autocomplete import autocomplete
 
 
+class Stdout(deque):
+
+    """
+    The output of the shell, printed as it is appended, so that commands
+    that never end, as tail -f does not, are printed as they run.
+    """
+
+    def append(self, chunk):
+        try:
+            print(chunk, end="", flush=True)
+        except UnicodeEncodeError:
+            # bytes cut from characters, as head -c gives, are written back
+            # as the bytes they were read as
+            sys.stdout.buffer.write(encode(chunk))
+            sys.stdout.buffer.flush()
+
+    def extend(self, chunks):
+        for chunk in chunks:
+            self.append(chunk)
+
+
 def eval(cmdline, out):
-    parser = Parser()
-    command_tree = parser.command_level_parse(cmdline)
-    if not command_tree:
+    plan = compile_command_line(cmdline)
+    if not plan:
         out.append(f"Unrecognized Input: {cmdline}\n")
         return
-    raw_commands = extract_raw_commands(command_tree)
-    seq = Seq(raw_commands)
-    seq.eval(out)
+    plan.eval(out)
+
+
+def copy_to_stdout(cmdline):
+    """
+    runs a command line that only cats files by copying them to stdout,
+    by the kernel where it can, returning whether it did.
+    """
+    plan = compile_command_line(cmdline)
+    if not plan or len(plan.commands) != 1:
+        return False
+    call = plan.commands[0]
+    if type(call) is not CompiledCall or call.dynamic:
+        return False
+    application, args, file_output = call.invocation()
+    if application != "cat" or not args or file_output:
+        return False
+    if _is_stdout_one_of(args):
+        return False
+    sys.stdout.flush()
+    copy_files(args, sys.stdout.fileno())
+    return True
+
+
+def _is_stdout_one_of(file_names):
+    """whether stdout is the same file as one of file_names"""
+    try:
+        target = os.fstat(sys.stdout.fileno())
+        return any(
+            os.path.samestat(target, os.stat(name.strip()))
+            for name in file_names
+        )
+    except OSError:
+        return False
 
 
 if __name__ == "__main__":
@@ -27,14 +78,14 @@ if __name__ == "__main__":
         if sys.argv[1] != "-c":
             # -c runs the file in non-interactive mode
             raise ValueError(f"unexpected command line argument {sys.argv[1]}")
-        out = deque()
-        eval(sys.argv[2], out)
-        while len(out) > 0:
-            print(out.popleft(), end="")
+        if not copy_to_stdout(sys.argv[2]):
+            eval(sys.argv[2], Stdout())
     else:
         while True:
             cmdline = input(os.getcwd() + "> ")
-            out = deque()
-            eval(cmdline, out)
-            while len(out) > 0:
-                print(out.popleft(), end="")
+            try:
+                if not copy_to_stdout(cmdline):
+                    eval(cmdline, Stdout())
+            except KeyboardInterrupt:
+                # stops the command, as tail -f is stopped, not the shell
+                print()
@@ -0,0 +1,527 @@
+"""
+Helpers for the streams passed between the stages of a streaming
+pipeline. A stream is an iterator over text chunks whose boundaries
+carry no meaning: the concatenation of the chunks is the output of the
+stage, exactly as a sequential pipe would have passed it on.
+
+Between stages that work line by line, chunks may also be batches of
+records, Lines, so that the lines one stage splits are passed on to the
+next as they are instead of being joined into text and split again.
+Streams are serialised to text only where they leave such stages.
+
+In bytes mode, the stages that can work on bytes read the bytes of files
+and of their input, and pass bytes and batches of records of bytes,
+ByteLines, on to each other, so that data is only decoded where it
+reaches a stage that needs text, or the output of the pipe.
+"""
+import codecs
+import inspect
+import locale
+import os
+import pickle
+import re
+import tempfile
+import time
+from collections import deque
+from itertools import chain
+
+CHUNK_SIZE = 64 * 1024
+# buffered streams pass their chunks on once they add up to BUFFER_SIZE
+# characters, or once the oldest one has waited FLUSH_INTERVAL seconds
+BUFFER_SIZE = 64 * 1024
+FLUSH_INTERVAL = 0.05
+# the line boundaries of str.splitlines
+_LINE_ENDS = (
+    "\n", "\r", "\x0b", "\x0c", "\x1c", "\x1d", "\x1e",
+    "\x85", "\u2028", "\u2029",
+)
+# the line boundaries of str.splitlines but the newline
+_OTHER_BOUNDARIES = re.compile("[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+_NEWLINE_LINE = re.compile(".*\n")
+# records per batch passed on by stages that hold all their lines
+BATCH_LINES = 1024
+# characters a channel, or a sort, holds in memory before spilling to a
+# temporary file, SHELL_SPOOL_THRESHOLD in the environment
+SPOOL_THRESHOLD = int(
+    os.environ.get("SHELL_SPOOL_THRESHOLD", 64 * 1024 * 1024)
+)
+# text is encoded in bytes mode as open encodes it, undecodable bytes
+# being kept as lone surrogates so that they are passed on unchanged
+ENCODING = locale.getpreferredencoding(False)
+_ERRORS = "surrogateescape"
+_BYTES_LINE = re.compile(rb"[^\n]*\n")
+
+
+def data_mode():
+    """
+    what the stages of a streaming pipe that can work on bytes work on,
+    selectable with SHELL_DATA_MODE:
+        text - the text of files and input (the default)
+        bytes - the bytes of files and input, decoded at the end
+    """
+    return os.environ.get("SHELL_DATA_MODE", "text")
+
+
+class _Spilled:
+
+    """an element of a channel held in its temporary file, as utf-8"""
+
+    __slots__ = ("file", "start", "end")
+
+    def __init__(self, file):
+        self.file = file
+        self.start = self.end = file.seek(0, os.SEEK_END)
+
+    def write(self, chunk):
+        self.file.seek(self.end)
+        self.end += self.file.write(chunk.encode("utf-8", "surrogatepass"))
+
+    def chunks(self):
+        decoder = codecs.getincrementaldecoder("utf-8")("surrogatepass")
+        position = self.start
+        while position < self.end:
+            self.file.seek(position)
+            data = self.file.read(min(CHUNK_SIZE, self.end - position))
+            position += len(data)
+            chunk = decoder.decode(data, position == self.end)
+            if chunk:
+                yield chunk
+
+    def text(self):
+        return "".join(self.chunks())
+
+
+class Channel(deque):
+
+    """
+    The output channel of a stage run to completion, holding what it
+    wrote until the next stage reads it and noting whether it did. Chunks
+    are passed on as they were written, never joined or split. Stages
+    that are not streaming aware use it as their out deque.
+
+    As SpooledTemporaryFile does, a channel holding more than
+    SPOOL_THRESHOLD characters in memory spills what it is given to a
+    temporary file. Spilled elements are read back whole by pop, and in
+    chunks by pop_chunks and chunks.
+    """
+
+    read = False
+    # characters held in memory
+    size = 0
+    file = None
+
+    def __init__(self, elements=()):
+        super().__init__()
+        self.extend(elements)
+
+    def _spilled(self):
+        if self.file is None:
+            self.file = tempfile.TemporaryFile()
+        return _Spilled(self.file)
+
+    def _text(self, element):
+        if type(element) is str:
+            self.size -= len(element)
+            return element
+        return element.text()
+
+    def append(self, element):
+        if type(element) is str:
+            if self.size + len(element) > SPOOL_THRESHOLD:
+                spilled = self._spilled()
+                spilled.write(element)
+                element = spilled
+            else:
+                self.size += len(element)
+        super().append(element)
+
+    def extend(self, elements):
+        for element in elements:
+            self.append(element)
+
+    def write(self, chunks):
+        """
+        appends the text of a stream as a single element, which spills
+        as soon as the channel would hold too much of it in memory.
+        """
+        held, size = [], 0
+        spilled = None
+        for chunk in chunks:
+            if spilled is not None:
+                spilled.write(chunk)
+                continue
+            held.append(chunk)
+            size += len(chunk)
+            if self.size + size > SPOOL_THRESHOLD:
+                spilled = self._spilled()
+                for chunk in held:
+                    spilled.write(chunk)
+                held = None
+        if spilled is None:
+            self.size += size
+            super().append("".join(held))
+        else:
+            super().append(spilled)
+
+    def pop(self):
+        self.read = True
+        return self._text(super().pop())
+
+    def popleft(self):
+        return self._text(super().popleft())
+
+    def pop_chunks(self):
+        """pops the last element, as an iterator over its chunks"""
+        self.read = True
+        element = super().pop()
+        if type(element) is str:
+            self.size -= len(element)
+            return iter((element,))
+        return element.chunks()
+
+    def chunks(self):
+        """the text of every element, in chunks"""
+        for element in deque.__iter__(self):
+            if type(element) is str:
+                yield element
+            else:
+                yield from element.chunks()
+
+
+def popped(out):
+    """lazily pops the last element of an out deque, as chunks"""
+    if type(out) is Channel:
+        yield from out.pop_chunks()
+    else:
+        yield out.pop()
+
+
+def spill(lines):
+    """
+    writes a list of lines to a temporary file, returning an iterator
+    reading them back in order.
+    """
+    file = tempfile.TemporaryFile()
+    for start in range(0, len(lines), BATCH_LINES):
+        pickle.dump(
+            lines[start:start + BATCH_LINES], file, pickle.HIGHEST_PROTOCOL
+        )
+    file.seek(0)
+    return _unspilled(file)
+
+
+def _unspilled(file):
+    with file:
+        while True:
+            try:
+                batch = pickle.load(file)
+            except EOFError:
+                return
+            yield from batch
+
+
+class Lines(list):
+
+    """
+    A batch of records, lines with their newline that hold no other line
+    boundary, only the last record of a stream may lack its newline. Any
+    split of the text of a batch, be it by str.splitlines, by newlines
+    or by file.readlines, gives its records back, so stages pass them on
+    without splitting them again. The text of a batch is the
+    concatenation of its records.
+    """
+
+
+class ByteLines(list):
+
+    """
+    A batch of records of bytes, lines ending with b"\\n", the only line
+    boundary of bytes, only the last record of a stream may lack it. The
+    bytes of a batch are the concatenation of its records.
+    """
+
+
+# the types of batches of records
+RECORD_BATCHES = (Lines, ByteLines)
+
+
+def records(lines, plain):
+    """
+    passes lines on as a batch of records if they are plain, i.e. taken
+    from Lines, as text otherwise.
+    """
+    return Lines(lines) if plain else "".join(lines)
+
+
+def byte_records(lines, plain):
+    """passes lines of bytes on as records does lines of text"""
+    return ByteLines(lines) if plain else b"".join(lines)
+
+
+def encode(text):
+    """the bytes of text in bytes mode"""
+    return text.encode(ENCODING, _ERRORS)
+
+
+def text(chunks):
+    """
+    the text chunks of a stream, batches of records joined and bytes
+    decoded. Empty chunks are passed on, as a stage waiting for more
+    data yields them.
+    """
+    decoder = None
+    for chunk in chunks:
+        if type(chunk) is Lines:
+            chunk = "".join(chunk)
+        elif type(chunk) is not str:
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder(ENCODING)(_ERRORS)
+            if type(chunk) is ByteLines:
+                chunk = b"".join(chunk)
+            if chunk:
+                chunk = decoder.decode(chunk)
+                if not chunk:
+                    continue
+            else:
+                chunk = ""
+            yield chunk
+            continue
+        if decoder is not None:
+            # text ends the bytes before it, as an error reported does
+            pending = decoder.decode(b"", True)
+            if pending:
+                yield pending
+        yield chunk
+    if decoder is not None:
+        pending = decoder.decode(b"", True)
+        if pending:
+            yield pending
+
+
+def binary(chunks):
+    """
+    the chunks of a stream as bytes, text encoded and batches of records
+    of bytes passed on as they are.
+    """
+    for chunk in chunks:
+        if type(chunk) is bytes or type(chunk) is ByteLines:
+            yield chunk
+        elif type(chunk) is Lines:
+            yield encode("".join(chunk))
+        else:
+            yield encode(chunk)
+
+
+def read_chunks(file_name, chunk_size=CHUNK_SIZE):
+    """yields the content of a file in chunks of chunk_size characters"""
+    with open(file_name) as f:
+        yield from file_chunks(f, chunk_size)
+
+
+def file_chunks(f, chunk_size=CHUNK_SIZE):
+    """yields the rest of an open file in chunks of chunk_size characters"""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _plain(lines, text):
+    return Lines(lines) if _OTHER_BOUNDARIES.search(text) is None else lines
+
+
+def line_batches(chunks):
+    """
+    yields the lines of a stream with their line endings in lists, one
+    per chunk, the same lines as str.splitlines(keepends=True) over the
+    whole stream. Batches of records are yielded as they are, and so are
+    the lines of text with no line boundary but newlines, as Lines.
+    """
+    pending = ""
+    for chunk in chunks:
+        if type(chunk) is Lines:
+            if not pending:
+                yield chunk
+                continue
+            chunk = "".join(chunk)
+        text = pending + chunk
+        lines = text.splitlines(keepends=True)
+        pending = ""
+        # the last line may continue in the next chunk, and a \r may be
+        # the first half of a \r\n
+        if lines and (
+            lines[-1].endswith("\r") or not lines[-1].endswith(_LINE_ENDS)
+        ):
+            pending = lines.pop()
+        yield _plain(lines, text)
+    if pending:
+        yield _plain([pending], pending)
+
+
+def iter_lines(chunks):
+    """
+    yields the lines of a stream with their line endings, the same
+    lines as str.splitlines(keepends=True) over the whole stream.
+    """
+    return chain.from_iterable(line_batches(chunks))
+
+
+def split_lines(chunks):
+    """
+    yields the pieces of a stream between newlines, the same pieces as
+    str.split("\\n") over the whole stream.
+    """
+    pending = ""
+    for chunk in chunks:
+        pieces = (pending + chunk).split("\n")
+        pending = pieces.pop()
+        yield from pieces
+    yield pending
+
+
+def readline_batches(chunks):
+    """
+    yields the lines of a stream ending with their newline in lists, one
+    per chunk, the same lines as file.readlines() over the whole stream.
+    Batches of records are yielded as they are, as in line_batches.
+    """
+    pending = ""
+    for chunk in chunks:
+        if type(chunk) is Lines:
+            if not pending:
+                yield chunk
+                continue
+            chunk = "".join(chunk)
+        text = pending + chunk
+        pending = text[text.rfind("\n") + 1:]
+        if _OTHER_BOUNDARIES.search(text) is None:
+            lines = Lines(text.splitlines(keepends=True))
+            if pending:
+                lines.pop()
+        else:
+            lines = _NEWLINE_LINE.findall(text)
+        yield lines
+    if pending:
+        yield _plain([pending], pending)
+
+
+def readlines(chunks):
+    """
+    yields the lines of a stream ending with their newline, the same
+    lines as file.readlines() over the whole stream.
+    """
+    return chain.from_iterable(readline_batches(chunks))
+
+
+def last_lines(chunks, n):
+    """
+    the text of the last n lines of a stream, kept in a ring of n lines
+    as it is read, as it cannot be read from its end.
+    """
+    ring = deque(maxlen=max(n, 0))
+    for batch in readline_batches(chunks):
+        ring.extend(batch)
+    return "".join(ring)
+
+
+def last_bytes(chunks, n):
+    """
+    the last n bytes of a stream of bytes, kept as chunks of at most n
+    bytes as it is read.
+    """
+    if n <= 0:
+        return b""
+    kept, size = deque(), 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        kept.append(chunk)
+        size += len(chunk)
+        while size - len(kept[0]) >= n:
+            size -= len(kept.popleft())
+    return b"".join(kept)[-n:]
+
+
+def byte_line_batches(chunks):
+    """
+    yields the lines of a stream of bytes ending with their newline in
+    ByteLines, one per chunk, the same lines as the readlines() of a
+    binary file over the whole stream. ByteLines are yielded as they are.
+    """
+    pending = b""
+    for chunk in chunks:
+        if type(chunk) is ByteLines:
+            if not pending:
+                yield chunk
+                continue
+            chunk = b"".join(chunk)
+        data = pending + chunk
+        pending = data[data.rfind(b"\n") + 1:]
+        # bytes.splitlines also splits at carriage returns
+        if b"\r" in data:
+            lines = _BYTES_LINE.findall(data)
+        else:
+            lines = data.splitlines(keepends=True)
+            if pending:
+                lines.pop()
+        yield ByteLines(lines)
+    if pending:
+        yield ByteLines([pending])
+
+
+def join(separator, items):
+    """yields items separated by separator, a lazy str.join"""
+    first = True
+    for item in items:
+        if not first:
+            yield separator
+        first = False
+        yield item
+
+
+def buffered(chunks):
+    """
+    groups the chunks of a stream into lists of about BUFFER_SIZE
+    characters, to be passed between threads or processes. Empty chunks
+    add nothing, but let a stage waiting for more data pass on what it
+    has after FLUSH_INTERVAL.
+    """
+    buffer = []
+    size = 0
+    since = None
+    for chunk in chunks:
+        if chunk:
+            if not buffer:
+                since = time.perf_counter()
+            buffer.append(chunk)
+            if type(chunk) in RECORD_BATCHES:
+                size += sum(map(len, chunk))
+            else:
+                size += len(chunk)
+        if buffer and (
+            size >= BUFFER_SIZE
+            or time.perf_counter() - since >= FLUSH_INTERVAL
+        ):
+            yield buffer
+            buffer = []
+            size = 0
+    if buffer:
+        yield buffer
+
+
+def finish(chunks, completed):
+    """
+    Finishes with the input stream of a stage. When the stage completed
+    without reading it, the upstream stages are still run, as they would
+    be in a sequential pipe. Otherwise the stream is closed, so that
+    upstream stages stop producing as soon as nothing reads their output.
+    """
+    if not inspect.isgenerator(chunks):
+        return
+    state = inspect.getgeneratorstate(chunks)
+    if completed and state == inspect.GEN_CREATED:
+        for _ in chunks:
+            pass
+    else:
+        chunks.close()
@@ -0,0 +1,192 @@
+from lark import Transformer
+from lark.lexer import Token
+
+
+class Node:
+    """
+    Base class of the nodes of a parsed command line. Nodes are slotted,
+    immutable, since parsed trees are cached and shared between
+    executions, and compare by value so that trees built by different
+    parsers can be checked against each other.
+    """
+
+    __slots__ = ()
+
+    def _init(self, *values):
+        for slot, value in zip(self.__slots__, values):
+            object.__setattr__(self, slot, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} nodes are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} nodes are immutable")
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, slot) == getattr(other, slot)
+            for slot in self.__slots__
+        )
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, slot) for slot in self.__slots__))
+
+    def __repr__(self):
+        fields = ", ".join(
+            repr(getattr(self, slot)) for slot in self.__slots__
+        )
+        return f"{type(self).__name__}({fields})"
+
+
+class Substitution(Node):
+
+    """
+    a backquoted command line, quoted is True when it appears
+    inside double quotes.
+    """
+
+    __slots__ = ("command", "quoted")
+
+    def __init__(self, command, quoted=False):
+        self._init(command, quoted)
+
+
+class Argument(Node):
+
+    """
+    An argument made of adjacent parts, each one either a literal Token
+    (typed UNQUOTED, SINGLE_QUOTED or DOUBLE_QUOTED) or a Substitution.
+    glob is True when an unquoted part contains an asterisk.
+    """
+
+    __slots__ = ("parts", "glob")
+
+    def __init__(self, parts):
+        glob = any(
+            type(part) is Token and part.type == "UNQUOTED" and "*" in part
+            for part in parts
+        )
+        self._init(parts, glob)
+
+    def source(self):
+        """reconstructs the argument as it was written"""
+        source = ""
+        in_double_quotes = False
+        for part in self.parts:
+            if type(part) is Substitution:
+                double_quoted = part.quoted
+                text = "`" + part.command + "`"
+            else:
+                double_quoted = part.type == "DOUBLE_QUOTED"
+                text = str(part)
+                if part.type == "SINGLE_QUOTED":
+                    text = "'" + text + "'"
+            if double_quoted != in_double_quotes:
+                source += '"'
+                in_double_quotes = double_quoted
+            source += text
+        return source + ('"' if in_double_quotes else "")
+
+
+class Redirection(Node):
+
+    """an input (<) or output (>) redirection to a file"""
+
+    __slots__ = ("io_type", "argument")
+
+    def __init__(self, io_type, argument):
+        self._init(io_type, argument)
+
+    def source(self):
+        return self.io_type + " " + self.argument.source()
+
+
+class Call(Node):
+
+    """
+    A call of an application. atoms holds the arguments and
+    redirections in the order they were written, application is the
+    first argument.
+    """
+
+    __slots__ = ("application", "atoms")
+
+    def __init__(self, atoms):
+        application = next(atom for atom in atoms if type(atom) is Argument)
+        self._init(application, atoms)
+
+    @property
+    def raw(self):
+        return " ".join(atom.source() for atom in self.atoms)
+
+
+class Pipe(Node):
+
+    """two or more calls connected by |"""
+
+    __slots__ = ("calls",)
+
+    def __init__(self, calls):
+        self._init(calls)
+
+
+class Seq(Node):
+
+    """pipes and calls separated by ;"""
+
+    __slots__ = ("commands",)
+
+    def __init__(self, commands):
+        self._init(commands)
+
+
+class SyntaxTreeBuilder(Transformer):
+
+    """
+    Builds the syntax tree from the rules of shell_grammar.lark. With
+    the LALR engine it is applied while parsing so no lark Tree is
+    built at all.
+    """
+
+    def single_quoted(self, children):
+        content = children[0] if children else ""
+        return Token("SINGLE_QUOTED", content)
+
+    def double_quoted(self, children):
+        if not children:
+            return [Token("DOUBLE_QUOTED", "")]
+        return children
+
+    def backquoted(self, children):
+        return Substitution(str(children[0]) if children else "")
+
+    def nested_backquoted(self, children):
+        return Substitution(str(children[0]) if children else "", True)
+
+    def argument(self, children):
+        parts = []
+        for child in children:
+            if type(child) is list:  # double quoted
+                parts.extend(child)
+            else:
+                parts.append(child)
+        return Argument(tuple(parts))
+
+    def redirection(self, children):
+        return Redirection(str(children[0]), children[1])
+
+    def call(self, children):
+        if not children:
+            return None
+        return Call(tuple(children))
+
+    def pipeline(self, children):
+        # the grammar allows no empty call in a pipe
+        if len(children) == 1:
+            return children[0]
+        return Pipe(tuple(children))
+
+    def command_line(self, children):
+        return Seq(
+            tuple(command for command in children if command is not None)
+        )
@@ -0,0 +1,319 @@
+"""
+Worker processes for the CPU-bound stages of a pipe. Threads of one
+interpreter share the GIL, so a pipe of text filters runs on one core
+whatever the executor; running those stages in worker processes lets
+them use as many cores as there are stages.
+
+A worker runs one stage at a time. It receives the application,
+arguments, file output, working directory and data mode of the stage,
+then its input as buffers of chunks ending with an end message, over one
+OS pipe, and sends its output buffers back, along with the errors of
+unsafe applications, followed by a done or an error message, over
+another. The done or error message tells whether the stage stopped
+reading its input before the end, in which case the input stops being
+sent, the way a process writing to a closed pipe stops.
+"""
+import multiprocessing
+import os
+import threading
+import types
+from applications import resolve_application, stream_application
+from streams import buffered, data_mode
+
+# applications run in a worker process by the processes executor
+OFFLOADED = frozenset(["grep", "sort", "cut", "uniq"])
+# how often a stage waiting for its worker checks for cancellation
+_POLL_INTERVAL = 0.05
+
+
+class _Input:
+
+    """the input stream of the stage a worker runs, read off its jobs pipe"""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.started = False
+        self.ended = False
+
+    def __iter__(self):
+        self.started = True
+        while not self.ended:
+            if not self.jobs.poll(_POLL_INTERVAL):
+                # an empty chunk lets the stage pass on what it holds
+                # while it waits
+                yield ""
+                continue
+            message = self.jobs.recv()
+            if message[0] == "end":
+                self.ended = True
+            else:
+                yield from message[1]
+
+    def drain(self):
+        """reads the input the stage left, up to the end message"""
+        while not self.ended:
+            self.ended = self.jobs.recv()[0] == "end"
+
+
+class _Errors:
+
+    """the stderr of the stage a worker runs, sent as it is written"""
+
+    def __init__(self, results):
+        self.results = results
+
+    def append(self, chunk):
+        self.results.send(("stderr", chunk))
+
+
+def _run_job(job, jobs, results):
+    (
+        application, args, file_output, cwd, mode, raw_command, piped,
+        errors,
+    ) = job
+    stdin = _Input(jobs) if piped else None
+    try:
+        os.chdir(cwd)
+        os.environ["SHELL_DATA_MODE"] = mode
+        executable = resolve_application(
+            application, types.SimpleNamespace(raw_command=raw_command)
+        )
+        chunks = stream_application(
+            executable, args, None if stdin is None else iter(stdin),
+            file_output, _Errors(results) if errors else None,
+        )
+        for buffer in buffered(chunks):
+            results.send(("data", buffer))
+        message = ("done", None)
+    except Exception as e:
+        message = ("error", e)
+    stopped = stdin is not None and stdin.started and not stdin.ended
+    try:
+        results.send(message + (stopped,))
+    except Exception as e:
+        # the error could not be pickled
+        error = RuntimeError(f"{raw_command}: {e!r}")
+        results.send(("error", error, stopped))
+    if stdin is not None:
+        stdin.drain()
+
+
+def _serve(jobs, results):
+    """the main loop of a worker process"""
+    while True:
+        try:
+            job = jobs.recv()
+        except EOFError:
+            return
+        _run_job(job, jobs, results)
+
+
+class Worker:
+
+    """a worker process and the parent's ends of its pipes"""
+
+    def __init__(self, context):
+        jobs_out, self.jobs = context.Pipe(duplex=False)
+        self.results, results_in = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=_serve, args=(jobs_out, results_in), daemon=True
+        )
+        self.process.start()
+        jobs_out.close()
+        results_in.close()
+
+    def stop(self):
+        self.jobs.close()
+        self.results.close()
+        self.process.join()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.jobs.close()
+        self.results.close()
+
+
+class ProcessPool:
+
+    """
+    A pool of warm worker processes, so that a stage does not pay for
+    starting an interpreter. Workers are started on demand and at most
+    size of them are kept once released. A pipe may need more workers
+    than size at once, as every offloaded stage holds one until it
+    completes, so acquire starts a new one when none is idle.
+    """
+
+    def __init__(self, size=None):
+        self.size = size or os.cpu_count() or 1
+        # spawned workers do not inherit the locks of the parent's threads
+        self.context = multiprocessing.get_context("spawn")
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        return Worker(self.context)
+
+    def release(self, worker):
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(worker)
+                return
+        worker.stop()
+
+    def discard(self, worker):
+        """kills a worker whose stage did not run to completion"""
+        worker.kill()
+
+    def warm(self, n=None):
+        """starts workers ahead of the first pipe, up to n idle ones"""
+        n = self.size if n is None else n
+        started = [
+            Worker(self.context) for _ in range(n - len(self.idle))
+        ]
+        for worker in started:
+            self.release(worker)
+
+    def shutdown(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for worker in idle:
+            worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """returns the pool shared by every pipe, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPool()
+        return _pool
+
+
+class _Holds:
+
+    """
+    Releases a worker once both its stage and the thread feeding it
+    input are done with it, as the worker reads the input of a stage up
+    to the end message before it takes another one.
+    """
+
+    def __init__(self, pool, worker, holds):
+        self.pool = pool
+        self.worker = worker
+        self.holds = holds
+        self.killed = False
+        self.lock = threading.Lock()
+
+    def release(self):
+        with self.lock:
+            self.holds -= 1
+            if self.holds or self.killed:
+                return
+        self.pool.release(self.worker)
+
+    def kill(self):
+        with self.lock:
+            self.killed = True
+        self.pool.discard(self.worker)
+
+
+def _feed(worker, stdin, stopped, holds):
+    try:
+        for buffer in buffered(stdin):
+            if stopped.is_set():
+                break
+            worker.jobs.send(("data", buffer))
+        worker.jobs.send(("end",))
+    except Exception:
+        # the pipe was cancelled, or the worker killed
+        pass
+    finally:
+        holds.release()
+
+
+class ProcessStage:
+
+    """
+    Runs a compiled call in a worker process. The call is evaluated in
+    this process, command substitutions included, and only its
+    application, arguments and redirection are sent to the worker, whose
+    output is streamed back. Stopping the stream before the worker is
+    done kills it, the way a closed pipe stops a process.
+    """
+
+    def __init__(self, call, pool, cancelled):
+        self.call = call
+        self.pool = pool
+        self.cancelled = cancelled
+
+    @property
+    def raw_command(self):
+        return self.call.raw_command
+
+    def stream(self, stdin=None, stderr=None):
+        application, args, file_output = self.call.invocation()
+        worker = self.pool.acquire()
+        holds = _Holds(self.pool, worker, 1 if stdin is None else 2)
+        stopped = threading.Event()
+        feeder = None
+        finished = False
+        try:
+            worker.jobs.send((
+                application, list(args), file_output, os.getcwd(),
+                data_mode(),
+                self.raw_command, stdin is not None, stderr is not None,
+            ))
+            if stdin is not None:
+                feeder = threading.Thread(
+                    target=_feed, args=(worker, stdin, stopped, holds),
+                    daemon=True,
+                )
+                feeder.start()
+            while True:
+                while not worker.results.poll(_POLL_INTERVAL):
+                    if self.cancelled.is_set():
+                        return
+                    # lets the stages after it pass on what they hold
+                    yield ""
+                message = worker.results.recv()
+                if message[0] == "data":
+                    yield from message[1]
+                    continue
+                if message[0] == "stderr":
+                    stderr.append(message[1])
+                    continue
+                finished = True
+                if message[2]:
+                    stopped.set()
+                elif feeder is not None:
+                    # input the stage did not read still runs upstream
+                    feeder.join()
+                if message[0] == "error":
+                    raise message[1]
+                return
+        finally:
+            if finished:
+                holds.release()
+            else:
+                holds.kill()
+
+
+def offload(call, pool, cancelled):
+    """
+    wraps a compiled call of a CPU-bound application in a ProcessStage,
+    returns any other call as it is.
+    """
+    application = getattr(call, "application", None)
+    if type(application) is str and application.startswith("_"):
+        application = application[1:]
+    if application in OFFLOADED and hasattr(call, "invocation"):
+        return ProcessStage(call, pool, cancelled)
+    return call
@@ -1,10 +1,14 @@
 import os
 import re
+import sys
 import unittest
 import subprocess
+import threading
 import applications as app
 from collections import deque
-from commands import Call
+from commands import Call, Pipe
+from plan import compile_command_line
+from streams import Lines, text
 
 
 class TestPwd(unittest.TestCase):
@@ -279,6 +283,40 @@ class TestCat(unittest.TestCase):
             "AAA",
         )
 
+    def test_cat_to_file_copies_files(self):
+        self.prepare("printf 'a\\r\\nb' > unittests/crlf.txt")
+        call = Call("cat unittests/crlf.txt unittests/test2.txt > "
+                    "unittests/out.txt")
+        call.eval(self.out)
+        self.assertEqual(len(self.out), 0)
+        with open("unittests/out.txt", "rb") as f:
+            self.assertEqual(f.read(), b"a\r\nbBBB\n")
+
+    def test_cat_to_one_of_its_files(self):
+        call = Call("cat unittests/test1.txt unittests/test2.txt > "
+                    "unittests/test1.txt")
+        call.eval(self.out)
+        with open("unittests/test1.txt", "rb") as f:
+            self.assertEqual(f.read(), b"AAA\nBBB\n")
+
+    def test_cat_in_pipe_to_one_of_its_files(self):
+        pipe = compile_command_line(
+            "echo x | cat unittests/test2.txt unittests/test1.txt > "
+            "unittests/test1.txt"
+        ).commands[0]
+        for mode in ("sequential", "streaming", "threaded", "processes"):
+            with self.subTest(mode=mode):
+                self.prepare("echo AAA > unittests/test1.txt")
+                Pipe(*pipe.calls, mode=mode).eval(self.out)
+                with open("unittests/test1.txt", "rb") as f:
+                    self.assertEqual(f.read(), b"BBB\nAAA\n")
+
+    def test_cat_to_file_of_missing_file(self):
+        call = Call("cat unittests/test1.txt dir3/test.txt > "
+                    "unittests/out.txt")
+        self.assertRaises(FileNotFoundError, call.eval, self.out)
+        self.assertFalse(os.path.exists("unittests/out.txt"))
+
 
 class TestEcho(unittest.TestCase):
     def setUp(self):
@@ -348,32 +386,34 @@ class TestHead(unittest.TestCase):
         head = app.Head()
         self.assertRaises(
             FileNotFoundError,
-            head._read_first_n_lines_from_file,
-            "unittests/test.txt",
-            10,
+            head.exec,
+            ["-n", "10", "unittests/test.txt"],
             self.out,
+            False,
         )
 
     def test_head_read_first_n_lines_from_file_n_is_zero(self):
         head = app.Head()
-        head._read_first_n_lines_from_file(
-            "unittests/alphabet.txt", 0, self.out
+        head.exec(
+            ["-n", "0", "unittests/alphabet.txt"], self.out, False
             )
         self.assertEqual(len(self.out), 1)
         self.assertEqual(self.out.pop().strip(), "")
 
     def test_head_read_first_n_lines_from_file_n_is_negative(self):
         head = app.Head()
-        head._read_first_n_lines_from_file(
-            "unittests/alphabet.txt", -2, self.out
-            )
-        self.assertEqual(len(self.out), 1)
-        self.assertEqual(self.out.pop().strip(), "")
+        self.assertRaises(
+            app.ApplicationExcecutionError,
+            head.exec,
+            ["-n", "-2", "unittests/alphabet.txt"],
+            self.out,
+            False,
+        )
 
     def test_head_read_first_n_lines_from_file(self):
         head = app.Head()
-        head._read_first_n_lines_from_file(
-            "unittests/alphabet.txt", 5, self.out
+        head.exec(
+            ["-n", "5", "unittests/alphabet.txt"], self.out, False
             )
         self.assertEqual(len(self.out), 1)
         self.assertListEqual(
@@ -388,7 +428,7 @@ class TestHead(unittest.TestCase):
         )
 
     def test_head_stdin(self):
-        self.out.append("unittests/alphabet.txt")
+        self.out.append(self.alphabet)
         head = app.Head()
         head.exec([], self.out, True)
         self.assertEqual(len(self.out), 1)
@@ -397,16 +437,72 @@ class TestHead(unittest.TestCase):
             ["a", "b", "c", "d", "e", "f", "g", "h", "i", "j"],
         )
 
+    def test_head_n_flag_stdin(self):
+        self.out.append(self.alphabet)
+        head = app.Head()
+        head.exec(["-n", "3"], self.out, True)
+        self.assertEqual(len(self.out), 1)
+        self.assertEqual(self.out.pop(), "a\nb\nc\n")
+
+    def test_head_stops_reading_stdin(self):
+        chunks = iter(self.alphabet.splitlines(keepends=True))
+        head = app.Head()
+        self.assertEqual("".join(head.stream(["-n", "2"], chunks)), "a\nb\n")
+        self.assertEqual(next(chunks), "c\n")
+
     def test_head_two_args(self):
         head = app.Head()
+        # both are files
         self.assertRaises(
-            app.ApplicationExcecutionError,
+            FileNotFoundError,
             head.exec,
             ["15", "unittests/alphabet.txt"],
             self.out,
             False,
         )
 
+    def test_head_files(self):
+        self.prepare("printf '1\\n2' > unittests/numbers.txt")
+        head = app.Head()
+        head.exec(
+            ["-n", "2", "unittests/numbers.txt", "unittests/alphabet.txt"],
+            self.out,
+            False,
+        )
+        self.assertEqual(
+            self.out.pop(),
+            "==> unittests/numbers.txt <==\n1\n2\n"
+            "==> unittests/alphabet.txt <==\na\nb\n",
+        )
+
+    def test_head_c_flag(self):
+        head = app.Head()
+        head.exec(["-c", "3", "unittests/alphabet.txt"], self.out, False)
+        self.assertEqual(self.out.pop(), "a\nb")
+        head.exec(["-c", "0", "unittests/alphabet.txt"], self.out, False)
+        self.assertEqual(self.out.pop(), "")
+
+    def test_head_c_flag_stdin(self):
+        chunks = iter(["h\u00e9llo\n", "world\n"])
+        head = app.Head()
+        self.assertEqual("".join(head.stream(["-c", "3"], chunks)), "h\u00e9")
+        self.assertEqual(next(chunks), "world\n")
+        self.assertEqual(
+            "".join(head.stream(["-c", "2"], iter(["h\u00e9"]))), "h\udcc3"
+        )
+
+    def test_head_c_flag_to_file(self):
+        self.prepare("printf 'a\\xc3\\xa9\\nb\\n' > unittests/u.txt")
+        for cmdline in [
+            "head -c 2 unittests/u.txt > unittests/out.txt",
+            "cat unittests/u.txt | head -c 2 > unittests/out.txt",
+            "head -c 2 unittests/u.txt | head -c 2 > unittests/out.txt",
+        ]:
+            with self.subTest(cmdline=cmdline):
+                compile_command_line(cmdline).eval(self.out)
+                with open("unittests/out.txt", "rb") as f:
+                    self.assertEqual(f.read(), b"a\xc3")
+
     def test_head_wrong_flag(self):
         head = app.Head()
         self.assertRaises(
@@ -495,32 +591,34 @@ class TestTail(unittest.TestCase):
         tail = app.Tail()
         self.assertRaises(
             FileNotFoundError,
-            tail._read_last_n_lines_from_file,
-            "unittests/test.txt",
-            10,
+            tail.exec,
+            ["-n", "10", "unittests/test.txt"],
             self.out,
+            False,
         )
 
     def test_tail_read_last_n_lines_from_file_n_is_zero(self):
         tail = app.Tail()
-        tail._read_last_n_lines_from_file(
-            "unittests/alphabet.txt", 0, self.out
+        tail.exec(
+            ["-n", "0", "unittests/alphabet.txt"], self.out, False
             )
         self.assertEqual(len(self.out), 1)
         self.assertEqual(self.out.pop().strip(), "")
 
     def test_tail_read_last_n_lines_from_file_n_is_negative(self):
         tail = app.Tail()
-        tail._read_last_n_lines_from_file(
-            "unittests/alphabet.txt", -2, self.out
-            )
-        self.assertEqual(len(self.out), 1)
-        self.assertEqual(self.out.pop().strip(), "")
+        self.assertRaises(
+            app.ApplicationExcecutionError,
+            tail.exec,
+            ["-n", "-2", "unittests/alphabet.txt"],
+            self.out,
+            False,
+        )
 
     def test_tail_read_last_n_lines_from_file(self):
         tail = app.Tail()
-        tail._read_last_n_lines_from_file(
-            "unittests/alphabet.txt", 5, self.out
+        tail.exec(
+            ["-n", "5", "unittests/alphabet.txt"], self.out, False
             )
         self.assertEqual(len(self.out), 1)
         self.assertListEqual(
@@ -535,7 +633,7 @@ class TestTail(unittest.TestCase):
         )
 
     def test_tail_stdin(self):
-        self.out.append("unittests/alphabet.txt")
+        self.out.append(self.alphabet)
         tail = app.Tail()
         tail.exec([], self.out, True)
         self.assertEqual(len(self.out), 1)
@@ -544,6 +642,43 @@ class TestTail(unittest.TestCase):
             ["q", "r", "s", "t", "u", "v", "w", "x", "y", "z"],
         )
 
+    def test_tail_flags_stdin(self):
+        tail = app.Tail()
+        for args, expected in [
+            (["-n", "2"], "y\nz"),
+            (["-n", "0"], ""),
+            (["-n", "+25"], "y\nz"),
+            (["-c", "3"], "y\nz"),
+            (["-c", "+49"], "y\nz"),
+            (["-f"], "q\nr\ns\nt\nu\nv\nw\nx\ny\nz"),
+            (["-n", "1", "-f"], "z"),
+        ]:
+            with self.subTest(args=args):
+                chunks = iter(self.alphabet.splitlines(keepends=True))
+                self.assertEqual("".join(tail.stream(args, chunks)), expected)
+
+    def test_tail_flags_without_stdin(self):
+        tail = app.Tail()
+        self.assertRaises(
+            app.ApplicationExcecutionError, tail.exec, ["-n", "2"],
+            self.out, False,
+        )
+
+    def test_tail_in_pipe(self):
+        self.prepare("seq 5 > unittests/nums.txt")
+        for cmdline, expected in [
+            ("cat unittests/nums.txt | tail", "1\n2\n3\n4\n5\n"),
+            ("cat unittests/nums.txt | tail -n 2", "4\n5\n"),
+            ("cat unittests/nums.txt | tail -c 3", "\n5\n"),
+            ("cat unittests/nums.txt | tail -n +2", "2\n3\n4\n5\n"),
+        ]:
+            for mode in ("sequential", "streaming", "threaded", "processes"):
+                with self.subTest(cmdline=cmdline, mode=mode):
+                    out = deque()
+                    pipe = compile_command_line(cmdline).commands[0]
+                    Pipe(*pipe.calls, mode=mode).eval(out)
+                    self.assertEqual("".join(out), expected)
+
     def test_tail_two_args(self):
         tail = app.Tail()
         self.assertRaises(
@@ -601,6 +736,68 @@ class TestTail(unittest.TestCase):
             ["q", "r", "s", "t", "u", "v", "w", "x", "y", "z"],
         )
 
+    def test_tail_n_flag_from_line(self):
+        tail = app.Tail()
+        tail.exec(["-n", "+24", "unittests/alphabet.txt"], self.out, False)
+        self.assertEqual(self.out.pop(), "x\ny\nz\n")
+        tail.exec(["-n", "+0", "unittests/alphabet.txt"], self.out, False)
+        self.assertEqual(self.out.pop(), self.alphabet + "\n")
+
+    def test_tail_n_flag_from_line_to_channel(self):
+        out = app.Channel()
+        app.Tail().exec(["-n", "+25", "unittests/alphabet.txt"], out, False)
+        self.assertEqual("".join(out.chunks()), "y\nz\n")
+
+    def test_tail_c_flag(self):
+        tail = app.Tail()
+        tail.exec(["-c", "5", "unittests/alphabet.txt"], self.out, False)
+        self.assertEqual(self.out.pop(), "\ny\nz\n")
+        tail.exec(["-c", "+49", "unittests/alphabet.txt"], self.out, False)
+        self.assertEqual(self.out.pop(), "y\nz\n")
+
+    def test_tail_c_flag_to_file(self):
+        self.prepare("printf 'a\\xc3\\xa9\\nb\\n' > unittests/u.txt")
+        for cmdline in [
+            "tail -c 4 unittests/u.txt > unittests/out.txt",
+            "tail -c +3 unittests/u.txt > unittests/out.txt",
+        ]:
+            with self.subTest(cmdline=cmdline):
+                compile_command_line(cmdline).eval(self.out)
+                with open("unittests/out.txt", "rb") as f:
+                    self.assertEqual(f.read(), b"\xa9\nb\n")
+
+    def test_tail_follow(self):
+        chunks = app.Tail().stream(
+            ["-n", "2", "-f", "unittests/alphabet.txt"], None
+        )
+        self.assertEqual(next(chunks), "y\nz\n")
+        with open("unittests/alphabet.txt", "a") as f:
+            f.write("0\n")
+        self.assertEqual(next(chunks), "0\n")
+        self.assertEqual(next(chunks), "")
+        chunks.close()
+
+    def test_tail_follow_in_a_pipe(self):
+        chunks = app.Tail().stream(["-F", "unittests/alphabet.txt"], None)
+        matches = app.Grep().records(["[z0]"], chunks)
+        self.assertEqual(next(chunk for chunk in matches if chunk), "z")
+        with open("unittests/alphabet.txt", "a") as f:
+            f.write("0\n")
+        self.assertEqual(
+            "".join(next(chunk for chunk in matches if chunk)), "\n0"
+        )
+        matches.close()
+
+    def test_tail_c_flag_string(self):
+        tail = app.Tail()
+        self.assertRaises(
+            app.ApplicationExcecutionError,
+            tail.exec,
+            ["-c", "+five", "unittests/alphabet.txt"],
+            self.out,
+            False,
+        )
+
 
 class TestGrep(unittest.TestCase):
     @classmethod
@@ -641,7 +838,8 @@ class TestGrep(unittest.TestCase):
         grep = app.Grep()
         pattern = "..."
         lines = ["AAA", "BBB", "CCC"]
-        grep._find_matches_from_stdin(pattern, lines, self.out)
+        self.out.append("\n".join(lines))
+        grep.exec([pattern], self.out, True)
 
         self.assertEqual(len(self.out), 1)
         self.assertEqual(self.out.pop(), "AAA\nBBB\nCCC")
@@ -650,7 +848,8 @@ class TestGrep(unittest.TestCase):
         grep = app.Grep()
         pattern = "A.."
         lines = ["AAA", "BBB", "CCC"]
-        grep._find_matches_from_stdin(pattern, lines, self.out)
+        self.out.append("\n".join(lines))
+        grep.exec([pattern], self.out, True)
 
         self.assertEqual(len(self.out), 1)
         self.assertEqual(self.out.pop(), "AAA")
@@ -659,7 +858,8 @@ class TestGrep(unittest.TestCase):
         grep = app.Grep()
         pattern = "D.."
         lines = ["AAA", "BBB", "CCC"]
-        grep._find_matches_from_stdin(pattern, lines, self.out)
+        self.out.append("\n".join(lines))
+        grep.exec([pattern], self.out, True)
 
         self.assertEqual(len(self.out), 1)
         self.assertEqual(self.out.pop(), "")
@@ -667,48 +867,57 @@ class TestGrep(unittest.TestCase):
     def test__grep_with_match_all(self):
         grep = app.Grep()
         pattern = "..."
-        multiple_files = False
-        contents = []
-        file = "test.txt"
+        file = "unittests/test.txt"
+        files = [file]
         lines = ["AAA", "BBB", "CCC"]
-        grep._grep(pattern, multiple_files, contents, file, lines)
-        self.assertListEqual(contents, ["AAA", "BBB", "CCC"])
+        with open(file, "w") as f:
+            f.write("\n".join(lines))
+        grep.exec([pattern] + files, self.out, False)
+        self.assertListEqual(
+            self.out.pop().split("\n"), ["AAA", "BBB", "CCC"]
+        )
 
     def test__grep_with_partial_match(self):
         grep = app.Grep()
         pattern = "A.."
-        multiple_files = False
-        contents = []
-        file = "test.txt"
+        file = "unittests/test.txt"
+        files = [file]
         lines = ["AAA", "ABB", "CCC"]
-        grep._grep(pattern, multiple_files, contents, file, lines)
-        self.assertListEqual(contents, ["AAA", "ABB"])
+        with open(file, "w") as f:
+            f.write("\n".join(lines))
+        grep.exec([pattern] + files, self.out, False)
+        self.assertListEqual(self.out.pop().split("\n"), ["AAA", "ABB"])
 
     def test__grep_with_no_match(self):
         grep = app.Grep()
         pattern = "D.."
-        multiple_files = False
-        contents = []
-        file = "test.txt"
+        file = "unittests/test.txt"
+        files = [file]
         lines = ["AAA", "ABB", "CCC"]
-        grep._grep(pattern, multiple_files, contents, file, lines)
-        self.assertEqual(contents, [])
+        with open(file, "w") as f:
+            f.write("\n".join(lines))
+        grep.exec([pattern] + files, self.out, False)
+        self.assertEqual(self.out.pop(), "")
 
     def test__grep_with_multiple_files_set_to_true(self):
         grep = app.Grep()
         pattern = "A.."
-        multiple_files = True
-        contents = []
-        file = "test.txt"
+        file = "unittests/test.txt"
+        files = [file, "unittests/test2.txt"]
         lines = ["AAA", "ABB", "CCC"]
-        grep._grep(pattern, multiple_files, contents, file, lines)
-        self.assertListEqual(contents, ["test.txt:AAA", "test.txt:ABB"])
+        with open(file, "w") as f:
+            f.write("\n".join(lines))
+        grep.exec([pattern] + files, self.out, False)
+        self.assertListEqual(
+            self.out.pop().split("\n"),
+            ["unittests/test.txt:AAA", "unittests/test.txt:ABB"],
+        )
 
     def test_find_matches_from_files_with_one_file(self):
         grep = app.Grep()
         pattern = "BBB"
         files = ["unittests/test2.txt"]
-        grep._find_matches_from_files(pattern, files, self.out)
+        grep.exec([pattern] + files, self.out, False)
         self.assertEqual(len(self.out), 1)
         self.assertEqual(self.out.pop(), "BBB")
 
@@ -716,7 +925,7 @@ class TestGrep(unittest.TestCase):
         grep = app.Grep()
         pattern = "..."
         files = ["unittests/test2.txt", "unittests/test3.txt"]
-        grep._find_matches_from_files(pattern, files, self.out)
+        grep.exec([pattern] + files, self.out, False)
         self.assertEqual(len(self.out), 1)
         self.assertListEqual(
             self.out.pop().split("\n"),
@@ -747,6 +956,39 @@ class TestGrep(unittest.TestCase):
         self.assertEqual(len(self.out), 1)
         self.assertEqual(self.out.pop(), "AAA")
 
+    def test_grep_max_count(self):
+        grep = app.Grep()
+        self.out.append("AAA\nBBB\nABC\nACC")
+        grep.exec(["-m", "2", "A"], self.out, True)
+        self.assertEqual(self.out.pop(), "AAA\nABC")
+
+    def test_grep_passes_records_on(self):
+        grep = app.Grep()
+        batch = Lines(["AAA\n", "BBB\n", "ABC\n"])
+        chunks = list(grep.records(["A"], iter([batch, "AC"])))
+        self.assertEqual("".join(text(chunks)), "AAA\nABC\nAC")
+        self.assertIs(type(chunks[0]), Lines)
+        self.assertIs(chunks[0][0], batch[0])
+
+    def test_grep_max_count_per_file(self):
+        grep = app.Grep()
+        args = ["-m", "1", "...", "unittests/test1.txt", "unittests/test2.txt"]
+        grep.exec(args, self.out, False)
+        self.assertListEqual(
+            self.out.pop().split("\n"),
+            ["unittests/test1.txt:AAA", "unittests/test2.txt:BBB"],
+        )
+
+    def test_grep_max_count_not_a_number(self):
+        grep = app.Grep()
+        self.assertRaises(
+            app.ApplicationExcecutionError,
+            grep.exec,
+            ["-m", "x", "A", "unittests/test1.txt"],
+            self.out,
+            False,
+        )
+
     def test_grep(self):
         grep = app.Grep()
         args = ["B..", "unittests/test2.txt", "unittests/test3.txt"]
@@ -757,6 +999,19 @@ class TestGrep(unittest.TestCase):
             self.out.pop().split("\n"), ["unittests/test2.txt:BBB"]
             )
 
+    def test_grep_passes_matches_on_while_stdin_waits(self):
+        read = []
+
+        def stdin():
+            for chunk in ["AA\nB\n", "", "AC\n", "", "B\n", "AD\n"]:
+                read.append(chunk)
+                yield chunk
+
+        chunks = app.Grep().records(["A"], stdin())
+        self.assertEqual(next(chunk for chunk in chunks if chunk), "AA")
+        self.assertEqual(len(read), 2)
+        self.assertEqual("".join(text(chunks)), "\nAC\nAD")
+
 
 class TestCut(unittest.TestCase):
     @classmethod
@@ -1069,6 +1324,14 @@ class TestUniq(unittest.TestCase):
         res = self.out.pop()
         self.assertEqual(res, "Say once\nUniq\n")
 
+    def test_uniq_passes_records_on(self):
+        uniq = app.Uniq()
+        batch = Lines(["a\n", "a\n", "b\n"])
+        chunks = list(uniq.records([], iter([batch])))
+        self.assertEqual(chunks, [["a\n", "b\n"]])
+        self.assertIs(type(chunks[0]), Lines)
+        self.assertIs(chunks[0][1], batch[2])
+
     def test_uniq_incorrect_args(self):
         uniq = app.Uniq()
         args = ["test.txt", "-i"]
@@ -1199,6 +1462,14 @@ class TestSort(unittest.TestCase):
         self.assertEqual(len(self.out), 1)
         self.assertEqual(self.out.pop(), "c\ne\nn\nn\no\ns\nt\nt\n")
 
+    def test_sort_records(self):
+        sort = app.Sort()
+        chunks = list(sort.records([], iter(["b\na\n"])))
+        self.assertEqual(chunks, [["a\n", "b\n"]])
+        self.assertIs(type(chunks[0]), Lines)
+        # a last line without newline can only end a batch of records
+        self.assertEqual(list(sort.records([], iter(["b\na"]))), ["ab\n"])
+
     def test_sort_stdin_reverse(self):
         pass
         sort = app.Sort()
@@ -1307,6 +1578,23 @@ class TestUnsafeDecorator(unittest.TestCase):
         self.assertEqual(len(self.out), 1)
         self.assertEqual(self.out.pop().strip(), "Index Error: _cat")
 
+    def test_error_to_stderr(self):
+        cat = app.UnsafeDecorator(
+            app.application_factory("cat"), Call("cat foo.txt")
+            )
+        stderr = deque()
+        cat.exec(["foo.txt"], self.out, False, stderr)
+        self.assertEqual(len(self.out), 0)
+        self.assertEqual(stderr.pop(), "OS Error: cat foo.txt\n")
+
+    def test_stream_error_to_stderr(self):
+        cat = app.UnsafeDecorator(
+            app.application_factory("cat"), Call("cat foo.txt")
+            )
+        stderr = deque()
+        self.assertListEqual(list(cat.stream(["foo.txt"], None, stderr)), [])
+        self.assertEqual(stderr.pop(), "OS Error: cat foo.txt\n")
+
 
 class TestFileOutput(unittest.TestCase):
 
@@ -1365,3 +1653,247 @@ class TestExit(unittest.TestCase):
             out,
             True
             )
+
+
+class TestFileCache(unittest.TestCase):
+    @classmethod
+    def prepare(cls, cmdline):
+        args = [
+            "/bin/bash",
+            "-c",
+            cmdline,
+        ]
+        p = subprocess.run(args, capture_output=True)
+        return p.stdout.decode()
+
+    def setUp(self):
+        p = subprocess.run(["mkdir", "unittests"], stdout=subprocess.DEVNULL)
+        if p.returncode != 0:
+            print("error: failed to create unittest directory")
+            exit(1)
+        filesystem_setup = ";".join(
+            [
+                "cd unittests",
+                "printf 'BBB\\nAAA\\nCCC\\n' > test1.txt",
+                "printf 'a\\fb\\nc' > test2.txt",
+                "seq 10000 > test3.txt",
+                "printf 'E\\n' > test4.txt",
+            ]
+        )
+        self.prepare(filesystem_setup)
+        for name in ["test1.txt", "test2.txt", "test3.txt", "test4.txt"]:
+            self._settle(name)
+        self.file_cache = app.file_cache
+        app.file_cache = self.cache = app.FileCache(1024 * 1024)
+        self.out = deque()
+
+    def tearDown(self):
+        app.file_cache = self.file_cache
+        p = subprocess.run(
+            ["rm", "-r", "unittests"], stdout=subprocess.DEVNULL
+            )
+        if p.returncode != 0:
+            print("error: failed to remove unittests directory")
+            exit(1)
+
+    def _settle(self, name):
+        """dates a test file back, as new files are not cached"""
+        settled = os.path.getmtime("unittests/" + name) - 2 * app.SETTLE_TIME
+        os.utime("unittests/" + name, (settled, settled))
+
+    def test_file_is_read_once(self):
+        file = "unittests/test1.txt"
+        app.Head().exec([file], self.out, False)
+        app.Tail().exec([file], self.out, False)
+        app.Grep().exec(["A", file], self.out, False)
+        app.Sort().exec([file], self.out, False)
+        app.Cat().exec([file], self.out, False)
+        self.assertEqual(self.out.pop(), "BBB\nAAA\nCCC\n")
+        self.assertEqual(self.out.pop(), "AAA\nBBB\nCCC\n")
+        self.assertEqual(self.out.pop(), "AAA")
+        self.assertEqual(self.cache.stats()["files"], 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (4, 1))
+        self.assertEqual(self.cache.hit_ratio, 0.8)
+
+    def test_lines_are_split_once(self):
+        lines = self.cache.lines("unittests/test1.txt")
+        self.assertEqual(type(lines), Lines)
+        self.assertIs(self.cache.lines("unittests/test1.txt"), lines)
+        self.assertEqual(lines, ["BBB\n", "AAA\n", "CCC\n"])
+
+    def test_lines_with_other_boundaries(self):
+        lines = self.cache.lines("unittests/test2.txt")
+        self.assertEqual(type(lines), list)
+        self.assertEqual(lines, ["a\fb\n", "c"])
+        batches = list(self.cache.line_batches("unittests/test2.txt"))
+        self.assertEqual(batches, [["a\fb\n", "c"]])
+        self.assertEqual(type(batches[0]), list)
+
+    def test_changed_file_is_read_again(self):
+        self.assertEqual(self.cache.lines("unittests/test1.txt")[0], "BBB\n")
+        self.prepare("printf 'DDD\\n' > unittests/test1.txt")
+        self.assertEqual(self.cache.lines("unittests/test1.txt"), ["DDD\n"])
+        self.assertEqual(self.cache.hits, 0)
+
+    def test_recently_changed_file_is_not_cached(self):
+        self.prepare("printf 'DDD\\n' > unittests/test5.txt")
+        self.cache.lines("unittests/test5.txt")
+        self.assertEqual(self.cache.stats()["files"], 0)
+
+    def test_partly_read_file_is_not_cached(self):
+        app.Head().exec(["-n", "1", "unittests/test3.txt"], self.out, False)
+        self.assertEqual(self.out.pop(), "1\n")
+        self.assertEqual(self.cache.stats()["files"], 0)
+
+    def test_least_recently_used_file_is_evicted(self):
+        self.cache.lines("unittests/test1.txt")
+        self.cache.lines("unittests/test2.txt")
+        self.cache.budget = self.cache.size
+        "".join(self.cache.chunks("unittests/test1.txt"))
+        self.cache.lines("unittests/test4.txt")
+        self.assertLessEqual(self.cache.size, self.cache.budget)
+        self.assertEqual(
+            [os.path.basename(path) for path in self.cache.entries],
+            ["test1.txt", "test4.txt"],
+        )
+
+    def test_large_file_is_not_cached(self):
+        self.cache.budget = 1024
+        self.assertEqual(len(self.cache.lines("unittests/test3.txt")), 10000)
+        self.assertEqual(self.cache.stats()["files"], 0)
+
+    def test_stages_on_threads_share_the_cache(self):
+        files = " ".join(
+            f"unittests/test{i}.txt" for i in (1, 3, 4, 1, 3, 4)
+        )
+        # each stage reading the files rather than its stdin
+        cmdline = (
+            f"cat {files} | grep 1 {files} | sort unittests/test3.txt | "
+            f"head -n 20000 {files} | tail -n 500 unittests/test1.txt | "
+            f"cat {files}"
+        )
+        expected = deque()
+        compile_command_line(cmdline).eval(expected)
+        # cached as chunks, their lines split by the stages at once
+        self.cache.clear()
+        for file in files.split():
+            "".join(self.cache.chunks(file))
+        outs = [deque() for _ in range(4)]
+        pipe = compile_command_line(cmdline).commands[0]
+        threads = [
+            threading.Thread(
+                target=Pipe(*pipe.calls, mode="threaded").eval, args=(out,)
+            )
+            for out in outs
+        ]
+        # switching threads as often as it can
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        for out in outs:
+            self.assertEqual("".join(out), "".join(expected))
+        entries = self.cache.entries.values()
+        for entry in entries:
+            self.assertEqual(
+                entry.size,
+                app._CachedFile(None, entry.chunks, entry.lines).size,
+            )
+        self.assertEqual(
+            self.cache.size, sum(entry.size for entry in entries)
+        )
+
+
+class TestBytesMode(unittest.TestCase):
+    @classmethod
+    def prepare(cls, cmdline):
+        args = [
+            "/bin/bash",
+            "-c",
+            cmdline,
+        ]
+        p = subprocess.run(args, capture_output=True)
+        return p.stdout.decode()
+
+    def setUp(self):
+        p = subprocess.run(["mkdir", "unittests"], stdout=subprocess.DEVNULL)
+        if p.returncode != 0:
+            print("error: failed to create unittest directory")
+            exit(1)
+        filesystem_setup = ";".join(
+            [
+                "cd unittests",
+                "printf 'h\\xc3\\xa9llo\\nzeta\\nAlpha\\nalpha\\nalpha\\nb"
+                "\\xc3\\xa9ta\\nlast' > test1.txt",
+                "printf 'AAA\\r\\nBBB\\r\\n' > test2.txt",
+                "seq 5000 > test3.txt",
+            ]
+        )
+        self.prepare(filesystem_setup)
+        self.data_mode = os.environ.get("SHELL_DATA_MODE")
+
+    def tearDown(self):
+        if self.data_mode is None:
+            os.environ.pop("SHELL_DATA_MODE", None)
+        else:
+            os.environ["SHELL_DATA_MODE"] = self.data_mode
+        p = subprocess.run(
+            ["rm", "-r", "unittests"], stdout=subprocess.DEVNULL
+            )
+        if p.returncode != 0:
+            print("error: failed to remove unittests directory")
+            exit(1)
+
+    def _run(self, cmdline, mode):
+        os.environ["SHELL_DATA_MODE"] = mode
+        out = deque()
+        compile_command_line(cmdline).eval(out)
+        return "".join(out)
+
+    def test_bytes_mode_gives_the_output_of_text_mode(self):
+        for cmdline in [
+            "cat unittests/test1.txt",
+            "cat unittests/test1.txt | sort | uniq",
+            "cat unittests/test1.txt | sort -r | uniq -i",
+            "sort unittests/test1.txt | head -n 3",
+            "cat unittests/test1.txt | grep 'a.p'",
+            "grep '.*ta' unittests/test1.txt",
+            "grep -m 1 a unittests/test1.txt unittests/test1.txt",
+            "cat unittests/test3.txt | grep '.*7' | cut -b 2- | sort | uniq",
+            "cut -b -2 unittests/test3.txt | uniq | head -n 20",
+            "echo unittests/test1.txt | cat | head -n 2",
+            "cat unittests/test1.txt | sort | tr a-z A-Z | uniq",
+        ]:
+            with self.subTest(cmdline=cmdline):
+                self.assertEqual(
+                    self._run(cmdline, "bytes"), self._run(cmdline, "text")
+                )
+
+    def test_cut_cuts_bytes(self):
+        cmdline = "cat unittests/test1.txt | cut -b 1-2"
+        self.assertEqual(self._run(cmdline, "text").split("\n")[0], "hé")
+        self.assertEqual(
+            self._run(cmdline, "bytes").split("\n")[0], "h\udcc3"
+        )
+        self.assertEqual(
+            self._run("cut -b 1-3 unittests/test1.txt", "bytes"),
+            "hé\nzet\nAlp\nalp\nalp\nbé\nlas",
+        )
+
+    def test_line_endings_are_kept(self):
+        self.assertEqual(
+            self._run("cat unittests/test2.txt | sort", "bytes"),
+            "AAA\r\nBBB\r\n",
+        )
+
+    def test_output_is_written_as_bytes(self):
+        self._run(
+            "cat unittests/test1.txt | grep '.*ta' > unittests/out.txt",
+            "bytes",
+        )
+        self.assertEqual(self.prepare("cat unittests/out.txt"), "zeta\nbéta")
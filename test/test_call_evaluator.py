@@ -2,11 +2,7 @@ import unittest
 from collections import deque
 import subprocess
 from parser import Parser
-from call_evaluator import (
-    CommandSubstituitionVisitor,
-    CallTreeVisitor,
-    InvalidCommandSubstitution,
-)
+from call_evaluator import CallEvaluator, InvalidCommandSubstitution
 
 
 class TestCallEvaluator(unittest.TestCase):
@@ -46,45 +42,47 @@ class TestCallEvaluator(unittest.TestCase):
             print("error: failed to remove unittests directory")
             exit(1)
 
-    def _call_tree_visitor(self, cmd):
+    def _call_evaluator(self, cmd):
         call_tree = self.parser.call_level_parse(cmd)
 
-        call_tree_visitor = CallTreeVisitor()
-        call_tree_visitor.visit_topdown(call_tree)
+        call_evaluator = CallEvaluator()
+        call_evaluator.evaluate(call_tree)
 
         return (
-            call_tree_visitor.application,
-            call_tree_visitor.args,
-            call_tree_visitor.file_output,
+            call_evaluator.application,
+            call_evaluator.args,
+            call_evaluator.file_output,
         )
 
-    def test_call_visitor_with_single_quotes(self):
-        application, args, file_output = self._call_tree_visitor("echo 'foo'")
+    def test_call_evaluator_with_single_quotes(self):
+        application, args, file_output = self._call_evaluator("echo 'foo'")
 
         self.assertEqual(application, "echo")
         self.assertEqual(len(args), 1)
         self.assertEqual(args[0], "foo")
         self.assertEqual(file_output, None)
 
-    def test_call_visitor_with_double_quotes(self):
-        application, args, file_output = self._call_tree_visitor('echo "bar"')
+    def test_call_evaluator_with_double_quotes(self):
+        application, args, file_output = self._call_evaluator('echo "bar"')
 
         self.assertEqual(application, "echo")
         self.assertEqual(len(args), 1)
         self.assertEqual(args[0], "bar")
         self.assertEqual(file_output, None)
 
-    def test_call_visitor_with_back_quotes(self):
-        application, args, file_output = self._call_tree_visitor("echo `fizz`")
+    def test_call_evaluator_with_back_quotes(self):
+        application, args, file_output = self._call_evaluator(
+            "echo `echo fizz`"
+            )
 
         self.assertEqual(application, "echo")
         self.assertEqual(len(args), 1)
         self.assertEqual(args[0], "fizz")
         self.assertEqual(file_output, None)
 
-    def test_call_visitor_with_back_quotes_nested_in_double_quotes(self):
-        application, args, file_output = self._call_tree_visitor(
-            'echo "`fizz`"'
+    def test_call_evaluator_with_back_quotes_nested_in_double_quotes(self):
+        application, args, file_output = self._call_evaluator(
+            'echo "`echo fizz`"'
             )
 
         self.assertEqual(application, "echo")
@@ -92,8 +90,8 @@ class TestCallEvaluator(unittest.TestCase):
         self.assertEqual(args[0], "fizz")
         self.assertEqual(file_output, None)
 
-    def test_call_visitor_with_empty(self):
-        application, args, file_output = self._call_tree_visitor("echo ''")
+    def test_call_evaluator_with_empty(self):
+        application, args, file_output = self._call_evaluator("echo ''")
 
         self.assertEqual(application, "echo")
         self.assertEqual(len(args), 1)
@@ -101,7 +99,7 @@ class TestCallEvaluator(unittest.TestCase):
         self.assertEqual(file_output, None)
 
     def test_call_with_two_arguments_containing_no_quotes(self):
-        application, args, file_output = self._call_tree_visitor(
+        application, args, file_output = self._call_evaluator(
             "echo foo bar"
             )
 
@@ -112,7 +110,7 @@ class TestCallEvaluator(unittest.TestCase):
         self.assertEqual(file_output, None)
 
     def test_call_with_argument_containing_quotes_with_spaces(self):
-        application, args, file_output = self._call_tree_visitor(
+        application, args, file_output = self._call_evaluator(
             'echo "foo bar"'
             )
 
@@ -122,7 +120,7 @@ class TestCallEvaluator(unittest.TestCase):
         self.assertEqual(file_output, None)
 
     def test_call_with_argument_containing_quoted_and_unquoted_content(self):
-        application, args, file_output = self._call_tree_visitor('echo f"o"o')
+        application, args, file_output = self._call_evaluator('echo f"o"o')
 
         self.assertEqual(application, "echo")
         self.assertEqual(len(args), 1)
@@ -130,7 +128,7 @@ class TestCallEvaluator(unittest.TestCase):
         self.assertEqual(file_output, None)
 
     def test_call_with_argument_containing_quoted_asterisk(self):
-        application, args, file_output = self._call_tree_visitor(
+        application, args, file_output = self._call_evaluator(
             'echo "*.txt"'
             )
 
@@ -140,7 +138,7 @@ class TestCallEvaluator(unittest.TestCase):
         self.assertEqual(file_output, None)
 
     def test_argument_with_globbing(self):
-        application, args, file_output = self._call_tree_visitor(
+        application, args, file_output = self._call_evaluator(
             'echo unittests/*.txt'
             )
         self.assertEqual(application, "echo")
@@ -159,7 +157,7 @@ class TestCallEvaluator(unittest.TestCase):
         self.assertEqual(file_output, None)
 
     def test_argument_with_unquoted_asterisk_and_globbing_equal_to_false(self):
-        application, args, file_output = self._call_tree_visitor("echo *.lark")
+        application, args, file_output = self._call_evaluator("echo *.lark")
 
         self.assertEqual(application, "echo")
         self.assertEqual(len(args), 1)
@@ -167,7 +165,7 @@ class TestCallEvaluator(unittest.TestCase):
         self.assertEqual(file_output, None)
 
     def test_call_with_quoted_application(self):
-        application, args, file_output = self._call_tree_visitor('"echo" foo')
+        application, args, file_output = self._call_evaluator('"echo" foo')
 
         self.assertEqual(application, "echo")
         self.assertEqual(len(args), 1)
@@ -175,7 +173,7 @@ class TestCallEvaluator(unittest.TestCase):
         self.assertEqual(file_output, None)
 
     def test_call_with_part_quoted_and_unquoted_application(self):
-        application, args, file_output = self._call_tree_visitor("e'ch'o foo")
+        application, args, file_output = self._call_evaluator("e'ch'o foo")
 
         self.assertEqual(application, "echo")
         self.assertEqual(len(args), 1)
@@ -183,7 +181,7 @@ class TestCallEvaluator(unittest.TestCase):
         self.assertEqual(file_output, None)
 
     def test_call_with_prefix_redirection(self):
-        application, args, file_output = self._call_tree_visitor(
+        application, args, file_output = self._call_evaluator(
             "< file.txt echo"
             )
 
@@ -192,64 +190,99 @@ class TestCallEvaluator(unittest.TestCase):
         self.assertEqual(args[0], "file.txt")
         self.assertEqual(file_output, None)
 
+    def test_call_with_prefix_and_suffix_redirections(self):
+        application, args, file_output = self._call_evaluator(
+            "< a.txt cat b.txt > c.txt"
+            )
+
+        self.assertEqual(application, "cat")
+        self.assertListEqual(args, ["a.txt", "b.txt"])
+        self.assertEqual(file_output, "c.txt")
+
     def test_invalid_call(self):
         self.assertEqual(
             self.parser.call_level_parse("echo AAA >> file.txt"), False
             )
 
 
-class TestCommandSubstitutionVisitor(unittest.TestCase):
+class TestCommandSubstitution(unittest.TestCase):
 
     def setUp(self):
         self.parser = Parser()
-        self.out = deque()
 
-    def test_command_substitution_visitor(self):
-        call_tree = self.parser.call_level_parse("echo `echo foo`")
+    def _call_evaluator(self, cmd):
+        call_tree = self.parser.call_level_parse(cmd)
+        call_evaluator = CallEvaluator()
+        call_evaluator.evaluate(call_tree)
+        return call_evaluator
+
+    def test_command_substitution(self):
+        call_evaluator = self._call_evaluator("echo `echo foo`")
+
+        self.assertEqual(len(call_evaluator.args), 1)
+        self.assertEqual(call_evaluator.args[0], "foo")
+        self.assertEqual(call_evaluator.file_output, None)
 
-        command_substituition_visitor = CommandSubstituitionVisitor(self.out)
-        command_substituition_visitor.visit(call_tree)
+    def test_command_substitution_with_seq(self):
+        call_evaluator = self._call_evaluator("echo `echo foo; echo bar`")
 
-        call_tree_visitor = CallTreeVisitor()
-        call_tree_visitor.visit_topdown(call_tree)
+        self.assertListEqual(call_evaluator.args, ["foo bar"])
 
-        self.assertEqual(len(self.out), 0)
-        self.assertEqual(len(call_tree_visitor.args), 1)
-        self.assertEqual(call_tree_visitor.args[0], "foo")
-        self.assertEqual(call_tree_visitor.file_output, None)
+    def test_command_substitution_inside_argument(self):
+        call_evaluator = self._call_evaluator("echo a`echo b`c")
 
-    def test_command_substitution_visitor_with_invalid_command(self):
-        call_tree = self.parser.call_level_parse("echo `'''`")
+        self.assertListEqual(call_evaluator.args, ["abc"])
 
-        command_substituition_visitor = CommandSubstituitionVisitor(self.out)
+    def test_command_substitution_as_application(self):
+        call_evaluator = self._call_evaluator("`echo echo` foo")
+
+        self.assertEqual(call_evaluator.application, "echo")
+        self.assertListEqual(call_evaluator.args, ["foo"])
+
+    def test_command_substitution_does_not_change_call_tree(self):
+        call_tree = self.parser.call_level_parse("echo `echo foo`")
+        before = repr(call_tree)
+        CallEvaluator().evaluate(call_tree)
+        self.assertEqual(repr(call_tree), before)
+
+    def test_command_substitution_results_are_per_execution(self):
+        call_tree = self.parser.call_level_parse("echo `echo foo`")
+        first, second = CallEvaluator(), CallEvaluator()
+        first.evaluate(call_tree)
+        second.evaluate(call_tree)
+        self.assertListEqual(list(first.substitutions.values()), ["foo"])
+        self.assertIsNot(first.substitutions, second.substitutions)
+
+    def test_command_substitution_with_invalid_command(self):
+        call_tree = self.parser.call_level_parse("echo `\'\'\'`")
 
         self.assertRaises(
             InvalidCommandSubstitution,
-            command_substituition_visitor.visit,
+            CallEvaluator().evaluate,
             call_tree
         )
 
 
-class TestRedirectionVisitor(unittest.TestCase):
+class TestRedirection(unittest.TestCase):
 
     def setUp(self):
         self.parser = Parser()
         self.out = deque()
 
-    def _call_tree_visitor(self, cmd):
+    def _call_evaluator(self, cmd):
         call_tree = self.parser.call_level_parse(cmd)
 
-        call_tree_visitor = CallTreeVisitor()
-        call_tree_visitor.visit_topdown(call_tree)
+        call_evaluator = CallEvaluator()
+        call_evaluator.evaluate(call_tree)
 
         return (
-            call_tree_visitor.application,
-            call_tree_visitor.args,
-            call_tree_visitor.file_output,
+            call_evaluator.application,
+            call_evaluator.args,
+            call_evaluator.file_output,
         )
 
-    def test_redirection_visitor_input(self):
-        application, args, file_output = self._call_tree_visitor(
+    def test_redirection_input(self):
+        application, args, file_output = self._call_evaluator(
             "echo < file.txt"
             )
 
@@ -258,8 +291,8 @@ class TestRedirectionVisitor(unittest.TestCase):
         self.assertEqual(args[0], "file.txt")
         self.assertEqual(file_output, None)
 
-    def test_redirection_visitor_output(self):
-        application, args, file_output = self._call_tree_visitor(
+    def test_redirection_output(self):
+        application, args, file_output = self._call_evaluator(
             "echo foo > file.txt"
             )
 
@@ -268,8 +301,8 @@ class TestRedirectionVisitor(unittest.TestCase):
         self.assertEqual(args[0], "foo")
         self.assertEqual(file_output, "file.txt")
 
-    def test_redirection_visitor_with_single_quoted_file_name(self):
-        application, args, file_output = self._call_tree_visitor(
+    def test_redirection_with_single_quoted_file_name(self):
+        application, args, file_output = self._call_evaluator(
             "echo < 'file.txt'"
             )
 
@@ -278,8 +311,8 @@ class TestRedirectionVisitor(unittest.TestCase):
         self.assertEqual(args[0], "file.txt")
         self.assertEqual(file_output, None)
 
-    def test_redirection_visitor_with_double_quoted_file_name(self):
-        application, args, file_output = self._call_tree_visitor(
+    def test_redirection_with_double_quoted_file_name(self):
+        application, args, file_output = self._call_evaluator(
             'echo < "file.txt"'
             )
 
@@ -288,30 +321,30 @@ class TestRedirectionVisitor(unittest.TestCase):
         self.assertEqual(args[0], "file.txt")
         self.assertEqual(file_output, None)
 
-    def test_redirection_visitor_with_back_quoted_file_name(self):
-        application, args, file_output = self._call_tree_visitor(
+    def test_redirection_with_back_quoted_file_name(self):
+        application, args, file_output = self._call_evaluator(
             "echo < `echo file.txt`"
         )
 
         self.assertEqual(application, "echo")
         self.assertEqual(len(args), 1)
-        self.assertEqual(args[0], "echo file.txt")
+        self.assertEqual(args[0], "file.txt")
         self.assertEqual(file_output, None)
 
-    def test_redirection_visitor_with_nested_back_quoted_file_in_double_quotes(
+    def test_redirection_with_nested_back_quoted_file_in_double_quotes(
         self,
     ):
-        application, args, file_output = self._call_tree_visitor(
+        application, args, file_output = self._call_evaluator(
             'echo < "`echo file.txt`"'
         )
 
         self.assertEqual(application, "echo")
         self.assertEqual(len(args), 1)
-        self.assertEqual(args[0], "echo file.txt")
+        self.assertEqual(args[0], "file.txt")
         self.assertEqual(file_output, None)
 
-    def test_redirection_visitor_with_empty_quoted_file_name(self):
-        application, args, file_output = self._call_tree_visitor("echo < ''")
+    def test_redirection_with_empty_quoted_file_name(self):
+        application, args, file_output = self._call_evaluator("echo < ''")
 
         self.assertEqual(application, "echo")
         self.assertEqual(len(args), 1)
@@ -1,6 +1,6 @@
 import unittest
 from parser import Parser
-from command_evaluator import extract_raw_commands
+from command_evaluator import extract_commands
 from commands import Call, Pipe
 
 
@@ -10,7 +10,7 @@ class TestCommandEvaluator(unittest.TestCase):
 
     def _get_raw_commands(self, cmd):
         command_tree = self.parser.command_level_parse(cmd)
-        raw_commands = extract_raw_commands(command_tree)
+        raw_commands = extract_commands(command_tree)
         return raw_commands
 
     def test_pipe(self):
@@ -65,6 +65,26 @@ class TestCommandEvaluator(unittest.TestCase):
         self.assertEqual(type(raw_commands[0]), Call)
         self.assertEqual(raw_commands[0].raw_command, "`echo foo`")
 
+    def test_nested_pipe(self):
+        raw_commands = self._get_raw_commands("echo abc | cut -b 1 | cat")
+
+        self.assertEqual(len(raw_commands), 1)
+        self.assertEqual(type(raw_commands[0].lhs()), Pipe)
+        self.assertEqual(raw_commands[0].rhs().raw_command, "cat")
+
+    def test_seq(self):
+        raw_commands = self._get_raw_commands("echo foo; echo bar | cat")
+
+        self.assertEqual(len(raw_commands), 2)
+        self.assertEqual(type(raw_commands[0]), Call)
+        self.assertEqual(type(raw_commands[1]), Pipe)
+
+    def test_empty_calls_are_dropped(self):
+        raw_commands = self._get_raw_commands("; echo foo;")
+
+        self.assertEqual(len(raw_commands), 1)
+        self.assertEqual(raw_commands[0].raw_command, "echo foo")
+
     def test_call_with_no_quotes(self):
         raw_commands = self._get_raw_commands("echo bar")
 
@@ -53,6 +53,20 @@ class TestCommands(unittest.TestCase):
         self.assertEquals(len(self.out), 1)
         self.assertEquals(self.out.pop().strip(), "a")
 
+    def test_nested_pipe_is_flattened(self):
+        calls = [Call("echo abc"), Call("cut -b 1-"), Call("cut -b 1")]
+        pipe = Pipe(Pipe(calls[0], calls[1]), calls[2])
+        self.assertEqual(pipe.calls, tuple(calls))
+        self.assertEqual(list(iter(pipe).calls), calls)
+        self.assertEqual(pipe.lhs().calls, tuple(calls[:2]))
+        self.assertIs(pipe.rhs(), calls[2])
+
+    def test_long_pipe(self):
+        pipe = Pipe(Call("echo abc"), *(Call("cut -b 1-") for _ in range(99)))
+        pipe.eval(self.out)
+        self.assertEqual(len(pipe.calls), 100)
+        self.assertEquals(self.out.pop().strip(), "abc")
+
     def test_seq(self):
         seq = Seq([Call("echo foo"), Call("echo bar")])
         seq.eval(self.out)
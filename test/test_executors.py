@@ -0,0 +1,395 @@
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import unittest
+import subprocess
+from collections import deque
+from commands import Call, Pipe
+from exceptions import ApplicationExcecutionError
+import streams
+from executors import MAX_CHAIN, QUEUE_SIZE, stream, streaming, threaded
+from streams import BUFFER_SIZE, CHUNK_SIZE, FLUSH_INTERVAL, text
+from plan import compile_command_line
+from workers import ProcessPool, ProcessStage, offload
+
+
+class _Producer:
+
+    """a call producing numbered chunks, recording how many it made"""
+
+    def __init__(self, no_of_chunks, padding=0):
+        self.no_of_chunks = no_of_chunks
+        self.padding = padding
+        self.produced = 0
+
+    def stream(self, stdin=None, stderr=None):
+        for i in range(self.no_of_chunks):
+            self.produced += 1
+            yield f"{i:0{self.padding}}\n"
+
+
+class _Failing:
+
+    """a call failing after reading a chunk of its input"""
+
+    raw_command = "failing"
+
+    def stream(self, stdin=None, stderr=None):
+        next(stdin)
+        raise ValueError("failed")
+        yield
+
+
+class _Slow:
+
+    """a call passing its input on slowly, reading at most limit chunks"""
+
+    def __init__(self, delay, limit=None):
+        self.delay = delay
+        self.limit = limit
+        self.raw_command = f"slow {delay}"
+
+    def stream(self, stdin=None, stderr=None):
+        for i, chunk in enumerate(stdin):
+            if i == self.limit:
+                return
+            time.sleep(self.delay)
+            yield chunk
+
+
+def _characters_read():
+    """the characters this process has read so far, from /proc/self/io"""
+    with open("/proc/self/io") as f:
+        for line in f:
+            if line.startswith("rchar:"):
+                return int(line.split()[1])
+
+
+class TestExecutors(unittest.TestCase):
+
+    PIPES = [
+        "cat unittests/test1.txt unittests/test2.txt | grep 'A..'",
+        "cat unittests/test1.txt | sort | uniq",
+        "cat unittests/test1.txt | sort -r | uniq -i",
+        "cat unittests/test1.txt | cut -b 1,3",
+        "cat unittests/test1.txt | grep A | cut -b -2",
+        "echo unittests/test1.txt | cat",
+        "echo unittests/test1.txt | head",
+        "echo unittests/test1.txt | tail",
+        "find unittests -name '*.txt' | sort",
+        "find unittests -name 'test1*' | cat | uniq",
+        "echo abc | cut -b 1",
+        "cat unittests/test1.txt | grep DDD | sort",
+        "cat unittests/test1.txt | grep A | sort > unittests/out.txt",
+        "_cat unittests/missing.txt | _sort",
+        "cat unittests/test1.txt | head -n 2",
+        "cat unittests/test1.txt | grep -m 2 A | uniq",
+    ]
+
+    @classmethod
+    def prepare(cls, cmdline):
+        args = [
+            "/bin/bash",
+            "-c",
+            cmdline,
+        ]
+        p = subprocess.run(args, capture_output=True)
+        return p.stdout.decode()
+
+    def setUp(self):
+        p = subprocess.run(["mkdir", "unittests"], stdout=subprocess.DEVNULL)
+        if p.returncode != 0:
+            print("error: failed to create unittest directory")
+            exit(1)
+        filesystem_setup = ";".join(
+            [
+                "cd unittests",
+                "printf 'AAA\\nBBB\\nAAA\\naaa\\nABC' > test1.txt",
+                "printf 'abcde\\nfghij\\n\\nklm\\n' > test2.txt",
+            ]
+        )
+        self.prepare(filesystem_setup)
+        self.out = deque()
+
+    def tearDown(self):
+        p = subprocess.run(
+            ["rm", "-r", "unittests"], stdout=subprocess.DEVNULL
+            )
+        if p.returncode != 0:
+            print("error: failed to remove unittests directory")
+            exit(1)
+
+    def _run(self, cmdline, mode):
+        out = deque()
+        try:
+            for command in compile_command_line(cmdline).commands:
+                if type(command) is Pipe:
+                    command = Pipe(*command.calls, mode=mode)
+                command.eval(out)
+        except Exception as e:
+            out.append(type(e).__name__)
+        return "".join(out), self.prepare("cat unittests/out.txt")
+
+    def test_streaming_is_equivalent_to_sequential(self):
+        for cmdline in self.PIPES:
+            with self.subTest(cmdline=cmdline):
+                self.assertEqual(
+                    self._run(cmdline, "streaming"),
+                    self._run(cmdline, "sequential"),
+                )
+
+    def test_threaded_is_equivalent_to_sequential(self):
+        for cmdline in self.PIPES:
+            with self.subTest(cmdline=cmdline):
+                self.assertEqual(
+                    self._run(cmdline, "threaded"),
+                    self._run(cmdline, "sequential"),
+                )
+
+    def test_record_pipes_are_equivalent_to_sequential(self):
+        rng = random.Random(13)
+        alphabet = ["a", "b", "A", "\n", "\n", "\x0c", "\u2028"]
+        pipes = [
+            "cat unittests/r.txt | grep a | sort | uniq | cut -b 1-2",
+            "cat unittests/r.txt | sort | uniq -i | head -n 3",
+            "cat unittests/r.txt | sort -r | grep -m 2 'a*'",
+            "sort unittests/r.txt | uniq | grep 'b*' > unittests/out.txt",
+            "grep 'a*' unittests/r.txt | sort | head -n 2",
+            "uniq unittests/r.txt | sort | cut -b 1-3",
+        ]
+        for _ in range(30):
+            content = "".join(rng.choices(alphabet, k=rng.randint(0, 30)))
+            with open("unittests/r.txt", "w") as f:
+                f.write(content)
+            for cmdline in pipes:
+                with self.subTest(content=content, cmdline=cmdline):
+                    expected = self._run(cmdline, "sequential")
+                    self.assertEqual(self._run(cmdline, "streaming"), expected)
+                    self.assertEqual(self._run(cmdline, "threaded"), expected)
+
+    def _peak_memory(self, cmdline, mode):
+        tracemalloc.start()
+        try:
+            output = self._run(cmdline, mode)[0]
+            return tracemalloc.get_traced_memory()[1], output
+        finally:
+            tracemalloc.stop()
+
+    def test_spilled_pipes_stay_within_memory_budget(self):
+        threshold = 256 * 1024
+        lines = 10 * threshold // 32
+        with open("unittests/big.txt", "w") as f:
+            for i in range(lines):
+                f.write(f"{i * 7919 % lines:031}\n")
+        spool_threshold = streams.SPOOL_THRESHOLD
+        streams.SPOOL_THRESHOLD = threshold
+        cmdline = "cat unittests/big.txt | sort | uniq | head -n 2"
+        try:
+            for mode in "sequential", "streaming":
+                with self.subTest(mode=mode):
+                    peak, output = self._peak_memory(cmdline, mode)
+                    self.assertLess(peak, 10 * threshold)
+                    self.assertEqual(output, f"{0:031}\n{1:031}\n")
+        finally:
+            streams.SPOOL_THRESHOLD = spool_threshold
+
+    def test_processes_is_equivalent_to_sequential(self):
+        for cmdline in self.PIPES:
+            with self.subTest(cmdline=cmdline):
+                self.assertEqual(
+                    self._run(cmdline, "processes"),
+                    self._run(cmdline, "sequential"),
+                )
+
+    def test_processes_raises_worker_errors(self):
+        pipe = compile_command_line("cat unittests/test1.txt | grep")
+        self.assertRaises(
+            ApplicationExcecutionError,
+            Pipe(*pipe.commands[0].calls, mode="processes").eval,
+            self.out,
+        )
+
+    def test_processes_run_in_working_directory(self):
+        pipe = compile_command_line("echo x | sort test1.txt")
+        os.chdir("unittests")
+        try:
+            Pipe(*pipe.commands[0].calls, mode="processes").eval(self.out)
+        finally:
+            os.chdir("..")
+        self.assertEqual("".join(self.out), "AAA\nAAA\nABCBBB\naaa\n")
+
+    def test_offload_cpu_bound_calls(self):
+        cancelled = threading.Event()
+        pipe = compile_command_line("cat a | _sort | cut -b 1 | head")
+        stages = [
+            offload(call, None, cancelled)
+            for call in pipe.commands[0].calls
+        ]
+        self.assertListEqual(
+            [type(stage) is ProcessStage for stage in stages],
+            [False, True, True, False],
+        )
+        call = Call("sort")
+        self.assertIs(offload(call, None, cancelled), call)
+
+    def test_pool_reuses_workers(self):
+        pool = ProcessPool(1)
+        try:
+            worker = pool.acquire()
+            pool.release(worker)
+            self.assertIs(pool.acquire(), worker)
+            extra = pool.acquire()
+            self.assertIsNot(extra, worker)
+            pool.release(worker)
+            pool.release(extra)
+            self.assertListEqual(pool.idle, [worker])
+            self.assertFalse(extra.process.is_alive())
+        finally:
+            pool.shutdown()
+
+    def test_process_stage_is_killed_when_closed(self):
+        pool = ProcessPool(1)
+        try:
+            call = compile_command_line("sort unittests/test1.txt")
+            stage = ProcessStage(
+                call.commands[0], pool, threading.Event()
+            )
+            chunks = stage.stream()
+            # empty chunks are yielded while the worker starts
+            first = next(chunk for chunk in chunks if chunk)
+            self.assertTrue(first.startswith("AAA\n"))
+            chunks.close()
+            self.assertListEqual(pool.idle, [])
+            self.assertEqual(
+                "".join(text(stage.stream())), "AAA\nAAA\nABCBBB\naaa\n"
+            )
+            self.assertEqual(len(pool.idle), 1)
+        finally:
+            pool.shutdown()
+
+    def test_threaded_drops_unread_output(self):
+        Pipe(
+            Call("echo foo > unittests/out.txt"),
+            Call("_foo"),
+            mode="threaded",
+        ).eval(self.out)
+        self.assertEqual("".join(self.out), "Unsupported Application: foo\n")
+        self.assertEqual(self.prepare("cat unittests/out.txt"), "foo\n")
+
+    def test_threaded_backpressure(self):
+        # chunks of BUFFER_SIZE characters are queued one at a time
+        producer = _Producer(10 ** 6, padding=BUFFER_SIZE)
+        threaded([producer, _Slow(0, limit=5)], self.out)
+        self.assertEqual(len(self.out), 5)
+        # the producer stops once its queue is full and the consumer is done
+        self.assertLessEqual(producer.produced, 5 + QUEUE_SIZE + 2)
+
+    def test_threaded_error_cancels_pipe(self):
+        threads = threading.active_count()
+        producer = _Producer(10 ** 6)
+        with self.assertRaises(ValueError):
+            threaded([producer, _Failing(), Call("uniq")], self.out)
+        self.assertLess(producer.produced, 10 ** 6)
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_threaded_stages_flush_slow_output(self):
+        # chunks output slower than FLUSH_INTERVAL are queued in pairs
+        producer = _Producer(6)
+        stats = threaded([producer, _Slow(FLUSH_INTERVAL)], self.out)
+        self.assertEqual(stats.stages[0].buffers, 1)
+        self.assertEqual(stats.stages[1].buffers, 3)
+
+    def test_threaded_stats(self):
+        stats = threaded(
+            [_Producer(50), _Slow(0.002), Call("uniq")], self.out
+        )
+        self.assertEqual(len(stats.stages), 3)
+        self.assertEqual("".join(self.out).count("\n"), 50)
+        self.assertLessEqual(stats.stages[0].max_depth, QUEUE_SIZE)
+        self.assertIs(stats.bottleneck(), stats.stages[1])
+        self.assertGreater(stats.stages[2].input_wait, 0)
+        self.assertIn("slow", str(stats))
+
+    def test_streaming_drops_unread_output(self):
+        pipe = Pipe(Call("echo foo"), Call("_foo"), mode="streaming")
+        pipe.eval(self.out)
+        self.assertEqual("".join(self.out), "Unsupported Application: foo\n")
+
+    def test_stream_is_lazy(self):
+        producer = _Producer(1000)
+        chunks = stream([producer, Call("uniq")])
+        self.assertEqual(next(chunks), "0\n")
+        self.assertLess(producer.produced, 1000)
+        self.assertEqual(len(list(chunks)), 999)
+        self.assertEqual(producer.produced, 1000)
+
+    def test_stream_runs_in_bounded_chunks(self):
+        self.prepare("seq 200000 > unittests/big.txt")
+        calls = compile_command_line(
+            "cat unittests/big.txt | grep 1 | cut -b 1-3"
+        ).commands[0].calls
+        chunks = list(stream(calls))
+        self.assertGreater(len(chunks), 1)
+        self.assertLessEqual(max(map(len, chunks)), CHUNK_SIZE)
+
+    def test_long_streaming_pipe(self):
+        pipe = compile_command_line("echo a" + " | uniq" * 2000).commands[0]
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(200)
+        try:
+            Pipe(*pipe.calls, mode="streaming").eval(self.out)
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+        self.assertEqual("".join(self.out), "a\n")
+
+    def test_long_streaming_pipe_stops_upstream(self):
+        producer = _Producer(1000000)
+        uniqs = [Call("uniq")] * (MAX_CHAIN * 3)
+        streaming([producer, *uniqs, Call("head -n 1")], self.out)
+        self.assertEqual("".join(self.out), "0\n")
+        self.assertLess(producer.produced, 1000000)
+
+    def test_unread_upstream_still_runs(self):
+        Pipe(
+            Call("echo foo > unittests/out.txt"),
+            Call("cat unittests/test2.txt"),
+            mode="streaming",
+        ).eval(self.out)
+        self.assertEqual(self.prepare("cat unittests/out.txt"), "foo\n")
+
+    @unittest.skipUnless(os.path.exists("/proc/self/io"), "needs procfs")
+    def test_consumers_stop_upstream_io(self):
+        self.prepare(
+            "yes 0123456789abcdef | head -c 32000000 > unittests/big.txt"
+        )
+        cmdlines = [
+            "cat unittests/big.txt | head -n 2",
+            "cat unittests/big.txt | grep -m 2 0123 | cut -b 1-4",
+        ]
+        for cmdline in cmdlines:
+            for mode in ("streaming", "threaded", "processes"):
+                with self.subTest(cmdline=cmdline, mode=mode):
+                    start = _characters_read()
+                    out = deque()
+                    pipe = compile_command_line(cmdline).commands[0]
+                    Pipe(*pipe.calls, mode=mode).eval(out)
+                    self.assertEqual(len("".join(out).split()), 2)
+                    self.assertLess(_characters_read() - start, 4000000)
+
+    def test_errors_bypass_next_stage(self):
+        for mode in ("sequential", "streaming", "threaded", "processes"):
+            with self.subTest(mode=mode):
+                self.assertEqual(
+                    self._run("_cat unittests/missing.txt | grep O", mode)[0],
+                    "OS Error: _cat unittests/missing.txt\n",
+                )
+
+    def test_unknown_mode(self):
+        self.assertRaises(ValueError, Pipe, Call("a"), Call("b"), mode="x")
+
+
+if __name__ == "__main__":
+    unittest.main()
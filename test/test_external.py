@@ -0,0 +1,145 @@
+import unittest
+from collections import deque
+import subprocess
+from applications import UnsafeDecorator, resolve_application
+from commands import Pipe
+from external import External, ProgramPipe, connect, find_program
+from plan import compile_command_line
+
+
+class TestExternal(unittest.TestCase):
+
+    @classmethod
+    def prepare(cls, cmdline):
+        args = [
+            "/bin/bash",
+            "-c",
+            cmdline,
+        ]
+        p = subprocess.run(args, capture_output=True)
+        return p.stdout.decode()
+
+    def setUp(self):
+        p = subprocess.run(["mkdir", "unittests"], stdout=subprocess.DEVNULL)
+        if p.returncode != 0:
+            print("error: failed to create unittest directory")
+            exit(1)
+        filesystem_setup = ";".join(
+            [
+                "cd unittests",
+                "printf 'AAA\\nBBB\\nAAA\\naaa\\nABC\\n' > test1.txt",
+            ]
+        )
+        self.prepare(filesystem_setup)
+        self.out = deque()
+
+    def tearDown(self):
+        p = subprocess.run(
+            ["rm", "-r", "unittests"], stdout=subprocess.DEVNULL
+            )
+        if p.returncode != 0:
+            print("error: failed to remove unittests directory")
+            exit(1)
+
+    def _run(self, cmdline, mode):
+        out = deque()
+        for command in compile_command_line(cmdline).commands:
+            if type(command) is Pipe:
+                command = Pipe(*command.calls, mode=mode)
+            command.eval(out)
+        return "".join(out)
+
+    def test_find_program(self):
+        self.assertTrue(find_program("tr").endswith("/tr"))
+        self.assertIsNone(find_program("nonexistent-program"))
+
+    def test_resolve_program(self):
+        self.assertEqual(type(resolve_application("tr", None)), External)
+        self.assertEqual(
+            type(resolve_application("_tr", None)), UnsafeDecorator
+        )
+        self.assertRaises(
+            KeyError, resolve_application, "nonexistent-program", None
+        )
+
+    def test_program(self):
+        External("tr").exec(["a-c", "A-C"], self.out, False)
+        self.assertEqual(self.out.pop(), "")
+
+    def test_program_in_pipe(self):
+        self.out.append("abc\n")
+        External("tr").exec(["a-c", "A-C"], self.out, True)
+        self.assertEqual(self.out.pop(), "ABC\n")
+
+    def test_mixed_pipe(self):
+        cmdline = "cat unittests/test1.txt | tr A Z | sort | uniq"
+        expected = self.prepare(cmdline)
+        for mode in ["sequential", "streaming", "threaded", "processes"]:
+            with self.subTest(mode=mode):
+                self.assertEqual(self._run(cmdline, mode), expected)
+
+    def test_large_pipe(self):
+        cmdline = "seq 200000 | tr 1 x | uniq | tr x 1 | wc -c"
+        expected = self.prepare(cmdline)
+        for mode in ["sequential", "streaming", "threaded"]:
+            with self.subTest(mode=mode):
+                self.assertEqual(self._run(cmdline, mode), expected)
+
+    def test_endless_program_stops(self):
+        for mode in ["streaming", "threaded"]:
+            with self.subTest(mode=mode):
+                self.assertEqual(
+                    self._run("yes | head -n 2", mode), "y\ny\n"
+                )
+
+    def test_connect(self):
+        calls = compile_command_line(
+            "cat unittests/test1.txt | tr A Z | tr Z Y | sort | tr B C"
+        ).commands[0].calls
+        stages = connect(calls)
+        self.assertEqual(len(stages), 4)
+        self.assertIs(stages[0], calls[0])
+        self.assertEqual(type(stages[1]), ProgramPipe)
+        self.assertEqual(stages[1].calls, calls[1:3])
+        self.assertIs(stages[3], calls[4])
+
+    def test_connected_programs(self):
+        cmdline = "cat unittests/test1.txt | tr A Z | tr Z Y | tr B C | sort"
+        expected = self.prepare(cmdline)
+        for mode in ["sequential", "streaming", "threaded", "processes"]:
+            with self.subTest(mode=mode):
+                self.assertEqual(self._run(cmdline, mode), expected)
+
+    def test_connected_programs_output_to_file(self):
+        cmdline = "seq 3 | tr 1 x > unittests/out.txt | wc -l"
+        for mode in ["sequential", "streaming", "threaded"]:
+            with self.subTest(mode=mode):
+                self.assertEqual(self._run(cmdline, mode).strip(), "0")
+                self.assertEqual(
+                    self.prepare("cat unittests/out.txt"), "x\n2\n3\n"
+                )
+
+    def test_connected_endless_programs_stop(self):
+        for mode in ["streaming", "threaded"]:
+            with self.subTest(mode=mode):
+                self.assertEqual(
+                    self._run("yes | tr y z | head -n 2", mode), "z\nz\n"
+                )
+
+    def test_program_removed_from_path(self):
+        application = External("nonexistent-program")
+        self.assertRaises(
+            FileNotFoundError, application.exec, [], self.out, False
+        )
+
+    def test_unsafe_program_removed_from_path(self):
+        application = UnsafeDecorator(
+            External("nonexistent-program"),
+            compile_command_line("_nonexistent-program").commands[0],
+        )
+        application.exec([], self.out, False)
+        self.assertIn("nonexistent-program", self.out.pop())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import random
+import unittest
+from parser import Parser
+from fast_path import parse_simple_call, parse_simple_command_line
+
+
+class TestFastPath(unittest.TestCase):
+    def test_simple_call(self):
+        call_tree = parse_simple_call("grep foo logs/app.log > out")
+        self.assertEqual(call_tree.raw, "grep foo logs/app.log > out")
+
+    def test_empty_call(self):
+        self.assertIsNone(parse_simple_call(" \t"))
+
+    def test_quoted_call_is_not_simple(self):
+        self.assertFalse(parse_simple_call("echo 'foo'"))
+        self.assertFalse(parse_simple_call('echo "foo"'))
+        self.assertFalse(parse_simple_call("echo `foo`"))
+
+    def test_invalid_call(self):
+        for call in ["echo AAA >> file", "echo foo>x", "> file", "cat <"]:
+            with self.subTest(call=call):
+                self.assertFalse(parse_simple_call(call))
+
+    def test_separators_are_not_a_call(self):
+        self.assertFalse(parse_simple_call("a; b"))
+        self.assertFalse(parse_simple_call("a | b"))
+
+    def test_simple_command_line(self):
+        command_tree = parse_simple_command_line("a | b; c")
+        self.assertEqual(len(command_tree.commands), 2)
+
+    def test_empty_call_in_pipe(self):
+        for cmdline in ["| a", "a |", "a | | b", "a |  ; b"]:
+            with self.subTest(cmdline=cmdline):
+                self.assertFalse(parse_simple_command_line(cmdline))
+
+
+class TestFastPathEquivalence(unittest.TestCase):
+    """
+    the fast path must build exactly the tree the full grammar builds,
+    checked on random command lines.
+    """
+
+    ALPHABET = ["a", "b", "-n", "*", ".txt", " ", "  ", "\t", ";", "|",
+                "<", ">", "'", '"', "`"]
+    SAMPLES = 3000
+
+    @classmethod
+    def setUpClass(cls):
+        cls.lark_parser = Parser(fast_path=False, cache_size=0)
+        cls.random = random.Random(10)
+
+    def _cmdline(self):
+        length = self.random.randint(0, 12)
+        return "".join(self.random.choices(self.ALPHABET, k=length))
+
+    def _assert_equivalent(self, fast_parse, lark_parse):
+        simple = 0
+        for _ in range(self.SAMPLES):
+            cmdline = self._cmdline()
+            tree = fast_parse(cmdline)
+            if tree is False:
+                continue
+            simple += 1
+            with self.subTest(cmdline=cmdline):
+                self.assertEqual(tree, lark_parse(cmdline))
+        self.assertGreater(simple, self.SAMPLES // 10)
+
+    def test_command_lines_are_equivalent(self):
+        self._assert_equivalent(
+            parse_simple_command_line, self.lark_parser.command_level_parse
+        )
+
+    def test_calls_are_equivalent(self):
+        self._assert_equivalent(
+            parse_simple_call, self.lark_parser.call_level_parse
+        )
+
+    def test_parser_with_fast_path_is_equivalent(self):
+        parser = Parser(cache_size=0)
+        for _ in range(self.SAMPLES):
+            cmdline = self._cmdline()
+            with self.subTest(cmdline=cmdline):
+                self.assertEqual(
+                    parser.command_level_parse(cmdline),
+                    self.lark_parser.command_level_parse(cmdline),
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,233 @@
+import errno
+import os
+import threading
+import time
+import unittest
+import subprocess
+import file_source
+from file_source import FileSource, last_lines_start
+from streams import CHUNK_SIZE, Lines
+
+
+class TestFileSource(unittest.TestCase):
+    @classmethod
+    def prepare(cls, cmdline):
+        args = [
+            "/bin/bash",
+            "-c",
+            cmdline,
+        ]
+        p = subprocess.run(args, capture_output=True)
+        return p.stdout.decode()
+
+    def setUp(self):
+        p = subprocess.run(["mkdir", "unittests"], stdout=subprocess.DEVNULL)
+        if p.returncode != 0:
+            print("error: failed to create unittest directory")
+            exit(1)
+        filesystem_setup = ";".join(
+            [
+                "cd unittests",
+                "printf 'AAA\\nBBB\\r\\nCCC\\rDDD' > small.txt",
+                "seq 100000 > large.txt",
+                "touch empty.txt",
+            ]
+        )
+        self.prepare(filesystem_setup)
+
+    def tearDown(self):
+        p = subprocess.run(
+            ["rm", "-r", "unittests"], stdout=subprocess.DEVNULL
+            )
+        if p.returncode != 0:
+            print("error: failed to remove unittests directory")
+            exit(1)
+
+    def _read(self, file_name):
+        with open(file_name) as f:
+            return f.read()
+
+    def test_last_lines_start(self):
+        for text in [
+            "", "\n", "a", "a\n", "a\nb", "a\nb\n", "a\r\nb\r\n",
+            "a\rb\r", "a\r\rb\n\n", "\n\na\r\n\rb", "a\r\n\nb",
+        ]:
+            buffer = text.encode()
+            lines = text.splitlines(keepends=True)
+            for n in range(len(lines) + 2):
+                with self.subTest(text=text, n=n):
+                    self.assertEqual(
+                        text[last_lines_start(buffer, n):],
+                        "".join(lines[max(len(lines) - n, 0):]),
+                    )
+
+    def test_small_file_is_read_at_once(self):
+        with FileSource("unittests/small.txt") as source:
+            chunks = list(source.chunks())
+        self.assertEqual(chunks, ["AAA\nBBB\nCCC\nDDD"])
+
+    def test_large_file_is_read_in_chunks(self):
+        with FileSource("unittests/large.txt") as source:
+            chunks = list(source.chunks())
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= CHUNK_SIZE for chunk in chunks))
+        self.assertEqual("".join(chunks), self._read("unittests/large.txt"))
+
+    def test_empty_file(self):
+        with FileSource("unittests/empty.txt") as source:
+            self.assertEqual(list(source.chunks()), [])
+            self.assertEqual(source.last_lines(10), "")
+
+    def test_byte_chunks_are_not_translated(self):
+        with FileSource("unittests/small.txt") as source:
+            self.assertEqual(
+                list(source.byte_chunks()), [b"AAA\nBBB\r\nCCC\rDDD"]
+            )
+        with FileSource("unittests/large.txt") as source:
+            batches = list(source.byte_line_batches())
+        self.assertEqual(sum(map(len, batches)), 100000)
+        self.assertEqual(batches[-1][-1], b"100000\n")
+
+    def _copied(self, file_name):
+        with FileSource(file_name) as source:
+            with open("unittests/copy.txt", "wb") as f:
+                source.copy_to(f.fileno())
+        with open("unittests/copy.txt", "rb") as f:
+            return f.read()
+
+    def test_copy_to(self):
+        self.assertEqual(
+            self._copied("unittests/small.txt"), b"AAA\nBBB\r\nCCC\rDDD"
+        )
+        read, write = os.pipe()
+        with FileSource("unittests/small.txt") as source:
+            source.copy_to(write)
+        os.close(write)
+        with open(read, "rb") as f:
+            self.assertEqual(f.read(), b"AAA\nBBB\r\nCCC\rDDD")
+
+    def test_copy_without_kernel_copies(self):
+        def not_copyable(source, fd):
+            raise OSError(errno.EXDEV, "not copyable")
+
+        copies = file_source._copy_file_range, file_source._sendfile
+        file_source._copy_file_range = file_source._sendfile = not_copyable
+        try:
+            with open("unittests/large.txt", "rb") as f:
+                self.assertEqual(self._copied("unittests/large.txt"), f.read())
+        finally:
+            file_source._copy_file_range, file_source._sendfile = copies
+
+    def test_line_batches(self):
+        with FileSource("unittests/large.txt") as source:
+            batches = list(source.line_batches())
+        self.assertTrue(all(type(batch) is Lines for batch in batches))
+        self.assertEqual(sum(map(len, batches)), 100000)
+
+    def test_last_lines(self):
+        with FileSource("unittests/large.txt") as source:
+            self.assertEqual(source.last_lines(2), "99999\n100000\n")
+            self.assertIsNotNone(source.map)
+        with FileSource("unittests/small.txt") as source:
+            self.assertEqual(source.last_lines(2), "CCC\nDDD")
+
+    def test_last_lines_of_a_stream(self):
+        with FileSource("/dev/null") as source:
+            self.assertFalse(source.regular)
+            self.assertEqual(source.last_lines(2), "")
+        read, write = os.pipe()
+        os.write(write, b"a\nb\nc\n")
+        os.close(write)
+        with FileSource(f"/dev/fd/{read}") as source:
+            self.assertFalse(source.regular)
+            self.assertEqual(source.last_lines(2), "b\nc\n")
+            self.assertIsNone(source.map)
+        os.close(read)
+
+    def test_last_bytes(self):
+        with FileSource("unittests/large.txt") as source:
+            self.assertEqual(source.last_bytes(9), b"9\n100000\n")
+        with FileSource("unittests/small.txt") as source:
+            self.assertEqual(source.last_bytes(0), b"")
+            self.assertEqual(source.last_bytes(100), b"AAA\nBBB\r\nCCC\rDDD")
+
+    def test_last_bytes_of_a_stream(self):
+        with open("unittests/large.txt", "rb") as f:
+            data = f.read()
+        for n in (1, 7, len(data), len(data) + 1):
+            with self.subTest(n=n), subprocess.Popen(
+                ["cat", "unittests/large.txt"], stdout=subprocess.PIPE
+            ) as p:
+                with FileSource(f"/dev/fd/{p.stdout.fileno()}") as source:
+                    self.assertFalse(source.regular)
+                    self.assertEqual(source.last_bytes(n), data[-n:])
+
+    def _follow(self, by_name=False):
+        source = FileSource("unittests/small.txt")
+        source.last_lines(1)
+        return source, source.follow(by_name, interval=0.01)
+
+    def test_follow(self):
+        source, chunks = self._follow()
+        with source:
+            self.assertEqual(next(chunks), b"")
+            with open("unittests/small.txt", "a") as f:
+                f.write("EEE\n")
+            self.assertEqual(next(chunks), b"EEE\n")
+            self.assertEqual(next(chunks), b"")
+            with open("unittests/small.txt", "w") as f:
+                f.write("FFF\n")
+            self.assertEqual(next(chunks), b"FFF\n")
+            chunks.close()
+
+    def test_follow_wakes_up_on_writes(self):
+        source = FileSource("unittests/small.txt")
+        source.last_lines(1)
+        chunks = source.follow(interval=60)
+        with source:
+            self.assertEqual(next(chunks), b"")
+            threading.Timer(0.1, lambda: self.prepare(
+                "echo EEE >> unittests/small.txt"
+            )).start()
+            start = time.monotonic()
+            self.assertEqual(next(c for c in chunks if c), b"EEE\n")
+            self.assertLess(time.monotonic() - start, 30)
+            chunks.close()
+
+    def test_follow_by_name(self):
+        source, chunks = self._follow(by_name=True)
+        with source:
+            self.assertEqual(next(chunks), b"")
+            self.prepare(
+                "cd unittests; echo EEE >> small.txt; mv small.txt old.txt;"
+                "echo FFF > small.txt"
+            )
+            self.assertEqual(next(chunks), b"EEE\n")
+            self.assertEqual(next(chunks), b"FFF\n")
+            chunks.close()
+
+    def test_follow_without_inotify(self):
+        def no_inotify(path, by_name):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+
+        inotify = file_source._Inotify
+        file_source._Inotify = no_inotify
+        try:
+            self.test_follow_by_name()
+        finally:
+            file_source._Inotify = inotify
+
+    def test_small_file_threshold(self):
+        small_file = file_source.SMALL_FILE
+        file_source.SMALL_FILE = 0
+        try:
+            with FileSource("unittests/small.txt") as source:
+                self.assertEqual(
+                    "".join(source.chunks()), "AAA\nBBB\nCCC\nDDD"
+                )
+        finally:
+            file_source.SMALL_FILE = small_file
+
+
+if __name__ == "__main__":
+    unittest.main()
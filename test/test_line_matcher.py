@@ -0,0 +1,83 @@
+import re
+import unittest
+from line_matcher import LineMatcher, line_matcher
+from streams import Lines
+
+PATTERNS = [
+    "", "A", "AB", "B", "x", ".*B", "A.C", "[AB]+", "[^A]", "[^A\\n]",
+    "\\w+", "\\s", "\\S+ B", ".*\\sC", "A$", "^B", "\\AA", "B\\Z", "\\bB",
+    "A(?=B)", "A(?!B)", "(?<=A)B", "(?<!\\n)A", "(A|C)B", "A|B", "(?i)ab",
+    "(?s)A.", "A\\n", "(a)(?i:b)", "(.)\\1", "A.*?C", "[\\D]", "x*",
+]
+TEXTS = [
+    "", "A\n", "AB\nBA\nABC\n", "A C\nB\n\nC A\nAA\n", "ab\nAB\nb\n",
+    "BA\nA B\nABC", "A\r\nB\rC\n",
+]
+
+
+def _lines(text):
+    """the lines of text ending with \\n, as readline_batches splits them"""
+    return Lines(re.findall("[^\n]*\n|[^\n]+$", text))
+
+
+def _reference(pattern, lines):
+    match = re.compile(pattern).match
+    return [
+        line for line in lines
+        if match(line, 0, len(line) - 1 if line.endswith("\n") else len(line))
+    ]
+
+
+class TestLineMatcher(unittest.TestCase):
+    def test_lines_match_as_each_line_does(self):
+        for pattern in PATTERNS:
+            matcher = LineMatcher(pattern)
+            byte_matcher = LineMatcher(pattern.encode())
+            for text in TEXTS:
+                lines = _lines(text)
+                with self.subTest(pattern=pattern, text=text):
+                    self.assertEqual(
+                        matcher.lines(lines), _reference(pattern, lines)
+                    )
+                    self.assertEqual(
+                        byte_matcher.lines([
+                            line.encode() for line in lines
+                        ]),
+                        [
+                            line.encode()
+                            for line in _reference(pattern, lines)
+                        ],
+                    )
+
+    def test_matching_lines_are_passed_on_as_they_are(self):
+        lines = ["AB\n", "BA\n", "AAB\n"]
+        for pattern in ["A", ".*B", "[A]+B"]:
+            with self.subTest(pattern=pattern):
+                matches = LineMatcher(pattern).lines(lines)
+                self.assertTrue(
+                    all(any(m is line for line in lines) for m in matches)
+                )
+
+    def test_lines_of_several_newlines_are_matched_each(self):
+        self.assertEqual(
+            LineMatcher("A").lines(["A\nB\n", "A"]), ["A\nB\n", "A"]
+        )
+
+    def test_ways_of_matching(self):
+        for pattern, matching in [
+            ("ERROR", "_starting_lines"),
+            (".*ERROR", "_literal_lines"),
+            ("[0-9]+ ms", "_literal_lines"),
+            ("[A-Z]+", "_each_line"),
+            ("(?i)error", "_each_line"),
+            (".*\\s", "_each_line"),
+            ("\\A[AB]", "_each_line"),
+        ]:
+            with self.subTest(pattern=pattern):
+                self.assertEqual(
+                    line_matcher(pattern).matching.__name__, matching
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
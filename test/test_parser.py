@@ -0,0 +1,197 @@
+import os
+import shutil
+import tempfile
+import unittest
+from parser import Parser, get_parser
+from syntax_tree import Argument, Call, Pipe, Redirection, Seq
+
+
+class TestParser(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.parser = Parser(cache_dir=self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_get_parser_is_shared(self):
+        self.assertIs(get_parser(), get_parser())
+
+    def test_cache_file_depends_on_grammar(self):
+        options = {"start": "call"}
+        self.assertNotEqual(
+            self.parser._cache_file("call", "call: A", options),
+            self.parser._cache_file("call", "call: B", options),
+        )
+
+    def test_cache_file_depends_on_options(self):
+        self.assertNotEqual(
+            self.parser._cache_file("call", "call: A", {"parser": "lalr"}),
+            self.parser._cache_file("call", "call: A", {}),
+        )
+
+    def test_load_cached_missing_file(self):
+        cache_file = os.path.join(self.cache_dir, "missing.lark")
+        self.assertIsNone(self.parser._load_cached(cache_file))
+
+    def test_load_cached_corrupt_file(self):
+        cache_file = os.path.join(self.cache_dir, "corrupt.lark")
+        with open(cache_file, "wb") as f:
+            f.write(b"not a parser")
+        self.assertIsNone(self.parser._load_cached(cache_file))
+
+    def test_lalr_parsers_are_cached(self):
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_lalr_parsers_load_from_cache(self):
+        cached = Parser(cache_dir=self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        self.assertEqual(
+            cached.command_level_parse("echo foo | cat"),
+            self.parser.command_level_parse("echo foo | cat"),
+        )
+
+    def test_earley_parsers_are_not_cached(self):
+        cache_dir = tempfile.mkdtemp()
+        Parser(engine="earley", cache_dir=cache_dir)
+        self.assertListEqual(os.listdir(cache_dir), [])
+        shutil.rmtree(cache_dir)
+
+    def test_unknown_engine(self):
+        self.assertRaises(ValueError, Parser, "cyk")
+
+    def test_command_level_parse(self):
+        command_tree = self.parser.command_level_parse("a; b | c")
+        self.assertEqual(type(command_tree), Seq)
+        self.assertEqual(len(command_tree.commands), 2)
+        self.assertEqual(type(command_tree.commands[0]), Call)
+        self.assertEqual(type(command_tree.commands[1]), Pipe)
+        self.assertEqual(len(command_tree.commands[1].calls), 2)
+
+    def test_command_level_parse_empty(self):
+        self.assertEqual(self.parser.command_level_parse(" ; "), Seq(()))
+
+    def test_command_level_parse_empty_call_in_pipe(self):
+        for cmdline in ["| a", "a |", "a | | b", "a | ' ' |", " |; a"]:
+            with self.subTest(cmdline=cmdline):
+                self.assertFalse(self.parser.command_level_parse(cmdline))
+
+    def test_call_level_parse(self):
+        call_tree = self.parser.call_level_parse("< a cat b > c")
+        self.assertEqual(type(call_tree.application), Argument)
+        self.assertListEqual(
+            [type(atom) for atom in call_tree.atoms],
+            [Redirection, Argument, Argument, Redirection],
+        )
+        self.assertIs(call_tree.application, call_tree.atoms[1])
+
+    def test_call_level_parse_empty(self):
+        self.assertIsNone(self.parser.call_level_parse("  "))
+
+    def test_call_level_parse_redirection_only(self):
+        self.assertFalse(self.parser.call_level_parse("> file"))
+
+    def test_call_level_parse_backquote_followed_by_space(self):
+        call_tree = self.parser.call_level_parse("echo `echo a` b")
+        self.assertEqual(len(call_tree.atoms), 3)
+
+    def test_parse_cache_returns_shared_tree(self):
+        first = self.parser.command_level_parse("echo foo")
+        second = self.parser.command_level_parse("echo foo")
+        self.assertIs(first, second)
+        self.assertEqual(self.parser.cache_info().hits, 1)
+        self.assertEqual(self.parser.cache_info().misses, 1)
+
+    def test_parse_cache_is_bounded(self):
+        parser = Parser(cache_dir=self.cache_dir, cache_size=2)
+        for cmdline in ["echo a", "echo b", "echo c", "echo a"]:
+            parser.command_level_parse(cmdline)
+        self.assertEqual(parser.cache_info().currsize, 2)
+        self.assertEqual(parser.cache_info().misses, 4)
+
+    def test_parse_cache_keeps_invalid_lines(self):
+        self.parser.command_level_parse("echo '")
+        self.assertFalse(self.parser.command_level_parse("echo '"))
+        self.assertEqual(self.parser.cache_info().hits, 1)
+
+    def test_call_level_parse_invalid(self):
+        self.assertFalse(self.parser.call_level_parse("echo AAA >> file"))
+
+
+class TestParsingEngines(unittest.TestCase):
+    """the LALR and Earley engines must agree on every command line"""
+
+    CORPUS = [
+        "echo foo",
+        "echo foo; echo bar",
+        "a;b;c;d",
+        "a | b | c",
+        "a | b; c | d | e; f",
+        "echo 'a b' \"c `d`\" `e`",
+        "echo ';'",
+        "echo '|'",
+        'echo "a `echo "b"`"',
+        "a;",
+        'echo a"b"c',
+        "< f cat",
+        "cat <f",
+        "cat < 'f' > \"g\"",
+        "echo foo > x",
+        "echo  foo   bar  ",
+        "''",
+        "``",
+        'echo ""',
+        "e'ch'o foo",
+        "grep 'A..' f1 f2 > out",
+        "echo `echo foo; echo bar`",
+        "cat `find dir2 -name '*.txt'` | sort",
+        "echo *.txt",
+        "_ls dir3; echo AAA > newfile.txt",
+        "a | ",
+        "a ||b",
+        "",
+        " ",
+        "echo '''",
+        "echo AAA >> file.txt",
+        "echo `",
+        "echo `echo a` b",
+        'echo "`echo a`" b',
+        "a\tb",
+        ";a",
+        "a;;b",
+        "| a",
+        "a | ;b",
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.earley = Parser(engine="earley")
+        cls.lalr = Parser(engine="lalr")
+
+    def test_command_level_engines_agree(self):
+        for cmdline in self.CORPUS:
+            with self.subTest(cmdline=cmdline):
+                self.assertEqual(
+                    self.earley.command_level_parse(cmdline),
+                    self.lalr.command_level_parse(cmdline),
+                )
+
+    def test_call_level_engines_agree(self):
+        for cmdline in self.CORPUS:
+            with self.subTest(cmdline=cmdline):
+                self.assertEqual(
+                    self.earley.call_level_parse(cmdline),
+                    self.lalr.call_level_parse(cmdline),
+                )
+
+    def test_seq_keeps_command_order(self):
+        command_tree = self.lalr.command_level_parse("a; b | c; d")
+        self.assertListEqual(
+            [type(command) for command in command_tree.commands],
+            [Call, Pipe, Call],
+        )
+        self.assertEqual(command_tree.commands[2].raw, "d")
+
+
+if __name__ == "__main__":
+    unittest.main()
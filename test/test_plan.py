@@ -0,0 +1,135 @@
+import unittest
+from collections import deque
+import subprocess
+from applications import Echo, UnsafeDecorator
+from commands import Pipe, Seq
+from plan import CompiledCall, compile_command_line
+
+
+class TestPlan(unittest.TestCase):
+
+    @classmethod
+    def prepare(cls, cmdline):
+        args = [
+            "/bin/bash",
+            "-c",
+            cmdline,
+        ]
+        p = subprocess.run(args, capture_output=True)
+        return p.stdout.decode()
+
+    def setUp(self):
+        p = subprocess.run(["mkdir", "unittests"], stdout=subprocess.DEVNULL)
+        if p.returncode != 0:
+            print("error: failed to create unittest directory")
+            exit(1)
+        filesystem_setup = ";".join(
+            [
+                "cd unittests",
+                "echo AAA > test1.txt",
+                "echo BBB > test2.txt",
+            ]
+        )
+        self.prepare(filesystem_setup)
+        self.out = deque()
+
+    def tearDown(self):
+        p = subprocess.run(
+            ["rm", "-r", "unittests"], stdout=subprocess.DEVNULL
+            )
+        if p.returncode != 0:
+            print("error: failed to remove unittests directory")
+            exit(1)
+
+    def _call(self, cmdline):
+        return compile_command_line(cmdline).commands[0]
+
+    def test_plan_is_cached(self):
+        self.assertIs(
+            compile_command_line("echo foo; echo bar"),
+            compile_command_line("echo foo; echo bar"),
+        )
+
+    def test_invalid_command_line(self):
+        self.assertFalse(compile_command_line("echo '"))
+
+    def test_plan_structure(self):
+        plan = compile_command_line("echo a; echo b | cut -b 1 | sort")
+        self.assertEqual(type(plan), Seq)
+        self.assertEqual(type(plan.commands[0]), CompiledCall)
+        self.assertEqual(type(plan.commands[1]), Pipe)
+        self.assertEqual(len(plan.commands[1].calls), 3)
+
+    def test_static_call(self):
+        call = self._call("echo 'foo' bar > unittests/out.txt")
+        self.assertFalse(call.dynamic)
+        self.assertEqual(call.application, "echo")
+        self.assertEqual(call.args, ("foo", "bar"))
+        self.assertEqual(call.file_output, "unittests/out.txt")
+        self.assertEqual(type(call.executable), Echo)
+
+    def test_input_redirection_is_an_argument(self):
+        call = self._call("< unittests/test1.txt cat")
+        self.assertEqual(call.args, ("unittests/test1.txt",))
+
+    def test_unsafe_application(self):
+        call = self._call("_echo foo")
+        self.assertEqual(type(call.executable), UnsafeDecorator)
+
+    def test_plan_is_immutable(self):
+        call = self._call("echo foo")
+        with self.assertRaises(AttributeError):
+            call.args = ()
+
+    def test_dynamic_call(self):
+        call = self._call("echo `cat unittests/test1.txt` bar")
+        self.assertTrue(call.dynamic)
+        self.assertEqual(call.application, "echo")
+        self.assertEqual(call.atoms[2], ("arg", "bar"))
+
+    def test_substitution_is_evaluated_on_every_run(self):
+        plan = compile_command_line("echo `cat unittests/test1.txt`")
+        plan.eval(self.out)
+        self.prepare("echo CCC > unittests/test1.txt")
+        plan.eval(self.out)
+        self.assertEqual(self.out.popleft(), "AAA\n")
+        self.assertEqual(self.out.popleft(), "CCC\n")
+
+    def test_glob_is_expanded_on_every_run(self):
+        plan = compile_command_line("echo unittests/*3.txt")
+        plan.eval(self.out)
+        self.prepare("echo CCC > unittests/test3.txt")
+        plan.eval(self.out)
+        self.assertEqual(self.out.popleft(), "unittests/*3.txt\n")
+        self.assertEqual(self.out.popleft(), "unittests/test3.txt\n")
+
+    def test_dynamic_application(self):
+        plan = compile_command_line("`echo echo` foo")
+        self.assertIsNone(plan.commands[0].executable)
+        plan.eval(self.out)
+        self.assertEqual(self.out.popleft(), "foo\n")
+
+    def test_output_redirection(self):
+        compile_command_line("echo foo > unittests/out.txt").eval(self.out)
+        self.assertEqual(len(self.out), 0)
+        self.assertEqual(self.prepare("cat unittests/out.txt"), "foo\n")
+
+    def test_pipe(self):
+        compile_command_line("echo abc | cut -b 1").eval(self.out)
+        self.assertEqual(self.out.pop().strip(), "a")
+
+    def test_empty_application(self):
+        compile_command_line("'' foo").eval(self.out)
+        self.assertEqual(len(self.out), 0)
+
+    def test_unsupported_application(self):
+        compile_command_line("_foo bar").eval(self.out)
+        self.assertEqual(self.out.pop(), "Unsupported Application: foo\n")
+
+    def test_unknown_application(self):
+        plan = compile_command_line("foo bar")
+        self.assertRaises(KeyError, plan.eval, self.out)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import os
+import time
+import unittest
+from collections import deque
+import subprocess
+import result_cache
+from plan import compile_command_line
+
+
+class TestResultCache(unittest.TestCase):
+
+    @classmethod
+    def prepare(cls, cmdline):
+        args = [
+            "/bin/bash",
+            "-c",
+            cmdline,
+        ]
+        p = subprocess.run(args, capture_output=True)
+        return p.stdout.decode()
+
+    def setUp(self):
+        p = subprocess.run(["mkdir", "unittests"], stdout=subprocess.DEVNULL)
+        if p.returncode != 0:
+            print("error: failed to create unittest directory")
+            exit(1)
+        filesystem_setup = ";".join(
+            [
+                "cd unittests",
+                "printf 'AAA\\nBBB\\nAAA\\n' > test1.txt",
+                "mkdir dir",
+                "echo CCC > dir/test2.txt",
+            ]
+        )
+        self.prepare(filesystem_setup)
+        self._settle()
+        self.cache = result_cache.configure(1024 * 1024)
+
+    def tearDown(self):
+        result_cache.configure(None)
+        p = subprocess.run(
+            ["rm", "-r", "unittests"], stdout=subprocess.DEVNULL
+            )
+        if p.returncode != 0:
+            print("error: failed to remove unittests directory")
+            exit(1)
+
+    def _settle(self):
+        """dates the test files back, as outputs of new ones are not cached"""
+        settled = time.time() - 2 * result_cache.SETTLE_TIME
+        for directory, _, files in os.walk("unittests"):
+            for name in [".", *files]:
+                os.utime(os.path.join(directory, name), (settled, settled))
+
+    def _run(self, cmdline):
+        out = deque()
+        compile_command_line(cmdline).eval(out)
+        return "".join(out)
+
+    def test_repeated_command_is_cached(self):
+        cmdline = "cat unittests/test1.txt | sort | uniq"
+        self.assertEqual(self._run(cmdline), "AAA\nBBB\n")
+        self.assertEqual(self._run(cmdline), "AAA\nBBB\n")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_recently_changed_files_are_not_cached(self):
+        self.prepare("echo CCC >> unittests/test1.txt")
+        self._run("cat unittests/test1.txt")
+        self._run("cat unittests/test1.txt")
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def test_changed_file_is_read_again(self):
+        cmdline = "sort unittests/test1.txt"
+        self.assertEqual(self._run(cmdline), "AAA\nAAA\nBBB\n")
+        self.prepare("echo ABC >> unittests/test1.txt")
+        self.assertEqual(self._run(cmdline), "AAA\nAAA\nABC\nBBB\n")
+        self.assertEqual(self.cache.hits, 0)
+
+    def test_new_file_is_found(self):
+        cmdline = "find unittests -name '*.txt'"
+        self.assertEqual(len(self._run(cmdline).split()), 2)
+        self.prepare("touch unittests/dir/test3.txt")
+        self.assertEqual(len(self._run(cmdline).split()), 3)
+
+    def test_missing_file_is_created(self):
+        cmdline = "_cat unittests/test3.txt"
+        self.assertIn("Error", self._run(cmdline))
+        self.prepare("echo DDD > unittests/test3.txt")
+        self.assertEqual(self._run(cmdline), "DDD\n")
+
+    def test_working_directory_is_part_of_the_key(self):
+        cwd = os.getcwd()
+        self.assertEqual(self._run("ls unittests/dir"), "test2.txt\n")
+        try:
+            os.chdir("unittests")
+            self.assertEqual(self._run("ls dir"), "test2.txt\n")
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(self.cache.hits, 0)
+
+    def test_impure_commands_bypass_the_cache(self):
+        cwd = os.getcwd()
+        try:
+            self._run("cd unittests; cd ..")
+        finally:
+            os.chdir(cwd)
+        self._run("cat unittests/test1.txt > unittests/out.txt")
+        self._run("echo `cat unittests/test1.txt`")
+        # only the substituted command is pure
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+        self.assertEqual(
+            self.prepare("cat unittests/out.txt"), "AAA\nBBB\nAAA\n"
+        )
+        self.assertIsNone(
+            result_cache._key(compile_command_line("tail -f a").commands[0])
+        )
+
+    def test_least_recently_used_output_is_evicted(self):
+        for name in ["a", "b", "c"]:
+            self._run(f"echo {name * 100}")
+        size = self.cache.size // 3
+        cache = result_cache.configure(2 * size)
+        self._run("echo " + "a" * 100)
+        self._run("echo " + "b" * 100)
+        self._run("echo " + "a" * 100)
+        self._run("echo " + "c" * 100)
+        self.assertLessEqual(cache.size, cache.budget)
+        keys = [key[1][0][1][0][0] for key in cache.entries]
+        self.assertEqual(keys, ["a", "c"])
+
+    def test_disabled_cache(self):
+        result_cache.configure(0)
+        self.assertIsNone(result_cache.get_cache())
+        self.assertEqual(self._run("echo foo"), "foo\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,9 @@
+import os
 import subprocess
+import sys
 import unittest
 from collections import deque
+import shell
 from shell import eval as shell_evaluator
 
 
@@ -50,12 +53,109 @@ class TestShell(unittest.TestCase):
         self.assertEqual(out.popleft(), "foo\n")
         self.assertEqual(len(out), 0)
 
+    def test_cat_is_copied_to_stdout(self):
+        for cmdline, output in [
+            ("cat unittests/test2.txt unittests/test3.txt", b"BBB\nCCC\n"),
+            ("cat unittests/test2.txt; echo foo", b"BBB\nfoo\n"),
+        ]:
+            with self.subTest(cmdline=cmdline):
+                p = subprocess.run(
+                    [sys.executable, shell.__file__, "-c", cmdline],
+                    capture_output=True,
+                )
+                self.assertEqual(p.stdout, output)
+        self.assertFalse(shell.copy_to_stdout("cat `echo a`"))
+
+    def test_cat_appended_to_one_of_its_files(self):
+        cmdline = "cat unittests/test2.txt unittests/test3.txt"
+        with open("unittests/test3.txt", "ab") as f:
+            subprocess.run(
+                [sys.executable, shell.__file__, "-c", cmdline],
+                stdout=f, timeout=30,
+            )
+        with open("unittests/test3.txt", "rb") as f:
+            self.assertEqual(f.read(), b"CCC\nBBB\nCCC\n")
+
+    def test_output_is_printed_as_it_is_appended(self):
+        p = subprocess.run(
+            [
+                sys.executable, shell.__file__, "-c",
+                "echo foo > unittests/out.txt; cat unittests/out.txt",
+            ],
+            capture_output=True,
+        )
+        self.assertEqual(p.stdout, b"foo\n")
+        cmdline = "tail -f unittests/test2.txt"
+        with subprocess.Popen(
+            [sys.executable, shell.__file__, "-c", cmdline],
+            stdout=subprocess.PIPE,
+        ) as p:
+            try:
+                self.assertEqual(p.stdout.readline(), b"BBB\n")
+                self.prepare("echo CCC >> unittests/test2.txt")
+                self.assertEqual(p.stdout.readline(), b"CCC\n")
+            finally:
+                p.kill()
+
+    def test_bytes_are_printed_to_strict_stdout(self):
+        self.prepare("printf 'a\\xc3\\xa9\\n' > unittests/test1.txt")
+        p = subprocess.run(
+            [
+                sys.executable, shell.__file__, "-c",
+                "head -c 2 unittests/test1.txt; echo; cut -b 1-2 "
+                "unittests/test1.txt",
+            ],
+            capture_output=True,
+            env={
+                **os.environ,
+                "PYTHONIOENCODING": "utf-8:strict",
+                "SHELL_DATA_MODE": "bytes",
+            },
+        )
+        self.assertEqual(p.stdout, b"a\xc3\na\xc3")
+
+    def test_eval_repeated_line_reevaluates_substitution(self):
+        cmdline = "echo `cat unittests/test2.txt`"
+        out = deque()
+        shell_evaluator(cmdline, out)
+        self.prepare("echo DDD > unittests/test2.txt")
+        shell_evaluator(cmdline, out)
+        self.assertEqual(out.popleft(), "BBB\n")
+        self.assertEqual(out.popleft(), "DDD\n")
+
     def test_eval_with_unrecognised_command(self):
         out = deque()
         shell_evaluator("echo '''", out)
         self.assertEqual(out.popleft(), "Unrecognized Input: echo '''\n")
         self.assertEqual(len(out), 0)
 
+    def _eval_with_low_recursion_limit(self, cmdline):
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(200)
+        try:
+            out = deque()
+            shell_evaluator(cmdline, out)
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+        return out
+
+    def test_eval_long_sequence(self):
+        out = self._eval_with_low_recursion_limit(
+            "; ".join(["echo a"] * 10000)
+        )
+        self.assertEqual(len(out), 10000)
+
+    def test_eval_long_quoted_sequence(self):
+        out = self._eval_with_low_recursion_limit(
+            "; ".join(["echo 'a'"] * 10000)
+        )
+        self.assertEqual(len(out), 10000)
+
+    def test_eval_long_pipeline(self):
+        out = self._eval_with_low_recursion_limit("echo a" + " | uniq" * 2000)
+        self.assertEqual(out.popleft(), "a\n")
+        self.assertEqual(len(out), 0)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,194 @@
+import io
+import random
+import unittest
+import streams
+from streams import (
+    ByteLines,
+    Channel,
+    Lines,
+    binary,
+    byte_line_batches,
+    finish,
+    iter_lines,
+    join,
+    line_batches,
+    read_chunks,
+    readline_batches,
+    readlines,
+    spill,
+    split_lines,
+    text,
+)
+
+
+class TestStreams(unittest.TestCase):
+    def _chunked(self, text, rng):
+        positions = range(len(text) + 1)
+        cuts = sorted(rng.sample(positions, min(len(positions), 3)))
+        bounds = [0] + cuts + [len(text)]
+        return [text[i:j] for i, j in zip(bounds, bounds[1:])]
+
+    def test_lines_do_not_depend_on_chunks(self):
+        rng = random.Random(8)
+        alphabet = ["a", "b", "\n", "\r", "\r\n", "\x0c", " "]
+        for _ in range(2000):
+            text = "".join(rng.choices(alphabet, k=rng.randint(0, 12)))
+            chunks = self._chunked(text, rng)
+            with self.subTest(chunks=chunks):
+                self.assertEqual(
+                    list(iter_lines(chunks)), text.splitlines(keepends=True)
+                )
+                self.assertEqual(list(split_lines(chunks)), text.split("\n"))
+                self.assertEqual(
+                    list(readlines(chunks)), io.StringIO(text).readlines()
+                )
+
+    def _with_records(self, text, rng):
+        """chunks of text, runs of plain lines passed as batches"""
+        chunks = []
+        for line in text.splitlines(keepends=True):
+            plain = line.endswith("\n") and len(line.splitlines()) == 1
+            if plain and rng.random() < 0.7:
+                if not chunks or type(chunks[-1]) is not Lines:
+                    chunks.append(Lines())
+                chunks[-1].append(line)
+            else:
+                chunks.append(line)
+        return chunks
+
+    def _assert_records(self, batch):
+        for line in batch[:-1]:
+            self.assertTrue(line.endswith("\n"))
+        for line in batch:
+            self.assertEqual(line.splitlines(keepends=True), [line])
+
+    def test_records_read_as_text(self):
+        rng = random.Random(13)
+        alphabet = ["a", "\n", "\n", "\r", "\r\n", "\x0c", "\u2028"]
+        for _ in range(2000):
+            content = "".join(rng.choices(alphabet, k=rng.randint(0, 12)))
+            chunks = self._with_records(content, rng)
+            with self.subTest(chunks=chunks):
+                self.assertEqual("".join(text(chunks)), content)
+                self.assertEqual(
+                    list(iter_lines(chunks)),
+                    content.splitlines(keepends=True),
+                )
+                self.assertEqual(
+                    list(readlines(chunks)),
+                    io.StringIO(content).readlines(),
+                )
+                for batches in line_batches, readline_batches:
+                    for batch in batches(chunks):
+                        if type(batch) is Lines:
+                            self._assert_records(batch)
+
+    def test_plain_text_is_read_as_records(self):
+        batches = list(line_batches(["a\nb", "\nc"]))
+        self.assertEqual(batches, [["a\n"], ["b\n"], ["c"]])
+        self.assertTrue(all(type(batch) is Lines for batch in batches))
+        batches = list(readline_batches(["a\x0cb\n", "c\n"]))
+        self.assertEqual(batches, [["a\x0cb\n"], ["c\n"]])
+        self.assertEqual([type(batch) for batch in batches], [list, Lines])
+
+    def test_channel_notes_reads(self):
+        channel = Channel(["a", "b"])
+        self.assertFalse(channel.read)
+        self.assertEqual(channel.pop(), "b")
+        self.assertTrue(channel.read)
+
+    def test_channel_spills_past_threshold(self):
+        spool_threshold = streams.SPOOL_THRESHOLD
+        streams.SPOOL_THRESHOLD = 10
+        try:
+            channel = Channel(["abc"])
+            channel.append("déjà vu\n" * 3)
+            channel.write(iter(["x" * 4, "\u2028y" * 2]))
+            self.assertEqual(channel.size, 3)
+            self.assertIsNotNone(channel.file)
+            self.assertEqual(
+                "".join(channel.chunks()),
+                "abc" + "déjà vu\n" * 3 + "xxxx\u2028y\u2028y",
+            )
+            self.assertEqual(
+                "".join(channel.pop_chunks()), "xxxx\u2028y\u2028y"
+            )
+            self.assertTrue(channel.read)
+            self.assertEqual(channel.pop(), "déjà vu\n" * 3)
+            self.assertEqual(channel.popleft(), "abc")
+            self.assertEqual(channel.size, 0)
+        finally:
+            streams.SPOOL_THRESHOLD = spool_threshold
+
+    def test_spill(self):
+        lines = [f"{i}\n" for i in range(3000)] + ["\u2028"]
+        self.assertEqual(list(spill(lines)), lines)
+
+    def test_join(self):
+        self.assertEqual("".join(join(", ", ["a", "b", "c"])), "a, b, c")
+        self.assertEqual(list(join(", ", [])), [])
+
+    def test_read_chunks(self):
+        chunks = list(read_chunks(__file__, 100))
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        with open(__file__) as f:
+            self.assertEqual("".join(chunks), f.read())
+
+    def _producer(self, produced):
+        for i in range(10):
+            produced.append(i)
+            yield str(i)
+
+    def test_byte_lines_do_not_depend_on_chunks(self):
+        rng = random.Random(20)
+        alphabet = [b"a", b"\xc3\xa9", b"\n", b"\r", b"\r\n", b"\x0c"]
+        for _ in range(2000):
+            data = b"".join(rng.choices(alphabet, k=rng.randint(0, 12)))
+            chunks = self._chunked(data, rng)
+            with self.subTest(chunks=chunks):
+                batches = list(byte_line_batches(chunks))
+                self.assertTrue(
+                    all(type(batch) is ByteLines for batch in batches)
+                )
+                self.assertEqual(
+                    [line for batch in batches for line in batch],
+                    io.BytesIO(data).readlines(),
+                )
+
+    def test_bytes_are_decoded_as_text(self):
+        data = "h\u00e9llo\n\u20ac".encode(streams.ENCODING)
+        chunks = [data[:2], ByteLines([data[2:4]]), data[4:]]
+        self.assertEqual("".join(text(chunks)), "h\u00e9llo\n\u20ac")
+        # text reported between bytes ends them
+        chunks = ["a", b"b", Lines(["c\n"]), b"d"]
+        self.assertEqual(list(text(chunks)), ["a", "b", "c\n", "d"])
+
+    def test_text_is_encoded_as_bytes(self):
+        batch = ByteLines([b"a\n"])
+        chunks = list(binary(["h\u00e9", Lines(["b\n"]), batch, b"c"]))
+        self.assertEqual(chunks[:2], [
+            "h\u00e9".encode(streams.ENCODING), b"b\n"
+        ])
+        self.assertIs(chunks[2], batch)
+        self.assertEqual(chunks[3], b"c")
+
+    def test_finish_runs_unread_stream(self):
+        produced = []
+        finish(self._producer(produced), True)
+        self.assertEqual(len(produced), 10)
+
+    def test_finish_closes_partly_read_stream(self):
+        produced = []
+        chunks = self._producer(produced)
+        next(chunks)
+        finish(chunks, True)
+        self.assertEqual(len(produced), 1)
+
+    def test_finish_after_error_does_not_run_stream(self):
+        produced = []
+        finish(self._producer(produced), False)
+        self.assertEqual(len(produced), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from parser import Parser
+from syntax_tree import Argument, Substitution
+
+
+class TestSyntaxTree(unittest.TestCase):
+    def setUp(self):
+        self.parser = Parser()
+
+    def _argument(self, cmd):
+        return self.parser.call_level_parse(cmd).application
+
+    def test_unquoted_argument(self):
+        argument = self._argument("echo")
+        self.assertEqual(argument.parts, ("echo",))
+        self.assertFalse(argument.glob)
+
+    def test_glob_argument(self):
+        self.assertTrue(self._argument("*.txt").glob)
+
+    def test_quoted_asterisk_does_not_glob(self):
+        self.assertFalse(self._argument("'*.txt'").glob)
+        self.assertFalse(self._argument('"*.txt"').glob)
+
+    def test_substitution_parts(self):
+        argument = self._argument('a`b`"c`d`"')
+        self.assertEqual(argument.parts[1], Substitution("b"))
+        self.assertEqual(argument.parts[3], Substitution("d", True))
+
+    def test_argument_source(self):
+        for source in ["foo", "'a b'", '"a `b` c"', "e'ch'o", '"" ', "``"]:
+            with self.subTest(source=source):
+                self.assertEqual(
+                    self._argument(source).source(), source.strip()
+                    )
+
+    def test_call_raw(self):
+        call_tree = self.parser.call_level_parse("grep  'A..'  f >out")
+        self.assertEqual(call_tree.raw, "grep 'A..' f > out")
+
+    def test_nodes_are_immutable(self):
+        command_tree = self.parser.command_level_parse("echo `echo a`")
+        call_tree = command_tree.commands[0]
+        with self.assertRaises(AttributeError):
+            call_tree.atoms = ()
+        with self.assertRaises(AttributeError):
+            del call_tree.application
+        with self.assertRaises(AttributeError):
+            call_tree.atoms[1].parts[0].command = "echo b"
+
+    def test_nodes_compare_by_value(self):
+        self.assertEqual(
+            self.parser.command_level_parse("a | b; c"),
+            self.parser.command_level_parse("a|b ;c"),
+        )
+        self.assertNotEqual(
+            Argument((Substitution("a"),)),
+            Argument((Substitution("a", True),)),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()